@@ -0,0 +1,74 @@
+"""Encode and decode cost of each get_latest_frame codec.
+
+No simulator needed; from the repo root:
+
+    python benchmarks/bench_codecs.py [iterations]
+
+Encodes a synthetic 960x720 FPV-like frame (sky gradient, textured ground,
+a few gates) with the simulator's encoders (tello_sim/frame_cache.py) and
+decodes it with the client's decode_frame (tello_sim_client.py), which
+includes the BGR->RGB conversion every client frame pays. Prints the
+payload size and the per-frame encode / decode time for each setting.
+"""
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tello_sim"))
+
+from frame_cache import encode_frame  # noqa: E402
+from tello_sim_client import decode_frame  # noqa: E402
+
+SETTINGS = [
+    ("png", None),
+    ("png", 0),
+    ("png", 1),
+    ("png", 9),
+    ("jpeg", 50),
+    ("jpeg", 80),
+    ("jpeg", 95),
+    ("raw", None),
+]
+
+
+def synthetic_frame(width: int = 960, height: int = 720) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    frame = np.empty((height, width, 3), np.uint8)
+    horizon = height // 2
+    sky = np.linspace(255, 170, horizon, dtype=np.float32)[:, None]
+    frame[:horizon] = np.stack([sky, sky * 0.85, sky * 0.6], axis=-1).astype(np.uint8)
+    ground = rng.normal(90, 12, (height - horizon, width, 1)).clip(0, 255)
+    frame[horizon:] = (ground * np.array([0.6, 1.0, 0.7])).astype(np.uint8)
+    for x in (200, 480, 760):
+        cv2.rectangle(frame, (x - 60, horizon - 120), (x + 60, horizon + 40), (0, 90, 230), 12)
+    return frame
+
+
+def best_ms(fn, iterations: int) -> float:
+    best = float("inf")
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    frame = synthetic_frame()
+    print(f"{frame.shape[1]}x{frame.shape[0]} frame, best of {iterations}")
+    print(f"{'codec':<12}{'bytes':>10}{'encode ms':>12}{'decode ms':>12}")
+    for codec, param in SETTINGS:
+        payload = encode_frame(frame, codec, param)
+        header = {"codec": codec, "shape": list(frame.shape), "dtype": str(frame.dtype)}
+        encode = best_ms(lambda: encode_frame(frame, codec, param), iterations)
+        decode = best_ms(lambda: decode_frame(header, payload), iterations)
+        label = codec if param is None else f"{codec} {param}"
+        print(f"{label:<12}{len(payload):>10}{encode:>12.2f}{decode:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Per-command dispatch cost of the command table.
+
+Measures what the server pays before a handler runs: table lookup plus
+argument parsing and validation (command_registry.parse_command). No
+simulator needed; from the repo root:
+
+    python benchmarks/bench_command_dispatch.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tello_sim"))
+
+from command_registry import CommandError, parse_command  # noqa: E402
+
+# One representative line per command shape, from the cheapest (no
+# arguments) to the widest (curve's seven floats), plus the error path.
+SAMPLES = [
+    "takeoff",
+    "get_battery",
+    "get_speed_x",
+    "forward 50",
+    "rotate_cw 90",
+    "set_speed 50",
+    "send_rc_control 10 -20 0 35",
+    "go 100 20 0 50",
+    "curve 20 20 0 40 60 0 30",
+    "get_latest_frame",
+    "bogus 1",
+    "set_speed 5",
+]
+
+
+def dispatch(line: str) -> None:
+    try:
+        parse_command(line)
+    except CommandError:
+        pass
+
+
+def main() -> None:
+    number = 200_000
+    print(f"{'command':<32}{'ns/dispatch':>12}")
+    for line in SAMPLES:
+        best = min(timeit.repeat(lambda: dispatch(line), number=number, repeat=5))
+        print(f"{line:<32}{best / number * 1e9:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
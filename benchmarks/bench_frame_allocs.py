@@ -0,0 +1,84 @@
+"""Memory allocated per streamed frame, with and without the FramePool.
+
+No simulator needed; from the repo root:
+
+    python benchmarks/bench_frame_allocs.py [frames]
+
+Renders an offscreen Panda3D scene through the simulator's FpvCamera
+(tello_sim/fpv_camera.py) and runs each frame down the path a streamed frame
+takes: the readback copy, a CapturedFrame published in place of the last
+one, and a consumer reading its BGR image (cvtColor + flip). tracemalloc
+measures the memory each step allocates (its peak over the usage it
+started from, NumPy buffers included; each step's own arrays are all alive
+at its peak), summed per frame: first with per-frame arrays as before,
+then with a FramePool.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tello_sim"))
+
+import cv2  # noqa: E402
+from panda3d.core import CardMaker, loadPrcFileData  # noqa: E402
+
+loadPrcFileData("", "window-type offscreen\naudio-library-name null\nsync-video false")
+
+from direct.showbase.ShowBase import ShowBase  # noqa: E402
+
+from fpv_camera import FpvCamera  # noqa: E402
+from frame_cache import CapturedFrame, FramePool  # noqa: E402
+
+
+def allocated_by(step) -> tuple[object, int]:
+    """Run `step`; return its result and the bytes it allocated."""
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    result = step()
+    return result, tracemalloc.get_traced_memory()[1] - start
+
+
+def run(base: ShowBase, fpv: FpvCamera, frames: int, pool: FramePool | None) -> list[int]:
+    """Stream `frames` frames; return the bytes allocated by each."""
+    fpv.pool = pool
+    latest = None
+    allocated = []
+    seq = 0
+    while seq < frames:
+        raw, readback = allocated_by(lambda: fpv.poll(time.monotonic()))
+        if raw is not None:
+            seq += 1
+            latest = CapturedFrame(seq, raw=raw, conversion=cv2.COLOR_BGRA2BGR, pool=pool)
+            del raw
+            _, conversion = allocated_by(lambda: latest.image)
+            allocated.append(readback + conversion)
+        base.taskMgr.step()
+    return allocated
+
+
+def main() -> None:
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    base = ShowBase()
+    cards = CardMaker("card")
+    cards.setFrame(-1, 1, -1, 1)
+    base.render.attachNewNode(cards.generate()).setPos(0, 10, 0)
+    fpv = FpvCamera(base, base.render.attachNewNode("mount"), 960, 720, 1000)
+    run(base, fpv, 10, None)  # warm up
+
+    tracemalloc.start()
+    print(f"960x720 frames, {frames} per mode")
+    print(f"{'mode':<12}{'KiB/frame':>12}{'max KiB':>10}")
+    for label, pool in [("per-frame", None), ("pooled", FramePool())]:
+        allocated = run(base, fpv, frames, pool)
+        steady = allocated[5:]  # the pool fills up on the first frames
+        mean = sum(steady) / len(steady) / 1024
+        print(f"{label:<12}{mean:>12.1f}{max(steady) / 1024:>10.1f}")
+        if pool is not None:
+            print(f"pool: {pool.stats()}")
+    tracemalloc.stop()
+    fpv.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""CPU cost of an FPV stream nobody is watching: always-on vs demand-driven capture.
+
+No simulator needed; from the repo root:
+
+    python benchmarks/bench_idle_capture.py [seconds]
+
+Builds an offscreen Panda3D scene with the simulator's FpvCamera
+(tello_sim/fpv_camera.py) and runs the stream part of the simulator's tick
+at 60 Hz in three modes:
+
+    always on   what streamon did before: render and read back every frame
+    idle        demand-driven, streamon but no consumer: nothing is captured
+    polled      demand-driven, a client pulls a frame every 4 s (say, a
+                dashboard thumbnail): capture runs for the keep-warm window
+                after each pull and is idle in between
+
+and prints the process CPU time per tick and the frames captured in each.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tello_sim"))
+
+from panda3d.core import CardMaker, loadPrcFileData  # noqa: E402
+
+loadPrcFileData("", "window-type offscreen\naudio-library-name null\nsync-video false")
+
+from direct.showbase.ShowBase import ShowBase  # noqa: E402
+
+from fpv_camera import FpvCamera  # noqa: E402
+from frame_cache import CapturedFrame  # noqa: E402
+from frame_demand import FrameDemand  # noqa: E402
+
+TICK_HZ = 60
+POLL_INTERVAL_S = 4.0
+
+
+def build_scene(base: ShowBase) -> None:
+    """A ground plane and a field of gates, enough to make rendering cost something."""
+    cards = CardMaker("card")
+    cards.setFrame(-1, 1, -1, 1)
+    ground = base.render.attachNewNode(cards.generate())
+    ground.setScale(200)
+    ground.setP(-90)
+    ground.setColor(0.3, 0.6, 0.3, 1)
+    for i in range(400):
+        card = base.render.attachNewNode(cards.generate())
+        card.setPos((i % 20 - 10) * 6, 20 + (i // 20) * 6, 2)
+        card.setColor(i % 3 / 2, 0.4, 1 - i % 3 / 2, 1)
+
+
+def run(base: ShowBase, fpv: FpvCamera, seconds: float, demand: FrameDemand | None,
+        poll: bool) -> tuple[float, int]:
+    """Tick for `seconds`; return (CPU ms per tick, frames captured)."""
+    ticks = frames = 0
+    next_poll = next_tick = time.monotonic()
+    cpu_start = time.process_time()
+    end = next_tick + seconds
+    while next_tick < end:
+        now = time.monotonic()
+        if poll and now >= next_poll:
+            demand.request()
+            next_poll += POLL_INTERVAL_S
+        if demand is None or demand.wanted(now):
+            raw = fpv.poll(now)
+            if raw is not None:
+                frames += 1
+                CapturedFrame(frames, raw=raw).image  # what a consumer converts
+        else:
+            fpv.stop()
+        base.taskMgr.step()
+        ticks += 1
+        next_tick += 1 / TICK_HZ
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    return (time.process_time() - cpu_start) * 1000 / ticks, frames
+
+
+def main() -> None:
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 8.0
+    base = ShowBase()
+    build_scene(base)
+    fpv = FpvCamera(base, base.render.attachNewNode("mount"), 960, 720, 30)
+    # Warm up shaders and buffers before timing anything.
+    run(base, fpv, 0.5, None, False)
+
+    print(f"960x720 @ 30 FPS stream, {TICK_HZ} Hz ticks, {seconds:g} s per mode")
+    print(f"{'mode':<12}{'CPU ms/tick':>14}{'frames':>10}")
+    for label, demand, poll in [
+        ("always on", None, False),
+        ("idle", FrameDemand(), False),
+        ("polled", FrameDemand(), True),
+    ]:
+        cpu_ms, frames = run(base, fpv, seconds, demand, poll)
+        print(f"{label:<12}{cpu_ms:>14.2f}{frames:>10}")
+    fpv.stop()
+
+
+if __name__ == "__main__":
+    main()
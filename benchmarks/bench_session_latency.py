@@ -0,0 +1,55 @@
+"""Round-trip latency: one connection per command vs a persistent session.
+
+Start the simulator first (python tello_sim/run_sim.py), then from the repo
+root:
+
+    python benchmarks/bench_session_latency.py [iterations]
+
+Times the same small getter (get_battery, the kind of call a control loop
+polls at 20-50 Hz) over a fresh TCP connection per call and over one
+persistent session, and prints mean / median / p99 per call.
+"""
+import statistics
+import sys
+import time
+
+from sim_connection import SimConnection
+
+COMMAND = "get_battery"
+
+
+def measure(conn: SimConnection, iterations: int) -> list[float]:
+    # One warm-up call so the session (if any) is already open.
+    conn.request(COMMAND)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        conn.request(COMMAND)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label: str, samples: list[float]) -> None:
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:<12} mean {statistics.mean(samples):7.3f} ms   "
+          f"median {statistics.median(samples):7.3f} ms   p99 {p99:7.3f} ms")
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    if not SimConnection().is_reachable():
+        sys.exit("Simulator not reachable on localhost:9999 - start it first.")
+
+    one_shot = SimConnection()
+    session = SimConnection(persistent=True)
+    try:
+        print(f"{iterations} x '{COMMAND}'")
+        report("one-shot", measure(one_shot, iterations))
+        report("session", measure(session, iterations))
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Size and cost of a telemetry sample: JSON text vs the binary layout.
+
+No simulator needed; from the repo root:
+
+    python benchmarks/bench_telemetry_codec.py [samples]
+
+Encodes a typical in-flight state the way TelemetryPublisher does for each
+format (json.dumps + encode, telemetry_codec.encode_state) and decodes it
+the way SimulatorClient.subscribe_state does (json.loads,
+telemetry_codec.decode_state), and prints the bytes per sample and the
+microseconds per encode and decode.
+"""
+import json
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tello_sim"))
+
+from telemetry_codec import decode_state, encode_state  # noqa: E402
+
+STATE = {
+    "x": -1.537, "y": 1.204, "z": 0.512, "yaw": -87.4, "pitch": 3, "roll": -2,
+    "speed_x": 12, "speed_y": -4, "speed_z": 31, "tof": 118, "battery": 87,
+    "flying": True, "time": round(time.time(), 3), "sim_time": round(time.monotonic(), 6),
+}
+
+
+def per_call_us(func, samples: int) -> float:
+    return min(timeit.repeat(func, number=samples, repeat=5)) / samples * 1e6
+
+
+def main() -> None:
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    json_sample = json.dumps({**STATE, "seq": 1}).encode()
+    bin_sample = encode_state(STATE, 1)
+    print(f"{samples} samples per timing, best of 5")
+    print(f"{'format':<8}{'bytes':>8}{'encode us':>12}{'decode us':>12}")
+    for label, size, encode, decode in [
+        ("json", len(json_sample), lambda: json.dumps({**STATE, "seq": 1}).encode(),
+         lambda: json.loads(json_sample)),
+        ("bin", len(bin_sample), lambda: encode_state(STATE, 1),
+         lambda: decode_state(bin_sample)),
+    ]:
+        print(f"{label:<8}{size:>8}{per_call_us(encode, samples):>12.2f}"
+              f"{per_call_us(decode, samples):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Telemetry fan-out under load: N synthetic subscribers on one simulator.
+
+No simulator needed; from the repo root:
+
+    python benchmarks/bench_telemetry_fanout.py [seconds] [rate_hz]
+
+Runs the simulator's TelemetryPublisher (tello_sim/telemetry_publisher.py)
+over a fixed state snapshot on a spare port, sampling at 100 Hz, and a
+separate process holding N subscriber sockets that each ask for `rate_hz`
+(20 by default) in the binary format. For each N it tries three fan-outs:
+
+    blocking    the old loop: a blocking sendto per subscriber
+    unicast     the publisher's non-blocking sendto per subscriber
+    multicast   one send per sample to a multicast group the N sockets join
+
+and prints the publisher's mean and longest time to send one sample, the
+datagrams it dropped on a full send buffer, the rate the subscribers
+received on average and at worst, and their loss. Both unicast fan-outs
+cost one system call per subscriber and sample; only multicast does not.
+"""
+import multiprocessing
+import os
+import selectors
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tello_sim"))
+
+from state_snapshot import StateSnapshot  # noqa: E402
+from telemetry_codec import HEADER  # noqa: E402
+from telemetry_publisher import MULTICAST_PORT, TelemetryPublisher  # noqa: E402
+
+PORT = 9987
+GROUP = "239.255.0.87"
+SAMPLE_HZ = 100
+SUBSCRIBERS = (10, 100, 500, 1000)
+
+
+class StandInDrone:
+    """Just enough of UrsinaAdapter for the publisher: a state snapshot."""
+
+    state_snapshot = StateSnapshot(
+        tick=1, mono_time=time.monotonic(), time=time.time(), x=1.0, y=0.5, z=-0.3,
+        yaw=45.0, pitch=0, roll=0, speed_x=0, speed_y=0, speed_z=0, accel_x=0.0,
+        accel_y=0.0, accel_z=0.0, tof=50, battery=100, flight_time=0, flying=True)
+
+
+class BlockingPublisher(TelemetryPublisher):
+    """The fan-out as it was: one blocking sendto after another."""
+
+    def start(self):
+        super().start()
+        self._socket.setblocking(True)
+
+    def _send(self, batches):
+        start = time.monotonic()
+        for payload, subs in batches:
+            for sub in subs:
+                try:
+                    self._socket.sendto(payload, sub.addr)
+                    self.sent += 1
+                except OSError:
+                    self.send_failures += 1
+        self._send_times.append(time.monotonic() - start)
+
+
+def listen(count: int, multicast: bool, rate_hz: float, seconds: float, results) -> None:
+    """Subscriber process: `count` sockets, drained for `seconds`."""
+    selector = selectors.DefaultSelector()
+    socks = []
+    for _ in range(count):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        if multicast:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(("", MULTICAST_PORT))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                            socket.inet_aton(GROUP) + socket.inet_aton("127.0.0.1"))
+        selector.register(sock, selectors.EVENT_READ, len(socks))
+        socks.append(sock)
+    # Subscribe a few times over, as a client's keepalive would: a burst of
+    # hundreds of subscribes can overflow the publisher's receive buffer.
+    for _ in range(3):
+        if not multicast:
+            for sock in socks:
+                sock.sendto(f"subscribe bin rate={rate_hz:g}".encode(), ("localhost", PORT))
+                time.sleep(0.0002)
+        time.sleep(0.3)
+    for sock in socks:
+        while True:
+            try:
+                sock.recv(256)
+            except BlockingIOError:
+                break
+    seqs = [[] for _ in socks]
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        for key, _ in selector.select(0.1):
+            try:
+                seqs[key.data].append(HEADER.unpack_from(key.fileobj.recv(256))[3])
+            except BlockingIOError:
+                pass
+    for sock in socks:
+        if not multicast:
+            sock.sendto(b"unsubscribe", ("localhost", PORT))
+        sock.close()
+    received = [len(s) for s in seqs]
+    expected = [s[-1] - s[0] + 1 if s else 0 for s in seqs]
+    results.put((received, sum(expected) - sum(received)))
+
+
+def run(mode: str, count: int, rate_hz: float, seconds: float) -> dict:
+    cls = BlockingPublisher if mode == "blocking" else TelemetryPublisher
+    publisher = cls(StandInDrone(), port=PORT, rate_hz=rate_hz, max_rate_hz=SAMPLE_HZ,
+                    multicast_group=GROUP if mode == "multicast" else None)
+    publisher.start()
+    results = multiprocessing.Queue()
+    listener = multiprocessing.Process(
+        target=listen, args=(count, mode == "multicast", rate_hz, seconds, results))
+    listener.start()
+    try:
+        received, lost = results.get(timeout=seconds + 60)
+        listener.join()
+        stats = publisher.stats()
+    finally:
+        publisher.stop()
+        time.sleep(0.2)  # let the port go
+    return {
+        "send_ms": stats["send_ms"] or 0.0,
+        "max_send_ms": stats["max_send_ms"] or 0.0,
+        "dropped": stats["send_drops"],
+        "mean_hz": sum(received) / len(received) / seconds,
+        "min_hz": min(received) / seconds,
+        "lost_pct": 100 * lost / max(1, lost + sum(received)),
+    }
+
+
+def main() -> None:
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 4.0
+    rate_hz = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+    print(f"{seconds:g} s per run, {rate_hz:g} Hz per subscriber, sampled at {SAMPLE_HZ} Hz")
+    print(f"{'mode':<11}{'subs':>6}{'send ms':>9}{'max ms':>8}{'dropped':>9}"
+          f"{'mean Hz':>9}{'min Hz':>8}{'lost %':>8}")
+    for count in SUBSCRIBERS:
+        for mode in ("blocking", "unicast", "multicast"):
+            r = run(mode, count, rate_hz, seconds)
+            print(f"{mode:<11}{count:>6}{r['send_ms']:>9.3f}{r['max_send_ms']:>8.3f}"
+                  f"{r['dropped']:>9}{r['mean_hz']:>9.2f}{r['min_hz']:>8.2f}{r['lost_pct']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
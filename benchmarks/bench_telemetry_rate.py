@@ -0,0 +1,111 @@
+"""Achieved rate and jitter of the UDP telemetry stream, as a subscriber sees it.
+
+No simulator needed; from the repo root:
+
+    python benchmarks/bench_telemetry_rate.py [seconds]
+
+Runs the simulator's TelemetryPublisher (tello_sim/telemetry_publisher.py)
+over a fixed state snapshot on a spare port, with its default 100 Hz
+slots, and subscribes to it at several rates, in three modes:
+
+    sleep       the old loop: sleep one period, then build and send, so
+                every period is stretched by the time the work takes
+    deadline    the publisher's own thread on a monotonic schedule
+    tick        tick-driven: samples taken on a 60 Hz tick loop, as the
+                simulator's window runs, slower than the slots
+
+and prints the rate the subscriber received and the jitter (standard
+deviation of the intervals between datagrams).
+"""
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tello_sim"))
+
+from state_snapshot import StateSnapshot  # noqa: E402
+from telemetry_publisher import MAX_PUBLISH_HZ, TelemetryPublisher  # noqa: E402
+
+PORT = 9988
+TICK_HZ = 60
+
+
+class StandInDrone:
+    """Just enough of UrsinaAdapter for the publisher: a state snapshot."""
+
+    state_snapshot = StateSnapshot(
+        tick=1, mono_time=time.monotonic(), time=time.time(), x=1.0, y=0.5, z=-0.3,
+        yaw=45.0, pitch=0, roll=0, speed_x=0, speed_y=0, speed_z=0, accel_x=0.0,
+        accel_y=0.0, accel_z=0.0, tof=50, battery=100, flight_time=0, flying=True)
+
+
+class SleepingPublisher(TelemetryPublisher):
+    """The publish loop as it was: sleep(interval), then sample."""
+
+    def _next_batches(self):
+        time.sleep(self._interval)
+        now = time.monotonic()
+        slot, self._next_slot = self._next_slot, self._next_slot + 1
+        self._next_due = now + self._interval  # when it will sample next, for _send
+        return self._sample(now, slot)
+
+
+def measure(publisher: TelemetryPublisher, rate_hz: float,
+            seconds: float) -> tuple[float, float]:
+    """Subscribe at `rate_hz` for `seconds`; return (received Hz, jitter ms)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(0.5)
+    sock.sendto(f"subscribe rate={rate_hz:g}".encode(), ("localhost", PORT))
+    arrivals = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        try:
+            sock.recvfrom(4096)
+        except TimeoutError:
+            continue
+        arrivals.append(time.monotonic())
+    sock.sendto(b"unsubscribe", ("localhost", PORT))
+    sock.close()
+    arrivals = arrivals[5:]  # let the subscription settle
+    intervals = [b - a for a, b in zip(arrivals, arrivals[1:])]
+    return (len(intervals) / (arrivals[-1] - arrivals[0]),
+            statistics.pstdev(intervals) * 1000)
+
+
+def run(mode: str, rate_hz: float, seconds: float) -> tuple[float, float]:
+    cls = SleepingPublisher if mode == "sleep" else TelemetryPublisher
+    publisher = cls(StandInDrone(), port=PORT, max_rate_hz=MAX_PUBLISH_HZ,
+                    tick_driven=mode == "tick")
+    publisher.start()
+    ticking = threading.Event()
+    if mode == "tick":
+        def tick_loop():
+            next_tick = time.monotonic()
+            while not ticking.is_set():
+                publisher.on_tick()
+                next_tick += 1 / TICK_HZ
+                time.sleep(max(0.0, next_tick - time.monotonic()))
+        threading.Thread(target=tick_loop, daemon=True).start()
+    try:
+        return measure(publisher, rate_hz, seconds)
+    finally:
+        ticking.set()
+        publisher.stop()
+        time.sleep(0.2)  # let the port go
+
+
+def main() -> None:
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 4.0
+    print(f"{seconds:g} s per run, {MAX_PUBLISH_HZ:g} Hz slots, {TICK_HZ} Hz ticks in tick mode")
+    print(f"{'mode':<10}{'target Hz':>10}{'received Hz':>13}{'jitter ms':>11}")
+    for rate_hz in (10, 50, 100):
+        for mode in ("sleep", "deadline", "tick"):
+            received, jitter = run(mode, rate_hz, seconds)
+            print(f"{mode:<10}{rate_hz:>10}{received:>13.2f}{jitter:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
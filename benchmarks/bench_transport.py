@@ -0,0 +1,72 @@
+"""Loopback TCP vs the AF_UNIX socket, for small commands and frame pulls.
+
+Start the simulator first (python tello_sim/run_sim.py), then from the repo
+root:
+
+    python benchmarks/bench_transport.py [iterations]
+
+Runs the same calls over TCP (127.0.0.1:9999) and over the simulator's unix
+socket, one-shot and in a persistent session: a small getter (get_battery)
+for per-call latency, and get_latest_frame for the throughput of large
+payloads. Frame pulls need the stream on (tello.streamon()); they are
+skipped if the simulator has no frame to send.
+"""
+import statistics
+import sys
+import time
+
+from sim_connection import UNIX_SOCKET_PATH, UNIX_SCHEME, SimConnection
+
+
+def measure(call, iterations: int) -> list[float]:
+    # One warm-up call so the session (if any) is already open.
+    call()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label: str, samples: list[float], payload_bytes: int = 0) -> None:
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    line = (f"{label:<24} mean {statistics.mean(samples):7.3f} ms   "
+            f"median {statistics.median(samples):7.3f} ms   p99 {p99:7.3f} ms")
+    if payload_bytes:
+        mb_per_s = payload_bytes / 1e6 / (statistics.mean(samples) / 1000)
+        line += f"   {mb_per_s:8.1f} MB/s"
+    print(line)
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    tcp_host = "127.0.0.1"
+    unix_host = UNIX_SCHEME + UNIX_SOCKET_PATH
+    if not SimConnection(tcp_host).is_reachable():
+        sys.exit("Simulator not reachable on 127.0.0.1:9999 - start it first.")
+    if not SimConnection(unix_host).is_reachable():
+        sys.exit(f"Simulator has no unix socket at {UNIX_SOCKET_PATH}.")
+
+    frame = SimConnection(tcp_host).request_framed("get_latest_frame")
+    frame_iterations = max(1, iterations // 10)
+    print(f"{iterations} x 'get_battery', {frame_iterations} x 'get_latest_frame'"
+          + (f" ({len(frame)} bytes)" if frame else " (no frame: stream off)"))
+
+    for name, host in (("tcp", tcp_host), ("unix", unix_host)):
+        one_shot = SimConnection(host)
+        session = SimConnection(host, persistent=True)
+        try:
+            report(f"{name} one-shot", measure(lambda: one_shot.request("get_battery"), iterations))
+            report(f"{name} session", measure(lambda: session.request("get_battery"), iterations))
+            if frame:
+                report(f"{name} frame session",
+                       measure(lambda: session.request_framed("get_latest_frame"), frame_iterations),
+                       len(frame))
+        finally:
+            session.close()
+
+
+if __name__ == "__main__":
+    main()
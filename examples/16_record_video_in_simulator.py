@@ -0,0 +1,42 @@
+# Record the drone's camera to a video file, inside the simulator.
+#
+# Compare with 6_record_video.py, which pulls every frame over the network,
+# saves each one as a JPEG and stitches them into a video afterwards. Here
+# the simulator encodes the video itself while it renders, so this script
+# only says when to start and stop. Recording is a simulator-only power,
+# so it lives on SimulatorClient: on a real Tello you would record on the
+# computer receiving the video, like example 6 does.
+
+import os
+import time
+
+from tello_sim_client import TelloSimClient
+from simulator_client import SimulatorClient
+
+tello = TelloSimClient()
+sim = SimulatorClient()
+tello.connect()
+tello.streamon()
+
+recording_folder = os.path.join(os.getcwd(), "output", "tello_recording")
+os.makedirs(recording_folder, exist_ok=True)
+video_file_path = os.path.join(recording_folder, "video_recorded_in_sim.mp4")
+
+sim.record_start(video_file_path)
+
+# Drone mission
+tello.takeoff()
+time.sleep(5)
+tello.move_up(50)
+time.sleep(5)
+tello.rotate_counter_clockwise(360)
+time.sleep(5)
+tello.land()
+
+stats = sim.record_stop()
+if stats:
+    print(f"[Video] Saved {stats['written']} frames at {video_file_path}")
+    if stats["dropped"]:
+        print(f"[Video] The encoder could not keep up with {stats['dropped']} frames")
+
+tello.streamoff()
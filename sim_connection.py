@@ -5,46 +5,197 @@ Both clients talk to the same simulator command server
 here rather than being duplicated in each of them. This is the only module
 on the client side that touches the TCP command channel.
 """
+import json
+import os
 import socket
+import tempfile
+import threading
+import time
+
+# Must match tello_sim/command_server.py.
+SESSION_HELLO = b"session\n"
+DEFAULT_PORT = 9999
+UNIX_SOCKET_PATH = os.environ.get(
+    "TELLO_SIM_UNIX_SOCKET", os.path.join(tempfile.gettempdir(), "tello_sim.sock"))
+UNIX_SCHEME = "unix://"
+# The server closes a session idle this long (command_server.SESSION_IDLE_TIMEOUT_S).
+SESSION_IDLE_TIMEOUT_S = 60.0
+# tello_sim/video_stream.py
+VIDEO_PORT = 11111
+# Longest wait_motion() waits for a move, over all its long-polls, before
+# raising TimeoutError.
+MOTION_TIMEOUT_S = 300.0
+
+
+def parse_frame_reply(data: bytes) -> tuple[dict, memoryview]:
+    """Split an extended get_latest_frame reply into (header, payload).
+
+    The reply is a 2-byte big-endian header length, a JSON header
+    ({"seq": n, "codec": ...} or {"seq": n, "unchanged": true}) and the
+    encoded frame. The payload is a view into `data`, not a copy.
+    """
+    view = memoryview(data)
+    size = int.from_bytes(view[:2], byteorder='big')
+    return json.loads(bytes(view[2:2 + size])), view[2 + size:]
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    """Read exactly `size` bytes; raise ConnectionError if the peer closes."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("connection closed by the simulator")
+        received += count
+    return bytes(buffer)
+
+
+class VideoStreamConnection:
+    """Client end of the simulator's FPV push stream (VIDEO_PORT).
+
+    open() connects and sends the codec line ("png", "jpeg 80", "raw");
+    read_frame() then blocks until the simulator pushes the next frame and
+    returns it as parse_frame_reply's (header, payload). The stream is TCP
+    only, so a unix:// host streams from localhost.
+    """
+
+    def __init__(self, host='localhost', port=VIDEO_PORT, codec='png'):
+        self.host = 'localhost' if host.startswith(UNIX_SCHEME) else host
+        self.port = port
+        self.codec = codec
+        self._socket = None
+
+    def open(self, timeout=5.0) -> None:
+        s = socket.create_connection((self.host, self.port), timeout=timeout)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        s.settimeout(None)
+        s.sendall(self.codec.encode() + b"\n")
+        self._socket = s
+
+    def read_frame(self) -> tuple[dict, memoryview]:
+        """Block for the next pushed frame. Raises ConnectionError on close."""
+        if self._socket is None:
+            raise ConnectionError("video stream is not open")
+        size = int.from_bytes(_recv_exact(self._socket, 4), byteorder='big')
+        header, payload = parse_frame_reply(_recv_exact(self._socket, size))
+        if "error" in header:
+            raise ValueError(f"video stream refused {self.codec!r}: {header['error']}")
+        return header, payload
+
+    def close(self) -> None:
+        if self._socket is not None:
+            try:
+                # shutdown() wakes a thread blocked in read_frame(); close()
+                # alone does not on every platform.
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket.close()
+            self._socket = None
+
+
+class _SessionClosed(ConnectionError):
+    """The server closed a persistent session before reading the command,
+    so sending it again on a new session is safe."""
 
 
 class SimConnection:
     """Request/response plumbing for one simulator host:port.
 
-    Every call opens a fresh connection: the server handles exactly one
-    command per connection and then closes it (see
+    By default every call opens a fresh connection: the server handles
+    exactly one command per connection and then closes it (see
     tello_sim/command_server.py:_handle_connection).
+
+    With persistent=True the connection is opened once, switched into a
+    session with SESSION_HELLO, and reused for every call: each command goes
+    out newline-terminated and comes back as one length-prefixed reply. That
+    skips the connect/accept/close cycle per call, which dominates the cost
+    of small commands polled at 20-50 Hz. Calls are serialized on a lock, so
+    one SimConnection can be shared between threads.
+
+    `session_setup` lists commands (e.g. "motion_replies on") replayed every
+    time a session is opened, so per-session options survive a reconnect.
+    Their replies are discarded.
+
+    Transport: a host of the form "unix:///path/to/socket" talks to the
+    simulator's AF_UNIX listener at that path. The default host
+    "localhost" on the default port uses the unix socket too whenever the
+    simulator has one (see UNIX_SOCKET_PATH), and falls back to TCP if it
+    does not; any other host, including "127.0.0.1", is plain TCP.
     """
 
-    def __init__(self, host='localhost', port=9999):
+    def __init__(self, host='localhost', port=9999, persistent=False, session_setup=()):
         self.host = host
         self.port = port
+        self.persistent = persistent
+        self.session_setup = tuple(session_setup)
+        self._session = None
+        self._session_lock = threading.Lock()
+        # monotonic() of the session's last reply, or of its opening.
+        self._session_active = 0.0
+        # Sessions opened so far. A new one may be talking to a restarted
+        # simulator, so callers caching server state compare this.
+        self.sessions_opened = 0
+        if host.startswith(UNIX_SCHEME):
+            self._unix_path = host[len(UNIX_SCHEME):]
+            self._unix_fallback = False
+        elif (host == 'localhost' and port == DEFAULT_PORT and UNIX_SOCKET_PATH
+              and hasattr(socket, "AF_UNIX") and os.path.exists(UNIX_SOCKET_PATH)):
+            self._unix_path = UNIX_SOCKET_PATH
+            self._unix_fallback = True
+        else:
+            self._unix_path = None
+            self._unix_fallback = False
+
+    @property
+    def address(self) -> str:
+        """Where the server is, for messages: "host:port" or "unix://path"."""
+        if self.host.startswith(UNIX_SCHEME):
+            return self.host
+        return f"{self.host}:{self.port}"
+
+    @property
+    def transport(self) -> str:
+        """"unix" or "tcp": what the next connection will use."""
+        return "unix" if self._unix_path is not None else "tcp"
 
     def is_reachable(self, timeout=1.0) -> bool:
         """True if the simulator's command server accepts a connection."""
         try:
-            with socket.create_connection((self.host, self.port), timeout=timeout):
+            with self._connect(timeout):
                 return True
         except OSError:
             # ConnectionRefusedError and socket.timeout are both OSError
             # subclasses, so this one clause covers every failure mode.
             return False
 
+    def close(self) -> None:
+        """Close the persistent session, if one is open."""
+        with self._session_lock:
+            self._close_session()
+
     def send(self, command: str) -> None:
         """Fire-and-forget a command that produces no reply."""
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((self.host, self.port))
-                s.send(command.encode())
+            if self.persistent:
+                # The session answers every command (possibly with an empty
+                # reply); reading it keeps the stream in step.
+                self._session_call(command)
+                return
+            with self._connect() as s:
+                s.sendall(command.encode())
         except ConnectionRefusedError:
-            print(f"[Error] Unable to connect to the simulation at {self.host}:{self.port}")
+            print(f"[Error] Unable to connect to the simulation at {self.address}")
 
     def request(self, command: str) -> str:
         """Send a command and return its reply, or "N/A" if unreachable."""
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((self.host, self.port))
-                s.send(command.encode())
+            if self.persistent:
+                return self._session_call(command).decode()
+            with self._connect() as s:
+                s.sendall(command.encode())
                 # The server sends one response and closes the connection, so
                 # read until EOF. A single recv() can return a truncated
                 # payload when TCP splits a larger JSON response (get_state /
@@ -57,9 +208,46 @@ class SimConnection:
                     chunks.append(chunk)
                 return b''.join(chunks).decode()
         except ConnectionRefusedError:
-            print(f"[Error] Unable to retrieve '{command}' from {self.host}:{self.port}")
+            print(f"[Error] Unable to retrieve '{command}' from {self.address}")
             return "N/A"
 
+    def wait_motion(self, motion_id=0, timeout=MOTION_TIMEOUT_S) -> str:
+        """Long-poll until motion `motion_id` finishes (0: until nothing is
+        moving) and return the server's reply, "ok" or "error <reason>".
+
+        The server answers "error timeout" once its own limit passes, so
+        this asks again until `timeout` seconds have gone by in all, then
+        raises TimeoutError rather than waiting for ever on a move that
+        will not finish.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"motion {motion_id or '(all)'} still pending after {timeout:g} s")
+            reply = self.request(f"wait_motion {motion_id} {remaining:.3f}")
+            if reply != "error timeout":
+                return reply
+
+    def request_batch(self, commands: list[str]) -> list[str]:
+        """Send many commands in one `batch` message; return one reply each.
+
+        The server parses the whole batch before running any of it, queues
+        its flight commands in one go, and answers with a JSON list. If the
+        batch cannot be sent or is rejected outright, every entry is that one
+        reply ("N/A" when the simulator is unreachable).
+        """
+        if not commands:
+            return []
+        message = f"batch {len(commands)}\n" + "\n".join(commands)
+        # A session terminates the message itself; a one-shot connection
+        # must send the last line's newline too.
+        reply = self.request(message if self.persistent else message + "\n")
+        try:
+            return json.loads(reply)
+        except json.JSONDecodeError:
+            return [reply] * len(commands)
+
     def request_framed(self, command: str) -> bytes | None:
         """Send a command whose reply is a 4-byte big-endian length + payload.
 
@@ -67,9 +255,17 @@ class SimConnection:
         server reports no frame (length 0) or the transfer fails.
         """
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((self.host, self.port))
-                s.send(command.encode())
+            if self.persistent:
+                # A session reply is already length-prefixed, so the frame
+                # channel needs no second header.
+                frame_data = self._session_call(command)
+                if not frame_data:
+                    print("[Debug] No frame available from simulator")
+                    return None
+                return frame_data
+
+            with self._connect() as s:
+                s.sendall(command.encode())
 
                 # Receive frame size (4 bytes)
                 size_data = s.recv(4)
@@ -106,8 +302,116 @@ class SimConnection:
                 return b''.join(chunks)
 
         except ConnectionRefusedError:
-            print(f"[Error] Unable to connect to the simulation at {self.host}:{self.port}")
+            print(f"[Error] Unable to connect to the simulation at {self.address}")
             return None
         except Exception as e:
             print(f"[Error] Failed to get frame: {e}")
             return None
+
+    def _connect(self, timeout=None) -> socket.socket:
+        """Open a connection to the command server over the chosen transport.
+
+        An unreachable unix socket raises ConnectionRefusedError like TCP,
+        unless it was picked automatically: then the connection falls back
+        to TCP, and stays on TCP from then on.
+        """
+        if self._unix_path is not None:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.settimeout(timeout)
+            try:
+                s.connect(self._unix_path)
+                return s
+            except OSError as e:
+                s.close()
+                if not self._unix_fallback:
+                    raise ConnectionRefusedError(f"{self._unix_path}: {e}") from e
+                self._unix_path = None
+        s = socket.create_connection((self.host, self.port), timeout=timeout)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return s
+
+    # -------------------------------------------------------------- session ---
+    def _session_call(self, command: str) -> bytes:
+        """Run one command over the persistent session and return its reply.
+
+        A call that finds the session dead reconnects and retries once, but
+        only if the server cannot have run the command: sending it failed, or
+        the session had been idle past SESSION_IDLE_TIMEOUT_S, so the server
+        had closed it before the command arrived. A session that closes
+        without replying at any other time may have read and run the command
+        first (a handler that crashed, say); running a move twice is worse
+        than failing, so that raises ConnectionError, and the next call
+        opens a new session.
+        """
+        with self._session_lock:
+            for attempt in range(2):
+                try:
+                    if self._session is None:
+                        self._open_session()
+                    return self._roundtrip(command)
+                except _SessionClosed as e:
+                    self._close_session()
+                    if attempt:
+                        raise ConnectionError(str(e)) from e
+                except OSError:
+                    self._close_session()
+                    raise
+            raise AssertionError("unreachable")
+
+    def _open_session(self) -> None:
+        s = self._connect()
+        s.sendall(SESSION_HELLO)
+        self._session = s
+        self._session_active = time.monotonic()
+        self.sessions_opened += 1
+        for command in self.session_setup:
+            self._roundtrip(command)
+
+    def _roundtrip(self, command: str) -> bytes:
+        """Send one command and read its reply. Raises _SessionClosed only
+        when the server cannot have run the command."""
+        idle = time.monotonic() - self._session_active
+        try:
+            self._session.sendall(command.encode() + b"\n")
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise _SessionClosed(f"session closed by the simulator ({e})") from e
+        try:
+            header = self._recv_exact(4, first=True)
+        except _SessionClosed:
+            if idle < SESSION_IDLE_TIMEOUT_S:
+                raise ConnectionError(
+                    f"session closed before replying to '{command}'; it may have run") from None
+            raise
+        reply = self._recv_exact(int.from_bytes(header, byteorder='big'))
+        self._session_active = time.monotonic()
+        return reply
+
+    def _close_session(self) -> None:
+        if self._session is not None:
+            try:
+                self._session.close()
+            except OSError:
+                pass
+            self._session = None
+
+    def _recv_exact(self, size: int, first: bool = False) -> bytes:
+        """Read exactly `size` bytes from the session.
+
+        With first=True, a close or reset before any byte arrives raises
+        _SessionClosed, which _roundtrip decides about; anything later is a
+        plain ConnectionError, because by then the command has already run.
+        """
+        chunks = []
+        remaining = size
+        while remaining:
+            try:
+                chunk = self._session.recv(min(65536, remaining))
+            except ConnectionResetError:
+                chunk = b''
+            if not chunk:
+                if first and remaining == size:
+                    raise _SessionClosed("session closed by the simulator")
+                raise ConnectionError("session closed mid-reply")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b''.join(chunks)
@@ -1,8 +1,8 @@
 """Simulator-only client.
 
 Everything here is a capability the simulator has and a real DJI Tello does
-not: ground-truth position, a push telemetry stream, motion-completion
-polling. Keeping it off TelloSimClient means a call site reads as `sim.` the
+not: ground-truth position, a push telemetry stream, waiting for motion
+completion. Keeping it off TelloSimClient means a call site reads as `sim.` the
 moment it stops being portable to real hardware.
 
 Construct it alongside the drone client:
@@ -12,23 +12,112 @@ Construct it alongside the drone client:
 """
 import json
 import logging
+import os
 # Only for the UDP telemetry stream. The TCP command channel lives entirely
 # in SimConnection; this socket is a different protocol on a different port.
 import socket
+import struct
 import threading
 import time
+from collections import deque
 
-from sim_connection import SimConnection
+import numpy as np
+
+from sim_connection import MOTION_TIMEOUT_S, SimConnection, parse_frame_reply
+from tello_sim.telemetry_codec import decode_state
+from tello_sim_client import decode_frame
+
+
+# Samples whose latency telemetry_stats() summarizes.
+LATENCY_WINDOW = 1000
+# A seq this far below the highest one seen means the simulator restarted,
+# not that a sample arrived late.
+RESTART_SEQ_GAP = 1000
+# Where a simulator run with TELLO_SIM_TELEMETRY_GROUP multicasts its samples.
+TELEMETRY_GROUP_PORT = 9997
+
+
+class TelemetryStats:
+    """Loss, reordering and latency of a telemetry subscription, from the
+    samples' "seq" and timestamps. Updated by the reader thread.
+
+    Latency is the time from the simulator taking the state to the sample
+    arriving here. A simulator on this machine is timed on the shared
+    monotonic clock ("sim_time"); a remote one on the wall clock ("time"),
+    which is only as good as the two machines' clock sync.
+    """
+
+    def __init__(self, local):
+        self._local = local
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicates = 0
+        self.max_gap = 0
+        self._highest = None
+        # Recent seqs skipped over, in case they arrive late after all.
+        self._missing = set()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, state):
+        seq = state.get("seq")
+        if seq is None:
+            return
+        self.received += 1
+        if self._highest is None or seq < self._highest - RESTART_SEQ_GAP:
+            self._highest = seq
+            self._missing.clear()
+        elif seq > self._highest:
+            gap = seq - self._highest - 1
+            self.lost += gap
+            self.max_gap = max(self.max_gap, gap)
+            self._missing.update(range(max(self._highest + 1, seq - RESTART_SEQ_GAP), seq))
+            self._highest = seq
+            if len(self._missing) > RESTART_SEQ_GAP:
+                floor = seq - RESTART_SEQ_GAP
+                self._missing = {m for m in self._missing if m > floor}
+        elif seq in self._missing:
+            # Counted as lost when the newer ones overtook it.
+            self._missing.discard(seq)
+            self.reordered += 1
+            self.lost -= 1
+        else:
+            self.duplicates += 1
+        if self._local and "sim_time" in state:
+            latency = time.monotonic() - state["sim_time"]
+        elif "time" in state:
+            latency = time.time() - state["time"]
+        else:
+            return  # subscribed without the timestamps
+        self._latencies.append(latency * 1000)
+
+    def as_dict(self):
+        latencies = sorted(self._latencies)
+        stats = {
+            "received": self.received,
+            "lost": self.lost,
+            "reordered": self.reordered,
+            "duplicates": self.duplicates,
+            "max_gap": self.max_gap,
+            "latency_ms": None,
+        }
+        if latencies:
+            def percentile(p):
+                return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 3)
+            stats["latency_ms"] = {"p50": percentile(0.5), "p90": percentile(0.9),
+                                   "p99": percentile(0.99), "max": round(latencies[-1], 3)}
+        return stats
 
 
 class SimulatorClient:
-    def __init__(self, host='localhost', port=9999, telemetry_port=9998):
-        self._conn = SimConnection(host, port)
+    def __init__(self, host='localhost', port=9999, telemetry_port=9998, persistent=False):
+        self._conn = SimConnection(host, port, persistent=persistent)
         self.telemetry_port = telemetry_port
         self._telemetry_thread = None
         self._telemetry_stop = None
         self._telemetry_socket = None
         self._telemetry_addr = None
+        self._telemetry_stats = None
 
     @property
     def host(self):
@@ -38,27 +127,131 @@ class SimulatorClient:
     def port(self):
         return self._conn.port
 
+    def close(self):
+        """Close the persistent command session, if one is open."""
+        self._conn.close()
+
     def is_simulator_running(self) -> bool:
         """True if the simulator's command server is accepting connections."""
         return self._conn.is_reachable()
 
-    def wait_until_motion_complete(self):
+    def wait_until_motion_complete(self, timeout=MOTION_TIMEOUT_S):
         """Block until the simulated drone has finished moving.
 
         A real Tello blocks inside the move command itself, so there is no
-        djitellopy equivalent to poll.
+        djitellopy equivalent to poll. The simulator holds the `wait_motion`
+        reply until no motion is pending, so this returns as soon as the last
+        move completes instead of on the next poll. Raises TimeoutError if
+        something is still moving after `timeout` seconds.
         """
-        while self._conn.request("get_is_moving") == "True":
-            time.sleep(0.1)
+        self._conn.wait_motion(0, timeout)
 
     def capture_frame(self):
-        """Tell the simulator to capture the current FPV frame.
+        """Take a photo: the simulator keeps its next FPV frame in memory.
 
-        The simulator holds the frame in memory and bumps its capture counter
-        (reported when the stream is stopped); nothing is written to disk.
+        The stream must be on. Fetch photos with get_captures(); the
+        simulator keeps the last 64. With save_captures() they are also
+        written to disk as they are taken.
         """
         self._conn.send('capture_frame')
 
+    def get_captures(self, since_id=0, codec='png'):
+        """Every photo newer than `since_id`, fetched in one request.
+
+        Returns a list of {"id", "frame", "capture"} dicts, oldest first:
+        frame is RGB like get_frame_read().frame, and capture is the frame's
+        capture record (see get_frame_and_state). Pass the last id you got
+        as since_id to fetch only new photos. `codec` is as for
+        TelloSimClient's frame_codec.
+        """
+        command = f'get_captures {since_id} {codec}'
+        frame_data = self._conn.request_framed(command)
+        if frame_data is None:
+            return []
+        header, payload = parse_frame_reply(frame_data)
+        photos = []
+        offset = 0
+        for entry in header.get("photos", []):
+            size = entry["size"]
+            frame = decode_frame({"codec": header["codec"], **entry}, payload[offset:offset + size])
+            offset += size
+            photos.append({"id": entry["id"], "frame": frame, "capture": entry.get("capture")})
+        return photos
+
+    def save_captures(self, directory):
+        """Have the simulator save every new photo to `directory` (on its
+        machine) as photo_<id>.png plus photo_<id>.json, from a background
+        thread. None stops saving. Returns True on success."""
+        target = "off" if directory is None else os.path.abspath(directory)
+        reply = self._conn.request(f'save_captures {target}')
+        if reply != "ok":
+            print(f"[Error] save_captures: {reply}")
+        return reply == "ok"
+
+    def get_frame_and_state(self, codec='png'):
+        """The latest FPV frame and the drone's state when it was rendered.
+
+        Returns (frame, capture): frame is RGB like get_frame_read().frame,
+        and capture is {"mono_time", "wall_time", "state"}, where state is
+        get_state()'s snapshot taken on the tick that rendered the frame.
+        Calling get_frame_read() and then get_state() instead pairs the frame
+        with a later tick's pose. `codec` is as for TelloSimClient's
+        frame_codec. Returns (None, None) if there is no frame.
+        """
+        frame_data = self._conn.request_framed(f'get_latest_frame {codec}')
+        if frame_data is None:
+            return None, None
+        header, payload = parse_frame_reply(frame_data)
+        return decode_frame(header, payload), header.get("capture")
+
+    def get_latest_depth(self):
+        """The latest FPV frame's depth image, for obstacle avoidance.
+
+        Returns (depth, capture): depth is a float16 array of distances
+        along the camera axis in metres, the same size as the FPV frame,
+        top row first (open sky reads as the far plane); capture is as for
+        get_frame_and_state. The simulator reads depth back only for a
+        couple of seconds after a request, so the first call waits for a
+        frame that has it. Returns (None, None) if there is none.
+        """
+        frame_data = self._conn.request_framed('get_latest_depth')
+        if frame_data is None:
+            return None, None
+        if frame_data.startswith(b"error"):
+            print(f"[Error] get_latest_depth: {frame_data.decode()}")
+            return None, None
+        header, payload = parse_frame_reply(frame_data)
+        depth = np.frombuffer(payload, header["dtype"]).reshape(header["shape"])
+        return depth, header.get("capture")
+
+    def record_start(self, path, fps=None):
+        """Have the simulator record its FPV stream to a video file.
+
+        `path` is opened by the simulator, so relative paths are relative to
+        where it runs; pass an absolute path. The extension picks the
+        container (.mp4, .avi, .mkv). `fps` defaults to the stream's rate.
+        The stream must be on. Returns True if recording started.
+        """
+        reply = self._conn.request('record_start ' + (f'fps={fps} ' if fps else '')
+                                   + os.path.abspath(path))
+        if reply != "ok":
+            print(f"[Error] record_start: {reply}")
+        return reply == "ok"
+
+    def record_stop(self):
+        """Stop recording and return its stats as a dict, or None.
+
+        {"path", "fps", "offered", "written", "dropped"}: `dropped` counts
+        frames the encoder could not keep up with; the video repeats the
+        previous frame in their place, so it still plays in real time.
+        """
+        data = self._conn.request('record_stop')
+        try:
+            return json.loads(data)
+        except (json.JSONDecodeError, TypeError):
+            print(f"[Error] record_stop: {data}")
+            return None
+
     def get_position(self):
         """Poll the drone's position: {'x': m, 'y': m, 'z': m, 'yaw': deg}.
 
@@ -80,13 +273,64 @@ class SimulatorClient:
         except (json.JSONDecodeError, TypeError):
             return None
 
-    def subscribe_state(self, callback):
-        """Subscribe to the simulator's UDP telemetry stream (~10 Hz).
+    def get_mailbox_stats(self):
+        """Poll the simulator's command mailbox as a dict, or None.
+
+        Flight commands are queued for the simulator's render thread and run
+        at the start of a frame. `depth` is how many are still waiting;
+        `recent_waits` lists [command, milliseconds waited] for the latest
+        ones, and `mean_wait_ms`/`max_wait_ms` summarize them.
+        """
+        data = self._conn.request('get_mailbox_stats')
+        try:
+            return json.loads(data)
+        except (json.JSONDecodeError, TypeError):
+            return None
+
+    def get_telemetry_stats(self):
+        """Poll the UDP telemetry stream's rate as a dict, or None.
+
+        `rate_hz` is the configured rate (TELLO_SIM_TELEMETRY_HZ) and
+        `achieved_hz` the rate over the last few hundred samples;
+        `jitter_ms` is the standard deviation of the intervals between them.
+        """
+        data = self._conn.request('get_telemetry_stats')
+        try:
+            return json.loads(data)
+        except (json.JSONDecodeError, TypeError):
+            return None
+
+    def subscribe_state(self, callback, binary=False, rate_hz=None, fields=None, group=None):
+        """Subscribe to the simulator's UDP telemetry stream (10 Hz unless
+        the simulator runs with TELLO_SIM_TELEMETRY_HZ set).
 
         `callback` is invoked with a state dict for every update, from a
         background thread, until unsubscribe_state() is called. The
         subscription is kept alive automatically.
+
+        With `binary`, the simulator sends each sample in a compact struct
+        layout (tello_sim/telemetry_codec.py) instead of JSON: about a
+        quarter of the bytes and much cheaper to decode. The callback gets
+        the same dict either way; x/y/z/yaw are then float32, so not rounded.
+
+        `rate_hz` asks for another rate, up to the simulator's
+        TELLO_SIM_TELEMETRY_MAX_HZ (100 by default); rates that do not divide
+        it are rounded to one that does (e.g. 30 -> 33.3). `fields` limits
+        the dicts to those keys, e.g. ("x", "y", "z", "battery"); the names
+        are those of tello_sim/telemetry_codec.py's FIELDS.
+
+        Each dict carries the sample's "seq" and, unless `fields` leaves it
+        out, "sim_time"; see telemetry_stats() for the loss and latency they
+        add up to.
+
+        `group` joins the multicast group a simulator on this machine was
+        started with (TELLO_SIM_TELEMETRY_GROUP) instead of subscribing: the
+        simulator sends each sample once for all of its listeners, binary,
+        with every field, at TELLO_SIM_TELEMETRY_HZ. Worth it with many
+        listeners; `rate_hz` and `fields` do not apply.
         """
+        if group is not None and (rate_hz is not None or fields is not None):
+            raise ValueError("rate_hz and fields do not apply to a multicast group")
         if self._telemetry_thread:
             print("[Wrapper] Already subscribed to telemetry.")
             return
@@ -104,6 +348,27 @@ class SimulatorClient:
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         sock.settimeout(1.0)
         addr = (self.host, self.telemetry_port)
+        options = ['subscribe', 'bin' if binary else 'json']
+        if rate_hz is not None:
+            options.append(f'rate={rate_hz:g}')
+        if fields is not None:
+            options.append('fields=' + ','.join(fields))
+        subscribe = ' '.join(options).encode()
+        decode = decode_state if binary else json.loads
+        if group is not None:
+            # Several listeners share the port; the simulator only sends
+            # over loopback, so join the group there.
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.bind(('', TELEMETRY_GROUP_PORT))
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                                socket.inet_aton(group) + socket.inet_aton('127.0.0.1'))
+            except OSError:
+                sock.close()
+                raise
+            subscribe = None
+            decode = decode_state
+        stats = TelemetryStats(local=self.host in ('localhost', '127.0.0.1', '::1'))
 
         def _reader() -> None:
             last_keepalive = 0.0
@@ -111,9 +376,9 @@ class SimulatorClient:
                 while not stop_event.is_set():
                     now = time.time()
                     # Refresh the subscription well inside the server's 10 s TTL.
-                    if now - last_keepalive > 3.0:
+                    if subscribe and now - last_keepalive > 3.0:
                         try:
-                            sock.sendto(b'subscribe', addr)
+                            sock.sendto(subscribe, addr)
                             last_keepalive = now
                         except OSError:
                             pass
@@ -123,10 +388,17 @@ class SimulatorClient:
                         continue
                     except OSError:
                         break
-                    try:
-                        callback(json.loads(data.decode()))
-                    except json.JSONDecodeError:
+                    if data.startswith(b'error'):
+                        # The simulator turned the subscription down.
+                        print(f"[Wrapper] Telemetry: {data.decode(errors='replace')}")
                         continue
+                    try:
+                        state = decode(data)
+                    except (ValueError, struct.error):
+                        continue  # not a sample (JSONDecodeError is a ValueError)
+                    stats.add(state)
+                    try:
+                        callback(state)
                     except Exception:
                         # A failing callback must not kill the stream.
                         logging.exception("[Wrapper] Telemetry callback raised")
@@ -144,8 +416,23 @@ class SimulatorClient:
         self._telemetry_socket = sock
         self._telemetry_addr = addr
         self._telemetry_thread = thread
+        self._telemetry_stats = stats
         thread.start()
 
+    def telemetry_stats(self):
+        """Counters for the current (or last) subscribe_state subscription, or None.
+
+        {"received", "lost", "reordered", "duplicates", "max_gap",
+        "latency_ms": {"p50", "p90", "p99", "max"}}: `lost` counts sequence
+        numbers never received (a sample that arrives late is taken back
+        off it and counted in `reordered`), `max_gap` is the longest run of
+        consecutive lost samples, and the latency percentiles cover the last
+        LATENCY_WINDOW samples, from the simulator taking the state to the
+        sample arriving.
+        """
+        stats = self._telemetry_stats
+        return stats.as_dict() if stats is not None else None
+
     def unsubscribe_state(self):
         """Stop the UDP telemetry subscription started by subscribe_state()."""
         thread = self._telemetry_thread
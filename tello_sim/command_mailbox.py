@@ -0,0 +1,149 @@
+"""Hand-off of commands from server threads to the render thread.
+
+Flight commands arrive on CommandServer's worker threads, but they mutate
+Ursina entities and schedule invoke() Sequences, which must only happen on
+the render thread while nothing else is touching the scene. Workers post()
+them here instead of calling the adapter, and UrsinaAdapter.tick() drains
+the mailbox at the top of every frame, within a per-frame budget so a flood
+of commands spreads over several frames instead of stalling one.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from collections import deque
+from time import perf_counter
+from typing import Callable, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Wait times remembered for stats(); older ones fall off.
+RECENT_WAITS = 256
+
+
+class _Entry(NamedTuple):
+    posted_at: float
+    label: str
+    func: Callable
+    args: tuple
+    # Moves the drone; see CommandMailbox.cancel_flight.
+    flight: bool
+    motion_ids: tuple[int, ...]
+
+
+class CommandMailbox:
+    """Multi-producer, single-consumer command queue.
+
+    deque.append/appendleft/popleft are atomic, so ordinary posts and drain()
+    take no lock and producers never block the render thread. Only urgent
+    posts, which are rare, share a lock with cancel_flight(). Every entry
+    records when it was posted, so drain() can report how long each command
+    waited before it ran.
+    """
+
+    def __init__(self, max_commands_per_frame: int, max_ms_per_frame: float,
+                 fail_motion: Callable[[int, str], None] | None = None):
+        self.max_commands_per_frame = max_commands_per_frame
+        self.max_ms_per_frame = max_ms_per_frame
+        # MotionTracker.finish: a command that raises finishes its motion ids
+        # with an error, or their waiters would wait for ever.
+        self._fail_motion = fail_motion
+        # Keeps urgent posts from slipping into the front of the queue while
+        # cancel_flight() works through it.
+        self._front_lock = threading.Lock()
+        self._queue: deque = deque()
+        self._recent_waits: deque = deque(maxlen=RECENT_WAITS)  # (label, wait_ms)
+        self.executed = 0
+        self.max_wait_ms = 0.0
+
+    @property
+    def depth(self) -> int:
+        """Commands posted but not yet run."""
+        return len(self._queue)
+
+    def post(self, label: str, func: Callable, *args, urgent: bool = False,
+             flight: bool = False, motion_ids: tuple[int, ...] = ()) -> None:
+        """Queue func(*args) for the render thread. Safe from any thread.
+
+        `urgent` puts it at the front (emergency must not wait behind a
+        backlog of moves). `flight` marks a command that moves the drone,
+        which cancel_flight() drops; `motion_ids` are the ids it would
+        finish.
+        """
+        entry = _Entry(perf_counter(), label, func, args, flight, motion_ids)
+        if urgent:
+            with self._front_lock:
+                self._queue.appendleft(entry)
+        else:
+            self._queue.append(entry)
+
+    def drain(self) -> int:
+        """Run queued commands until the queue or this frame's budget runs out.
+
+        Render thread only. At least one command runs per call, so a budget
+        smaller than one command still makes progress. Returns how many ran.
+        """
+        start = perf_counter()
+        budget_s = self.max_ms_per_frame / 1000
+        ran = 0
+        while ran < self.max_commands_per_frame:
+            try:
+                posted_at, label, func, args, _, motion_ids = self._queue.popleft()
+            except IndexError:
+                break
+            wait_ms = (perf_counter() - posted_at) * 1000
+            self._recent_waits.append((label, round(wait_ms, 3)))
+            if wait_ms > self.max_wait_ms:
+                self.max_wait_ms = wait_ms
+            try:
+                func(*args)
+            except Exception as e:
+                # One bad command must not drop the rest of the frame's work.
+                logger.exception("[Mailbox] Command '%s' raised", label)
+                if self._fail_motion is not None:
+                    for motion_id in motion_ids:
+                        self._fail_motion(motion_id, f"error {label} failed: {e}")
+            ran += 1
+            if perf_counter() - start >= budget_s:
+                break
+        self.executed += ran
+        return ran
+
+    def cancel_flight(self) -> list[int]:
+        """Drop the flight commands still waiting; return their motion ids.
+
+        Render thread only: UrsinaAdapter.emergency() calls it, so that a
+        move or takeoff posted before the emergency cannot run after it.
+        The other entries stay, in order. Exactly the entries queued when this
+        starts are looked at: ordinary posts append behind them, and urgent
+        posts, which would go in front, wait for the lock until the kept
+        entries are back. Commands posted from now on are not cancelled.
+        """
+        kept = []
+        motion_ids = []
+        with self._front_lock:
+            # drain() pops on this same thread, so the first len() entries
+            # stay the ones queued now.
+            for _ in range(len(self._queue)):
+                entry = self._queue.popleft()
+                if entry.flight:
+                    motion_ids.extend(entry.motion_ids)
+                    logger.info("[Mailbox] Dropped '%s' for an emergency", entry.label)
+                else:
+                    kept.append(entry)
+            self._queue.extendleft(reversed(kept))
+        return motion_ids
+
+    def stats(self) -> dict:
+        """Queue depth and per-command wait times, for get_mailbox_stats."""
+        recent = list(self._recent_waits)
+        waits = [w for _, w in recent]
+        return {
+            "depth": self.depth,
+            "executed": self.executed,
+            "max_commands_per_frame": self.max_commands_per_frame,
+            "max_ms_per_frame": self.max_ms_per_frame,
+            "mean_wait_ms": round(sum(waits) / len(waits), 3) if waits else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+            "recent_waits": recent,
+        }
@@ -0,0 +1,326 @@
+"""The TCP command table: every command name, its arguments, and how to parse them.
+
+The protocol is one command per line: a name followed by space-separated
+arguments (`forward 50`, `go 100 0 20 50`). Each name maps to a CommandSpec
+that knows its argument types, defaults and bounds, so every command is
+parsed and validated by the same code and a bad line always fails the same
+way: parse_command raises CommandError, and the server answers
+`error <message>`.
+
+The handlers live on CommandServer (`_cmd_<handler>`); this module is only
+the table, with no Ursina dependency, so it can be benchmarked on its own
+(benchmarks/bench_command_dispatch.py).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, NamedTuple
+
+_REQUIRED = object()
+
+
+class CommandError(ValueError):
+    """A command line that cannot run: unknown name or bad arguments."""
+
+
+@dataclass(frozen=True)
+class Arg:
+    """One positional argument: converter, optional default, optional bounds."""
+    name: str
+    type: Callable[[str], Any] = float
+    default: Any = _REQUIRED
+    low: float | None = None
+    high: float | None = None
+    choices: tuple | None = None
+
+    @property
+    def checked(self) -> bool:
+        """True if converting needs more than calling the bare type."""
+        return self.low is not None or self.high is not None or self.choices is not None
+
+    def convert(self, token: str) -> Any:
+        try:
+            value = self.type(token)
+        except ValueError:
+            raise CommandError(
+                f"{self.name} must be {self.type.__name__}, got '{token}'") from None
+        if self.low is not None and value < self.low:
+            raise CommandError(f"{self.name} must be >= {self.low}, got {value}")
+        if self.high is not None and value > self.high:
+            raise CommandError(f"{self.name} must be <= {self.high}, got {value}")
+        if self.choices is not None and value not in self.choices:
+            raise CommandError(
+                f"{self.name} must be one of {', '.join(map(str, self.choices))}, got '{token}'")
+        return value
+
+
+@dataclass(frozen=True)
+class CommandSpec:
+    """How to parse one command and which handler runs it.
+
+    `handler` names the CommandServer method `_cmd_<handler>` (defaults to
+    the command name); `bound` is prepended to the parsed arguments, so
+    `forward 50` and `left 50` can share `_cmd_move("forward"|"left", 50)`.
+    """
+    name: str
+    args: tuple[Arg, ...] = ()
+    handler: str = ""
+    bound: tuple = ()
+    # The one-shot reply is length-prefixed (the frame channel).
+    framed: bool = False
+    # Runs under CommandServer's state lock. Off for commands that only grab
+    # a reference and then spend their time encoding (frame pulls).
+    locked: bool = True
+    # Touches Ursina entities or schedules animations, so it is posted to the
+    # render thread's mailbox instead of running on the server thread. Such
+    # handlers reply nothing: they have not run yet when the reply goes out.
+    main_thread: bool = False
+    # Posted to the front of the mailbox, ahead of any backlog.
+    urgent: bool = False
+    # Moves the drone: dropped by an emergency while it still waits in the
+    # mailbox. Every motion command is one.
+    flight: bool = False
+    # A queued move: gets a motion id (appended to the handler's arguments)
+    # and replies with it, or with "ok"/"error" on completion when the
+    # session has motion_replies on.
+    motion: bool = False
+    # Needs per-connection state: the handler receives the session first,
+    # and the command is rejected on a one-shot connection.
+    session_only: bool = False
+    # For arguments that are not a fixed positional list: turns the tokens
+    # into handler arguments (raising CommandError) instead of `args`.
+    parser: Callable[[list[str]], tuple] | None = None
+    # The whole rest of the line is one token, spaces included, so a path
+    # with spaces in it survives (see parse_command).
+    rest_of_line: bool = False
+    # Precompiled in __post_init__ so parse() does no per-call setup.
+    _required: int = field(init=False, repr=False, compare=False)
+    _converters: tuple = field(init=False, repr=False, compare=False)
+    _defaults: tuple = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if not self.handler:
+            object.__setattr__(self, "handler", self.name)
+        if self.motion:
+            object.__setattr__(self, "flight", True)
+        required = sum(1 for a in self.args if a.default is _REQUIRED)
+        if any(a.default is _REQUIRED for a in self.args[required:]):
+            raise ValueError(f"{self.name}: required arguments must come first")
+        object.__setattr__(self, "_required", required)
+        # Unchecked arguments convert with the bare type (float("50")); only
+        # bounded/enumerated ones pay for Arg.convert's checks.
+        object.__setattr__(self, "_converters", tuple(
+            a.convert if a.checked else a.type for a in self.args))
+        object.__setattr__(self, "_defaults", tuple(a.default for a in self.args))
+
+    def parse(self, tokens: list[str]) -> tuple:
+        """Convert `tokens` to handler arguments (bound ones included)."""
+        if self.parser is not None:
+            return self.bound + self.parser(tokens)
+        count = len(tokens)
+        if not self._required <= count <= len(self._converters):
+            usage = " ".join(a.name if a.default is _REQUIRED else f"[{a.name}]"
+                             for a in self.args)
+            raise CommandError(f"usage: {self.name} {usage}".rstrip())
+        if not count:
+            return self.bound + self._defaults
+        try:
+            values = [convert(token) for convert, token in zip(self._converters, tokens)]
+        except CommandError:
+            raise
+        except ValueError:
+            # A bare type rejected its token; redo it via Arg.convert, which
+            # names the offending argument in the error.
+            for arg, token in zip(self.args, tokens):
+                arg.convert(token)
+            raise
+        return (*self.bound, *values, *self._defaults[count:])
+
+
+class FrameRequest(NamedTuple):
+    """Options of an extended get_latest_frame request."""
+    codec: str = "png"
+    # PNG compression level / JPEG quality; None for the codec's default.
+    param: int | None = None
+    # Reply "unchanged" (no payload) if the latest frame is still this one.
+    # Any other seq gets the frame: a higher one means the simulator
+    # restarted and its frame seqs started over.
+    if_newer_than: int | None = None
+
+
+# codec -> its optional parameter (None: takes none). Encoders live in
+# frame_cache.FRAME_ENCODERS.
+FRAME_CODECS: dict[str, Arg | None] = {
+    "png": Arg("level", int, low=0, high=9),
+    "jpeg": Arg("quality", int, low=0, high=100),
+    "raw": None,
+}
+
+FRAME_USAGE = ("usage: get_latest_frame [png [level] | jpeg [quality] | raw]"
+               " [if_newer_than seq]")
+
+
+def parse_frame_request(tokens: list[str]) -> tuple[FrameRequest | None]:
+    """Parse get_latest_frame's options.
+
+    No options is the legacy request (bare PNG bytes, handler gets None).
+    Any option asks for the extended reply, which carries a header with the
+    frame's sequence number (and, for raw, its shape and dtype).
+    """
+    if not tokens:
+        return (None,)
+    codec = "png"
+    param = None
+    if_newer_than = None
+    rest = list(tokens)
+    if rest[0] in FRAME_CODECS:
+        codec = rest.pop(0)
+        param_arg = FRAME_CODECS[codec]
+        if param_arg is not None and rest and rest[0] != "if_newer_than":
+            param = param_arg.convert(rest.pop(0))
+    if rest:
+        if len(rest) != 2 or rest[0] != "if_newer_than":
+            raise CommandError(FRAME_USAGE)
+        if_newer_than = Arg("seq", int, low=0).convert(rest[1])
+    return (FrameRequest(codec, param, if_newer_than),)
+
+
+CAPTURES_USAGE = "usage: get_captures [since_id] [png [level] | jpeg [quality] | raw]"
+
+
+def parse_captures_request(tokens: list[str]) -> tuple[int, str, int | None]:
+    """Parse get_captures' options into (since_id, codec, param)."""
+    rest = list(tokens)
+    since_id = 0
+    if rest and rest[0] not in FRAME_CODECS:
+        since_id = Arg("since_id", int, low=0).convert(rest.pop(0))
+    if not rest:
+        return since_id, "png", None
+    codec = rest.pop(0)
+    param_arg = FRAME_CODECS.get(codec)
+    if codec not in FRAME_CODECS or len(rest) > (param_arg is not None):
+        raise CommandError(CAPTURES_USAGE)
+    param = param_arg.convert(rest[0]) if rest else None
+    return since_id, codec, param
+
+
+RECORD_USAGE = "usage: record_start [fps=<n>] path"
+
+
+def parse_record_start(tokens: list[str]) -> tuple[str, float | None]:
+    """Parse record_start's rest of line, `[fps=<n>] path`, into (path, fps).
+
+    The path comes last and takes the rest of the line, so it may contain
+    spaces.
+    """
+    rest = tokens[0] if tokens else ""
+    fps = None
+    option, _, path = rest.partition(" ")
+    if option.startswith("fps="):
+        fps = Arg("fps", float, low=1, high=120).convert(option[len("fps="):])
+        rest = path.lstrip()
+    if not rest:
+        raise CommandError(RECORD_USAGE)
+    return rest, fps
+
+
+def _spec(*args, **kwargs) -> tuple[str, CommandSpec]:
+    spec = CommandSpec(*args, **kwargs)
+    return spec.name, spec
+
+
+# Longest a motion reply or wait_motion blocks before answering "error timeout".
+MOTION_WAIT_TIMEOUT_S = 120.0
+
+_DISTANCE = (Arg("distance", float, 10),)
+_ANGLE = (Arg("angle", float, 90),)
+
+COMMANDS: dict[str, CommandSpec] = dict([
+    # --- session / flight state ---
+    # connect stays on the server thread: it sleeps to mimic the handshake,
+    # which would freeze a frame on the render thread.
+    _spec("connect"),
+    _spec("takeoff", main_thread=True, flight=True),
+    _spec("land", main_thread=True),
+    _spec("emergency", main_thread=True, urgent=True),
+    _spec("end", main_thread=True),
+    _spec("streamon", main_thread=True),
+    _spec("streamoff", main_thread=True),
+    _spec("capture_frame", main_thread=True),
+    _spec("get_captures", framed=True, locked=False, parser=parse_captures_request),
+    _spec("save_captures", (Arg("directory", str),), rest_of_line=True),
+    _spec("record_start", parser=parse_record_start, rest_of_line=True),
+    # Unlocked: it waits up to seconds for the encoder to finish the file,
+    # and takes the state lock itself only to detach the recorder.
+    _spec("record_stop", locked=False),
+    # No bounds here: UrsinaAdapter.set_speed reports and ignores a speed
+    # outside 10-100 itself, as it always has.
+    _spec("set_speed", (Arg("speed", int),), main_thread=True),
+
+    # --- motion ---
+    _spec("forward", _DISTANCE, handler="move", bound=("forward",), main_thread=True, motion=True),
+    _spec("backward", _DISTANCE, handler="move", bound=("backward",), main_thread=True, motion=True),
+    _spec("left", _DISTANCE, handler="move", bound=("left",), main_thread=True, motion=True),
+    _spec("right", _DISTANCE, handler="move", bound=("right",), main_thread=True, motion=True),
+    _spec("up", _DISTANCE, handler="altitude", bound=("up",), main_thread=True, motion=True),
+    _spec("down", _DISTANCE, handler="altitude", bound=("down",), main_thread=True, motion=True),
+    _spec("rotate_cw", _ANGLE, handler="rotate", bound=(1,), main_thread=True, motion=True),
+    _spec("rotate_ccw", _ANGLE, handler="rotate", bound=(-1,), main_thread=True, motion=True),
+    _spec("flip_forward", handler="flip", bound=("forward",), main_thread=True, flight=True),
+    _spec("flip_back", handler="flip", bound=("back",), main_thread=True, flight=True),
+    _spec("flip_left", handler="flip", bound=("left",), main_thread=True, flight=True),
+    _spec("flip_right", handler="flip", bound=("right",), main_thread=True, flight=True),
+    _spec("go", (Arg("x"), Arg("y"), Arg("z"), Arg("speed")), main_thread=True, motion=True),
+    _spec("curve", (Arg("x1"), Arg("y1"), Arg("z1"),
+                    Arg("x2"), Arg("y2"), Arg("z2"), Arg("speed")),
+          main_thread=True, motion=True),
+    # Long-poll: block until motion <id> finishes (0 = until nothing is
+    # pending) and answer "ok" / "error <reason>". Unlocked: it only waits.
+    _spec("wait_motion", (Arg("motion_id", int, 0, low=0),
+                          Arg("timeout", float, MOTION_WAIT_TIMEOUT_S, low=0)),
+          locked=False),
+    _spec("motion_replies", (Arg("mode", str, choices=("on", "off")),), session_only=True),
+    # Only stores the stick tuple, which tick() applies; posting it would
+    # just delay a 50 Hz control stream by a frame.
+    _spec("send_rc_control", (Arg("lr"), Arg("fb"), Arg("ud"), Arg("yaw"))),
+
+    # --- getters ---
+    _spec("get_is_moving"),
+    # Unlocked: these read one reference, the last tick's state snapshot.
+    _spec("get_battery", locked=False),
+    _spec("get_distance_tof", locked=False),
+    _spec("get_height", locked=False),
+    _spec("get_flight_time", locked=False),
+    _spec("get_speed_x", handler="get_speed", bound=("x",), locked=False),
+    _spec("get_speed_y", handler="get_speed", bound=("y",), locked=False),
+    _spec("get_speed_z", handler="get_speed", bound=("z",), locked=False),
+    _spec("get_acceleration_x", handler="get_acceleration", bound=("x",), locked=False),
+    _spec("get_acceleration_y", handler="get_acceleration", bound=("y",), locked=False),
+    _spec("get_acceleration_z", handler="get_acceleration", bound=("z",), locked=False),
+    _spec("get_pitch", locked=False),
+    _spec("get_roll", locked=False),
+    _spec("get_yaw", locked=False),
+    _spec("query_attitude", locked=False),
+    _spec("get_position", locked=False),
+    _spec("get_state", locked=False),
+    _spec("get_current_state", locked=False),
+    _spec("get_latest_frame", framed=True, locked=False, parser=parse_frame_request),
+    _spec("get_latest_depth", framed=True, locked=False),
+    _spec("get_mailbox_stats", locked=False),
+    _spec("get_capture_stats", locked=False),
+    _spec("get_telemetry_stats", locked=False),
+])
+
+
+def parse_command(line: str) -> tuple[CommandSpec, tuple]:
+    """Look up and parse one command line. Raises CommandError."""
+    tokens = line.split()
+    if not tokens:
+        raise CommandError("empty command")
+    name, *tokens = tokens
+    spec = COMMANDS.get(name)
+    if spec is None:
+        raise CommandError(f"unknown command '{name}'")
+    if spec.rest_of_line and tokens:
+        tokens = line.split(maxsplit=1)[1:]
+    return spec, spec.parse(tokens)
@@ -1,26 +1,159 @@
 import json
+import os
 import socket
 import errno
 import logging
+import tempfile
+import threading
 import traceback
+from queue import SimpleQueue
 from ursina import * # type: ignore
 from time import time
 import cv2
 from ursina_adapter import UrsinaAdapter
-from telemetry_publisher import build_position, build_state
+from command_registry import (COMMANDS, MOTION_WAIT_TIMEOUT_S, CommandError, CommandSpec,
+                              FrameRequest, parse_command)
+from frame_cache import FrameCache, frame_header, frame_reply
+from photo_buffer import photos_reply
+from telemetry_publisher import TelemetryPublisher
 
 logger = logging.getLogger(__name__)
 
+# A client that opens its connection with this line switches it into a
+# persistent session: many newline-terminated commands over one connection,
+# each answered by a 4-byte big-endian length + reply payload.
+SESSION_HELLO = b"session\n"
+# An idle session is closed after this long; clients reconnect transparently.
+SESSION_IDLE_TIMEOUT_S = 60.0
+
+# "batch <n>" followed by n command lines is one message; see _execute_batch.
+BATCH_HEADER = "batch"
+MAX_BATCH_COMMANDS = 1000
+
+# Same-host clients can skip the loopback TCP stack: the server also listens
+# on this AF_UNIX socket path (set TELLO_SIM_UNIX_SOCKET to move it, or to an
+# empty string to turn it off). sim_connection.py resolves the same default.
+UNIX_SOCKET_PATH = os.environ.get(
+    "TELLO_SIM_UNIX_SOCKET", os.path.join(tempfile.gettempdir(), "tello_sim.sock"))
+
+# Connections served at once. Each persistent session occupies one worker for
+# as long as it stays open; beyond this, new connections wait in the backlog.
+MAX_WORKERS = 32
+
+class _Session:
+    """Per-connection options of a persistent session."""
+
+    def __init__(self):
+        # Motion commands hold their reply until the move finishes.
+        self.motion_replies = False
+
+
+def _frame(payload: bytes) -> bytes:
+    """Prefix `payload` with its 4-byte big-endian length."""
+    return len(payload).to_bytes(4, byteorder='big') + payload
+
+
+def _is_framed(line: str) -> bool:
+    """True if `line` names a command whose one-shot reply is length-prefixed."""
+    name = line.split(maxsplit=1)[0] if line else ""
+    spec = COMMANDS.get(name)
+    return spec is not None and spec.framed
+
+
+def _is_batch(line: str) -> bool:
+    return line.split(maxsplit=1)[0] == BATCH_HEADER if line else False
+
+
+def _batch_count(header: str) -> int:
+    """The command count of a `batch <n>` header. Raises CommandError if it
+    is malformed or outside 1..MAX_BATCH_COMMANDS."""
+    try:
+        _, count = header.split()
+        count = int(count)
+    except ValueError:
+        raise CommandError(f"usage: {BATCH_HEADER} count") from None
+    if not 1 <= count <= MAX_BATCH_COMMANDS:
+        raise CommandError(f"count must be between 1 and {MAX_BATCH_COMMANDS}, got {count}")
+    return count
+
+
+def _could_open_message(data: bytes) -> bool:
+    """True while `data` may still be the start of SESSION_HELLO or a batch header."""
+    return SESSION_HELLO.startswith(data) or f"{BATCH_HEADER} ".encode().startswith(data)
+
+
+def _read_opening(conn: socket.socket) -> bytes:
+    """Read the first bytes of a connection, enough to tell what it is.
+
+    A session hello or batch header can arrive split over several TCP
+    segments (b"sess" then b"ion\n..."), so reading carries on while the
+    bytes so far are only a prefix of one. A one-shot command has no
+    newline, so waiting for one would stall it until the socket timeout;
+    it is recognised as soon as its bytes stop matching either prefix. The
+    connection's socket timeout bounds the wait for a client that stops
+    mid-prefix.
+    """
+    data = b""
+    while True:
+        chunk = conn.recv(1024)
+        if not chunk:
+            return data
+        data += chunk
+        if b"\n" in data or not _could_open_message(data):
+            return data
+
+
+def _read_line(conn: socket.socket, buffer: bytearray) -> bytes | None:
+    """Pop one newline-terminated line off `buffer`, reading `conn` as needed.
+
+    Returns None on a clean EOF. A partial last line without its newline is
+    dropped: the client went away mid-command, so there is nobody to answer.
+    """
+    while True:
+        end = buffer.find(b"\n")
+        if end >= 0:
+            line = bytes(buffer[:end])
+            del buffer[:end + 1]
+            return line
+        chunk = conn.recv(4096)
+        if not chunk:
+            return None
+        buffer += chunk
+
+
 class CommandServer:
     """
     Serves a TCP connections to receive and parse commands and forward controls to the simulator.
+
+    Connections are served concurrently by a bounded worker pool, so a slow
+    client or a large frame transfer only ties up its own worker.
     """
 
-    def __init__(self, ursina_adapter: UrsinaAdapter):
+    def __init__(self, ursina_adapter: UrsinaAdapter, max_workers: int = MAX_WORKERS,
+                 frame_cache: FrameCache | None = None,
+                 telemetry: TelemetryPublisher | None = None):
         self._ursina_adapter = ursina_adapter
+        # Only for get_telemetry_stats; None when there is no UDP stream.
+        self._telemetry = telemetry
+        # A fixed pool of daemon threads fed through a queue. Not a
+        # ThreadPoolExecutor: its workers are joined at interpreter exit, so a
+        # client holding a session open would keep the simulator from quitting.
+        self._max_workers = max_workers
+        self._connections: SimpleQueue = SimpleQueue()
+        self._worker_slots = threading.BoundedSemaphore(max_workers)
+        # Serializes command execution across workers (see _execute).
+        self._state_lock = threading.RLock()
+        # Bound once: dispatch is a dict lookup, and a spec without a
+        # matching _cmd_ method fails here at startup, not on first use.
+        self._handlers = {name: getattr(self, f"_cmd_{spec.handler}")
+                          for name, spec in COMMANDS.items()}
         self.latest_frame = None
+        # Shared with the video push stream, so a frame pulled and pushed is
+        # still encoded only once.
+        self._frame_cache = frame_cache if frame_cache is not None else FrameCache()
         self.stream_active = False
         self.server_socket = None
+        self.unix_socket = None
 
     def check_port_available(self, port: int = 9999) -> bool:
         """
@@ -44,17 +177,34 @@ class CommandServer:
                 print("[Command Listener] Server socket closed.")
             except Exception as e:
                 print(f"[Command Listener] Error closing socket: {e}")
+        if self.unix_socket:
+            try:
+                self.unix_socket.close()
+                os.unlink(UNIX_SOCKET_PATH)
+            except OSError as e:
+                print(f"[Command Listener] Error closing unix socket: {e}")
+            self.unix_socket = None
+        # Wake idle workers so they exit; busy ones are daemons and end with
+        # the process.
+        for _ in range(self._max_workers):
+            self._connections.put(None)
 
     def streamon(self):
-        """Start capturing screenshots and enable FPV video preview."""
+        """Start the FPV stream.
+
+        The stream renders offscreen from its own camera, so the window keeps
+        its view; only the window-readback fallback switches it to first
+        person.
+        """
         if not self.stream_active:
             self.stream_active = True
             self._ursina_adapter.stream_active = True
 
-            if self._ursina_adapter:
+            if self._ursina_adapter.fpv_camera is None:
                 self._ursina_adapter.toggle_camera_view()
-
-            print("Tello Simulator: Video streaming started, FPV mode activated.")
+                print("Tello Simulator: Video streaming started, FPV mode activated.")
+            else:
+                print("Tello Simulator: Video streaming started.")
 
 
     def streamoff(self):
@@ -63,9 +213,9 @@ class CommandServer:
             self.stream_active = False
             self._ursina_adapter.stream_active = False
             cv2.destroyAllWindows()
-            print(f"[FPV] Video streaming stopped. Frames captured: {self._ursina_adapter.frame_count}")
+            print(f"[FPV] Video streaming stopped. Photos taken: {self._ursina_adapter.frame_count}")
 
-            if self._ursina_adapter:
+            if self._ursina_adapter.fpv_camera is None:
                 self._ursina_adapter.toggle_camera_view()
 
     def curve_xyz_speed(self, x1: float, y1: float, z1: float, x2: float, y2: float, z2: float, speed: float) -> None:
@@ -90,7 +240,7 @@ class CommandServer:
 
         try:
             self.server_socket.bind(('localhost', 9999))  # Port number for communication
-            self.server_socket.listen(5)
+            self.server_socket.listen(64)
             print("[Command Listener] Listening on port 9999...")
         except OSError as e:
             if e.errno == errno.EADDRINUSE:  # Address already in use
@@ -108,207 +258,531 @@ class CommandServer:
             else:
                 raise
 
-        try:
-            while True:
-                try:
-                    conn, _ = self.server_socket.accept()
-                except OSError as e:
-                    print(f"[Command Listener] Server socket failed, stopping: {e}")
-                    break
+        for i in range(self._max_workers):
+            threading.Thread(target=self._worker_loop, name=f"command-worker-{i}",
+                             daemon=True).start()
+
+        self.unix_socket = self._listen_unix()
+        if self.unix_socket is not None:
+            threading.Thread(target=self._accept_loop, args=(self.unix_socket,),
+                             name="command-accept-unix", daemon=True).start()
 
-                # A misbehaving client must only lose its own connection —
-                # the listener has to survive disconnects at any point.
-                try:
-                    conn.settimeout(10.0)  # a hung client can't wedge the single-threaded loop
-                    self._handle_connection(conn)
-                except OSError as e:  # BrokenPipeError, ConnectionResetError, aborts, timeouts
-                    print(f"[Command Listener] Client connection error (ignored): {e}")
-                except Exception:
-                    traceback.print_exc()
-                finally:
-                    try:
-                        conn.close()
-                    except OSError:
-                        pass
+        try:
+            self._accept_loop(self.server_socket)
         except KeyboardInterrupt:
             print("\n[Command Listener] Shutting down...")
         finally:
             self.cleanup()
 
-    def _handle_connection(self, conn: socket.socket) -> None:
-        """Receive and dispatch a single command from one client connection."""
-        data = conn.recv(1024).decode()
-        if data:
-            logger.debug("[Command Listener] Received command: %s", data)
-
-        if data == "connect":
-            self._ursina_adapter.connect()
-        elif data == "takeoff":
-            self._ursina_adapter.takeoff()
-        elif data == "land":
-            self._ursina_adapter.land()
-        elif data == "flip_forward":
-            self._ursina_adapter.animate_flip(direction="forward")
-        elif data == "flip_back":
-             self._ursina_adapter.animate_flip(direction="back")
-        elif data == "flip_left":
-             self._ursina_adapter.animate_flip(direction="left")
-        elif data == "flip_right":
-            self._ursina_adapter.animate_flip(direction="right")
-        elif data == "streamon":
-            self.streamon()
-        elif data == "streamoff":
-            self.streamoff()
-        elif data == "emergency":
-            self._ursina_adapter.emergency()
-        elif data.startswith("forward"):
-            parts = data.split()
-            distance = float(parts[1]) if len(parts) > 1 else 10
-            self._ursina_adapter.move("forward", distance)
-
-        elif data.startswith("backward"):
-            parts = data.split()
-            distance = float(parts[1]) if len(parts) > 1 else 10
-            self._ursina_adapter.move("backward", distance)
-
-        elif data.startswith("left"):
-            parts = data.split()
-            distance = float(parts[1]) if len(parts) > 1 else 10
-            self._ursina_adapter.move("left", distance)
-
-        elif data.startswith("right"):
-            parts = data.split()
-            distance = float(parts[1]) if len(parts) > 1 else 10
-            self._ursina_adapter.move("right", distance)
-
-        elif data.startswith("up"):
-            parts = data.split()
-            distance = float(parts[1]) if len(parts) > 1 else 10
-            self._ursina_adapter.change_altitude_smooth("up", distance)
-
-        elif data.startswith("down"):
-            parts = data.split()
-            distance = float(parts[1]) if len(parts) > 1 else 10
-            self._ursina_adapter.change_altitude_smooth("down", distance)
-
-
-        elif data.startswith("rotate_cw"):
-            parts = data.split()
-            angle = float(parts[1]) if len(parts) > 1 else 90
-            self._ursina_adapter.rotate_smooth(angle)
-
-        elif data.startswith("rotate_ccw"):
-            parts = data.split()
-            angle = float(parts[1]) if len(parts) > 1 else 90
-            self._ursina_adapter.rotate_smooth(-angle)
-
-        elif data.startswith("go"):
-            try:
-                _, x, y, z, speed = data.split()
-                self._ursina_adapter.go_xyz_speed(float(x), float(y), float(z), float(speed))
-            except ValueError:
-                print("[Error] Invalid go command format")
+    def _listen_unix(self) -> socket.socket | None:
+        """Bind the AF_UNIX listener at UNIX_SOCKET_PATH, if enabled.
 
-        elif data.startswith("send_rc_control"):
+        Called after the TCP port is ours, so a socket file already at the
+        path is left over from a simulator that did not shut down cleanly
+        and is replaced. Failing here only costs the fast path: TCP still
+        serves everyone.
+        """
+        if not UNIX_SOCKET_PATH or not hasattr(socket, "AF_UNIX"):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            if os.path.exists(UNIX_SOCKET_PATH):
+                os.unlink(UNIX_SOCKET_PATH)
+            sock.bind(UNIX_SOCKET_PATH)
+            sock.listen(64)
+        except OSError as e:
+            sock.close()
+            print(f"[Command Listener] Unix socket {UNIX_SOCKET_PATH} unavailable ({e}); TCP only.")
+            return None
+        print(f"[Command Listener] Listening on {UNIX_SOCKET_PATH}...")
+        return sock
+
+    def _accept_loop(self, server_socket: socket.socket) -> None:
+        """Hand connections accepted on `server_socket` to the worker pool."""
+        while True:
+            # Wait for a free worker before accepting, so a saturated pool
+            # pushes back through the listen backlog instead of piling up
+            # an unbounded queue of accepted sockets.
+            self._worker_slots.acquire()
             try:
-                _, lr, fb, ud, yaw = data.split()
-                self.send_rc_control(float(lr), float(fb), float(ud), float(yaw))
-                conn.sendall(b"RC control applied")
-            except ValueError:
-                conn.sendall(b"Invalid RC control parameters")
+                conn, _ = server_socket.accept()
+            except OSError as e:
+                self._worker_slots.release()
+                print(f"[Command Listener] Server socket failed, stopping: {e}")
+                return
+            self._connections.put(conn)
+
+    def _worker_loop(self) -> None:
+        """Serve queued connections until cleanup() sends the None sentinel."""
+        while True:
+            conn = self._connections.get()
+            if conn is None:
+                return
+            self._serve_connection(conn)
+
+    def _serve_connection(self, conn: socket.socket) -> None:
+        """Serve one accepted connection, then close it."""
+        # A misbehaving client must only lose its own connection — the pool
+        # has to survive disconnects at any point.
+        try:
+            conn.settimeout(10.0)  # a hung client can only stall its own worker
+            self._handle_connection(conn)
+        except OSError as e:  # BrokenPipeError, ConnectionResetError, aborts, timeouts
+            print(f"[Command Listener] Client connection error (ignored): {e}")
+        except Exception:
+            traceback.print_exc()
+        finally:
+            try:
+                conn.close()
+            except OSError:
+                pass
+            self._worker_slots.release()
 
-        elif data == "get_is_moving":
-            conn.sendall(str(self._ursina_adapter.is_moving).encode())
+    def _handle_connection(self, conn: socket.socket) -> None:
+        """Serve one client connection.
 
-        elif data.startswith("curve"):
-            try:
-                _, x1, y1, z1, x2, y2, z2, speed = data.split()
-                self.curve_xyz_speed(float(x1), float(y1), float(z1),
-                                        float(x2), float(y2), float(z2),
-                                        float(speed))
-            except ValueError:
-                print("[Error] Invalid curve command format")
-
-        elif data == "get_battery":
-            conn.sendall(str(self._ursina_adapter.get_battery()).encode())
-        elif data == "get_distance_tof":
-            conn.sendall(str(100).encode())
-        elif data == "get_height":
-            height = (self._ursina_adapter.drone.y / 10) - 0.3
-            conn.sendall(f"{height:.1f}".encode())
-        elif data == "get_flight_time":
-            conn.sendall(str(self._ursina_adapter.get_flight_time()).encode())
-        elif data == "get_speed_x":
-            conn.sendall(str(self._ursina_adapter.get_speed_x()).encode())
-        elif data == "get_speed_y":
-            conn.sendall(str(self._ursina_adapter.get_speed_y()).encode())
-        elif data == "get_speed_z":
-            conn.sendall(str(self._ursina_adapter.get_speed_z()).encode())
-        elif data == "get_acceleration_x":
-            conn.sendall(str(self._ursina_adapter.calculated_acceleration.x * 100).encode())
-        elif data == "get_acceleration_y":
-            conn.sendall(str(self._ursina_adapter.calculated_acceleration.y * 100).encode())
-        elif data == "get_acceleration_z":
-            conn.sendall(str(self._ursina_adapter.calculated_acceleration.z * 100).encode())
-        elif data == "get_pitch":
-            conn.sendall(str(self._ursina_adapter.get_pitch()).encode())
-        elif data == "get_roll":
-            conn.sendall(str(self._ursina_adapter.get_roll()).encode())
-        elif data == "get_yaw":
-            raw_yaw = self._ursina_adapter.drone.rotation_y
-            yaw = ((raw_yaw + 180) % 360) - 180
-            conn.sendall(str(yaw).encode())
-        elif data == "query_attitude":
-            raw_yaw = self._ursina_adapter.drone.rotation_y
-            yaw = ((raw_yaw + 180) % 360) - 180
-            attitude = {
-                "pitch": self._ursina_adapter.get_pitch(),
-                "roll": self._ursina_adapter.get_roll(),
-                "yaw": yaw
-            }
-            conn.sendall(str(attitude).encode())
-        elif data == "get_position":
-            position = build_position(self._ursina_adapter)
-            conn.sendall(json.dumps(position).encode())
-        elif data == "get_state":
-            conn.sendall(json.dumps(build_state(self._ursina_adapter)).encode())
-        elif data == "get_current_state":
-            if self._sim_healthy():
-                state = "flying" if self._ursina_adapter.is_flying else "landed"
-            else:
-                state = "unhealthy"
-            conn.sendall(state.encode())
-
-        elif data == "get_latest_frame":
-            # Send frame data directly over TCP instead of using filesystem.
-            # If the update loop stopped ticking, report "no frame" rather
-            # than serving the same stale frame forever.
-            if self._ursina_adapter.latest_frame is not None and self._sim_healthy():
-                # Encode frame as PNG in memory
-                success, buffer = cv2.imencode('.png', self._ursina_adapter.latest_frame)
-                if success:
-                    # Send frame size first (4 bytes)
-                    frame_data = buffer.tobytes()
-                    frame_size = len(frame_data)
-                    conn.sendall(frame_size.to_bytes(4, byteorder='big'))
-                    # Then send the actual frame data
-                    conn.sendall(frame_data)
-                    logger.debug("[Frame Transfer] Sent %d bytes over TCP", frame_size)
+        A connection whose first bytes are SESSION_HELLO is a persistent
+        session and stays on this worker until the client goes away (see
+        _serve_session). Anything else is a legacy one-shot connection: a
+        single command and at most one reply.
+        """
+        data = _read_opening(conn)
+        if data.startswith(SESSION_HELLO):
+            self._serve_session(conn, data[len(SESSION_HELLO):])
+            return
+        if data.startswith(BATCH_HEADER.encode()):
+            buffer = bytearray(data)
+            header = _read_line(conn, buffer)
+            if header is not None:
+                reply = self._read_and_execute_batch(conn, buffer, header.decode().strip())
+                if reply is not None:
+                    conn.sendall(reply)
+            return
+
+        command = data.decode().strip()
+        reply = self._execute(command)
+        if _is_framed(command):
+            # The frame channel always answers with a length prefix; 0 means
+            # "no frame available".
+            conn.sendall(_frame(reply or b""))
+        elif reply is not None:
+            conn.sendall(reply)
+
+    def _serve_session(self, conn: socket.socket, buffered: bytes) -> None:
+        """Run a persistent session: newline-framed commands in, one
+        length-prefixed reply out per command, until the client disconnects.
+
+        Every command gets a reply, including the ones that answer nothing in
+        one-shot mode (they get an empty frame), so a client can always read
+        exactly one frame per command it sends and never has to guess.
+        """
+        buffer = bytearray(buffered)
+        session = _Session()
+        try:
+            conn.settimeout(SESSION_IDLE_TIMEOUT_S)
+            while True:
+                line = _read_line(conn, buffer)
+                if line is None:
+                    break
+                command = line.decode().strip()
+                if not command:
+                    continue
+                if _is_batch(command):
+                    reply = self._read_and_execute_batch(conn, buffer, command, session)
+                    if reply is None:
+                        break
+                    if reply.startswith(b"error"):
+                        # A bad header: the lines after it cannot be told
+                        # from commands, so the session is out of step.
+                        conn.sendall(_frame(reply))
+                        break
                 else:
-                    # Send 0 size to indicate no frame
-                    conn.sendall((0).to_bytes(4, byteorder='big'))
+                    reply = self._execute(command, session)
+                conn.sendall(_frame(reply or b""))
+        except OSError as e:  # disconnects, resets, idle timeout
+            logger.debug("[Command Listener] Session ended: %s", e)
+
+    def _execute(self, line: str, session: _Session | None = None) -> bytes | None:
+        """Run one command line and return its reply payload (None for no reply).
+
+        Called concurrently from the worker pool. Lookup and argument parsing
+        go through the command table (command_registry.COMMANDS); a line that
+        fails either is answered `error <reason>`. Commands marked locked run
+        under the state lock, so commands from different clients never
+        interleave inside the adapter; frame pulls only take a reference to
+        the latest frame and spend their time encoding, so they run outside it.
+        Commands marked main_thread are not run here at all: they are posted
+        to the adapter's mailbox and run on the render thread's next tick.
+
+        Motion commands get an id from the adapter's MotionTracker before
+        they are posted, and reply with it. In a session with motion_replies
+        on they instead hold the reply until the move completes ("ok") or is
+        dropped ("error emergency" / "error timeout").
+        """
+        if not line:
+            # is_reachable() probes connect and close without sending anything.
+            return None
+        logger.debug("[Command Listener] Received command: %s", line)
+        try:
+            spec, args = self._parse(line, session)
+        except CommandError as e:
+            logger.warning("[Command Listener] Rejected '%s': %s", line, e)
+            return f"error {e}".encode()
+
+        handler = self._handlers[spec.name]
+        motion_id = None
+        if spec.motion:
+            motion_id = self._ursina_adapter.motions.begin()
+            args = (*args, motion_id)
+        if spec.main_thread:
+            self._ursina_adapter.mailbox.post(
+                spec.name, handler, *args, urgent=spec.urgent, flight=spec.flight,
+                motion_ids=() if motion_id is None else (motion_id,))
+            if motion_id is None:
+                return None
+            if session is not None and session.motion_replies:
+                return self._ursina_adapter.motions.wait(motion_id, MOTION_WAIT_TIMEOUT_S).encode()
+            return str(motion_id).encode()
+        if not spec.locked:
+            return handler(*args)
+        with self._state_lock:
+            return handler(*args)
+
+    def _parse(self, line: str, session: _Session | None) -> tuple[CommandSpec, tuple]:
+        """parse_command plus the session argument of session_only commands."""
+        spec, args = parse_command(line)
+        if spec.session_only:
+            if session is None:
+                raise CommandError(f"{spec.name} is only valid in a session")
+            args = (session, *args)
+        return spec, args
+
+    def _read_and_execute_batch(self, conn: socket.socket, buffer: bytearray, header: str,
+                                session: _Session | None = None) -> bytes | None:
+        """Read the command lines announced by a `batch <n>` header and run them.
+
+        Returns None if the client disconnects before sending all n lines.
+        A bad header is answered with an error before any line is read: the
+        count is checked first, so a huge one cannot make the server read
+        without limit. The reply is then the only thing that starts with
+        "error" (a batch's own reply is a JSON list), and a session ends on
+        it, since what follows the header can no longer be framed.
+        """
+        try:
+            count = _batch_count(header)
+        except CommandError as e:
+            logger.warning("[Command Listener] Rejected '%s': %s", header, e)
+            return f"error {e}".encode()
+        lines = []
+        for _ in range(count):
+            line = _read_line(conn, buffer)
+            if line is None:
+                return None
+            lines.append(line.decode().strip())
+        return self._execute_batch(lines, session)
+
+    def _execute_batch(self, lines: list[str], session: _Session | None = None) -> bytes:
+        """Run a batch of command lines; reply with a JSON list, one result each.
+
+        Every line is parsed before anything runs, and one bad line rejects
+        the whole batch (its entry says why, the others say "error batch
+        rejected"), so a route never flies with a waypoint missing.
+
+        The batch's main_thread commands are posted to the mailbox as a
+        single entry, so the render thread appends them to
+        UrsinaAdapter.command_queue in one go, with no other client's
+        commands in between. Other commands (getters) run here, in order,
+        before the posted ones have run. Results are what each command would
+        have replied on its own: "" for no reply, the motion id for motion
+        commands, or "ok"/"error <reason>" once the whole route is done when
+        the session has motion_replies on.
+        """
+        parsed = []
+        errors = []
+        for line in lines:
+            try:
+                parsed.append(self._parse(line, session))
+                errors.append(None)
+            except CommandError as e:
+                errors.append(f"error {e}")
+        if any(errors):
+            logger.warning("[Command Listener] Rejected batch: %s",
+                           "; ".join(e for e in errors if e))
+            return json.dumps([e or "error batch rejected" for e in errors]).encode()
+
+        mailbox = self._ursina_adapter.mailbox
+        motions = self._ursina_adapter.motions
+        results = [""] * len(parsed)
+        motion_ids = {}
+        posted = []
+        urgent = []
+        for index, (spec, args) in enumerate(parsed):
+            handler = self._handlers[spec.name]
+            if spec.motion:
+                motion_ids[index] = motions.begin()
+                args = (*args, motion_ids[index])
+                results[index] = str(motion_ids[index])
+            if spec.main_thread:
+                (urgent if spec.urgent else posted).append((spec, handler, args))
+                continue
+            if spec.locked:
+                with self._state_lock:
+                    reply = handler(*args)
             else:
-                # Send 0 size to indicate no frame available
-                conn.sendall((0).to_bytes(4, byteorder='big'))
-
-        elif data == "capture_frame":
-            self._ursina_adapter.capture_frame()
-        elif data.startswith("set_speed"):
+                reply = handler(*args)
+            results[index] = reply.decode() if reply else ""
+        if posted:
+            # The batch is one entry; an emergency drops all of it, so a
+            # route never flies on with some of its moves missing.
+            mailbox.post(BATCH_HEADER, self._run_posted,
+                         [(spec.name, handler, args, args[-1] if spec.motion else None)
+                          for spec, handler, args in posted],
+                         flight=any(spec.flight for spec, _, _ in posted),
+                         motion_ids=tuple(motion_ids.values()))
+        # Urgent commands go last: an emergency in the batch then finds the
+        # batch's moves already posted, and cancels them like any others.
+        for spec, handler, args in urgent:
+            mailbox.post(spec.name, handler, *args, urgent=True)
+        if session is not None and session.motion_replies:
+            for index, motion_id in motion_ids.items():
+                results[index] = motions.wait(motion_id, MOTION_WAIT_TIMEOUT_S)
+        return json.dumps(results).encode()
+
+    def _run_posted(self, calls: list[tuple]) -> None:
+        """Mailbox entry for a batch: run its commands back to back."""
+        for label, handler, args, motion_id in calls:
             try:
-                _, speed = data.split()
-                self._ursina_adapter.set_speed(int(speed))
-            except ValueError:
-                print("[Error] Invalid set_speed command format")
+                handler(*args)
+            except Exception as e:
+                # Same policy as CommandMailbox.drain: one bad command must
+                # not drop the rest, and its waiters get an error.
+                logger.exception("[Mailbox] Batched command '%s' raised", label)
+                self._ursina_adapter.motions.finish(motion_id, f"error {label} failed: {e}")
+
+    # ------------------------------------------------------------ handlers ---
+    # One _cmd_<handler> per CommandSpec.handler in command_registry.COMMANDS.
+    # Each returns the reply payload, or None when the command answers nothing.
+
+    def _cmd_connect(self) -> None:
+        self._ursina_adapter.connect()
+
+    def _cmd_takeoff(self) -> None:
+        self._ursina_adapter.takeoff()
+
+    def _cmd_land(self) -> None:
+        self._ursina_adapter.land()
+
+    def _cmd_emergency(self) -> None:
+        self._ursina_adapter.emergency()
+
+    def _cmd_end(self) -> None:
+        self.end()
+
+    def _cmd_streamon(self) -> None:
+        self.streamon()
+
+    def _cmd_streamoff(self) -> None:
+        self.streamoff()
+
+    def _cmd_capture_frame(self) -> None:
+        self._ursina_adapter.capture_frame()
+
+    def _cmd_get_latest_depth(self) -> bytes:
+        """The latest frame's depth image: a frame_reply whose payload is
+        float16 metres, top row first, shape in the header. b"" if there is
+        no frame with depth.
+
+        Depth is only read back for FRAME_KEEP_WARM_S after a request, so a
+        first request waits for a frame that has it.
+        """
+        adapter = self._ursina_adapter
+        if not adapter.request_depth():
+            return b"error depth needs the offscreen FPV camera"
+        capture = adapter.latest_capture
+        if adapter.stream_active and self._sim_healthy():
+            # The frame after next at most: the one being rendered now may
+            # have started before depth was turned on.
+            for _ in range(2):
+                if capture is not None and capture.has_depth:
+                    break
+                adapter.frame_demand.wait_for_frame(capture.seq if capture else 0)
+                capture = adapter.latest_capture
+        if capture is None or not capture.has_depth or not self._sim_healthy():
+            return b""
+        depth = capture.depth
+        header = {"seq": capture.seq, "shape": list(depth.shape), "dtype": str(depth.dtype),
+                  "units": "m"}
+        if capture.record is not None:
+            header["capture"] = capture.record.to_json()
+        return frame_reply(header, depth.tobytes())
+
+    def _cmd_get_captures(self, since_id: int, codec: str, param: int | None) -> bytes:
+        """Every buffered photo newer than since_id, in one reply (photo_buffer.photos_reply)."""
+        photos = self._ursina_adapter.photos
+        return photos_reply(photos.since(since_id), codec, param, photos.stats())
+
+    def _cmd_save_captures(self, directory: str) -> bytes:
+        """Save every new photo to `directory` ("off" stops saving)."""
+        try:
+            self._ursina_adapter.photos.set_directory(None if directory == "off" else directory)
+        except OSError as e:
+            return f"error {e}".encode()
+        return b"ok"
+
+    def _cmd_record_start(self, path: str, fps: float | None) -> bytes:
+        try:
+            self._ursina_adapter.start_recording(path, fps)
+        except ValueError as e:
+            return f"error {e}".encode()
+        return b"ok"
+
+    def _cmd_record_stop(self) -> bytes:
+        """Replies with the recording's stats as JSON (frames written, dropped)."""
+        try:
+            stats = self._ursina_adapter.stop_recording(self._state_lock)
+        except ValueError as e:
+            return f"error {e}".encode()
+        return json.dumps(stats).encode()
+
+    def _cmd_set_speed(self, speed: int) -> None:
+        self._ursina_adapter.set_speed(speed)
+
+    def _cmd_move(self, direction: str, distance: float, motion_id: int) -> None:
+        self._ursina_adapter.move(direction, distance, motion_id=motion_id)
+
+    def _cmd_altitude(self, direction: str, distance: float, motion_id: int) -> None:
+        self._ursina_adapter.change_altitude_smooth(direction, distance, motion_id=motion_id)
+
+    def _cmd_rotate(self, sign: int, angle: float, motion_id: int) -> None:
+        self._ursina_adapter.rotate_smooth(sign * angle, motion_id=motion_id)
+
+    def _cmd_flip(self, direction: str) -> None:
+        self._ursina_adapter.animate_flip(direction=direction)
+
+    def _cmd_go(self, x: float, y: float, z: float, speed: float, motion_id: int) -> None:
+        self._ursina_adapter.go_xyz_speed(x, y, z, speed, motion_id=motion_id)
+
+    def _cmd_curve(self, x1: float, y1: float, z1: float,
+                   x2: float, y2: float, z2: float, speed: float, motion_id: int) -> None:
+        self._ursina_adapter.curve_xyz_speed(x1, y1, z1, x2, y2, z2, speed, motion_id=motion_id)
+
+    def _cmd_wait_motion(self, motion_id: int, timeout: float) -> bytes:
+        motions = self._ursina_adapter.motions
+        if motion_id == 0:
+            return motions.wait_idle(timeout).encode()
+        return motions.wait(motion_id, timeout).encode()
+
+    def _cmd_motion_replies(self, session: _Session, mode: str) -> bytes:
+        session.motion_replies = mode == "on"
+        return b"ok"
+
+    def _cmd_send_rc_control(self, lr: float, fb: float, ud: float, yaw: float) -> bytes:
+        self.send_rc_control(lr, fb, ud, yaw)
+        return b"RC control applied"
+
+    def _cmd_get_is_moving(self) -> bytes:
+        # A move still waiting in the mailbox has not set is_moving yet, but
+        # it is as good as started: polling right after sending a move must
+        # not report "done".
+        adapter = self._ursina_adapter
+        return str(adapter.is_moving or adapter.mailbox.depth > 0).encode()
+
+    # The state getters read the snapshot the last tick published
+    # (state_snapshot.py), never the live entities, so every field of one
+    # reply comes from the same tick.
+
+    def _cmd_get_battery(self) -> bytes:
+        return str(self._ursina_adapter.state_snapshot.battery).encode()
+
+    def _cmd_get_distance_tof(self) -> bytes:
+        return str(self._ursina_adapter.state_snapshot.tof).encode()
+
+    def _cmd_get_height(self) -> bytes:
+        return f"{self._ursina_adapter.state_snapshot.y:.1f}".encode()
+
+    def _cmd_get_flight_time(self) -> bytes:
+        return str(self._ursina_adapter.state_snapshot.flight_time).encode()
+
+    def _cmd_get_speed(self, axis: str) -> bytes:
+        return str(getattr(self._ursina_adapter.state_snapshot, f"speed_{axis}")).encode()
+
+    def _cmd_get_acceleration(self, axis: str) -> bytes:
+        return str(getattr(self._ursina_adapter.state_snapshot, f"accel_{axis}")).encode()
+
+    def _cmd_get_pitch(self) -> bytes:
+        return str(self._ursina_adapter.state_snapshot.pitch).encode()
+
+    def _cmd_get_roll(self) -> bytes:
+        return str(self._ursina_adapter.state_snapshot.roll).encode()
+
+    def _cmd_get_yaw(self) -> bytes:
+        return str(self._ursina_adapter.state_snapshot.yaw).encode()
+
+    def _cmd_query_attitude(self) -> bytes:
+        snapshot = self._ursina_adapter.state_snapshot
+        attitude = {
+            "pitch": snapshot.pitch,
+            "roll": snapshot.roll,
+            "yaw": snapshot.yaw
+        }
+        return str(attitude).encode()
+
+    def _cmd_get_position(self) -> bytes:
+        return json.dumps(self._ursina_adapter.state_snapshot.position()).encode()
+
+    def _cmd_get_state(self) -> bytes:
+        return json.dumps(self._ursina_adapter.state_snapshot.state()).encode()
+
+    def _cmd_get_current_state(self) -> bytes:
+        if self._sim_healthy():
+            state = "flying" if self._ursina_adapter.state_snapshot.flying else "landed"
+        else:
+            state = "unhealthy"
+        return state.encode()
+
+    def _cmd_get_mailbox_stats(self) -> bytes:
+        return json.dumps(self._ursina_adapter.mailbox.stats()).encode()
+
+    def _cmd_get_capture_stats(self) -> bytes:
+        return json.dumps(self._ursina_adapter.frame_demand.stats()).encode()
+
+    def _cmd_get_telemetry_stats(self) -> bytes:
+        """The UDP telemetry stream's target and achieved rate and jitter."""
+        if self._telemetry is None:
+            return b"error no telemetry stream"
+        return json.dumps(self._telemetry.stats()).encode()
+
+    def _cmd_get_latest_frame(self, request: FrameRequest | None) -> bytes:
+        """The latest frame, encoded, or b"" if there is none.
+
+        A bare request gets the PNG bytes alone. A request with options gets
+        an extended reply (frame_cache.frame_reply) whose header carries the frame's
+        sequence number; with if_newer_than, a client that already has the
+        latest frame gets the header only, marked unchanged. A seq ahead of
+        the latest frame is one from before a restart, so it gets the frame.
+        """
+        # Send frame data directly over TCP instead of using filesystem.
+        # If the update loop stopped ticking, report "no frame" rather
+        # than serving the same stale frame forever. The caller adds the
+        # length prefix (an empty payload goes out as length 0).
+        adapter = self._ursina_adapter
+        capture = adapter.latest_capture
+        if not adapter.frame_demand.request() and adapter.stream_active and self._sim_healthy():
+            # Capture was idle; this request wakes it. Wait for the first
+            # fresh frame instead of serving one from before the pause.
+            adapter.frame_demand.wait_for_frame(capture.seq if capture else 0)
+            capture = adapter.latest_capture
+        if capture is None or not self._sim_healthy():
+            return b""
+        # Encoded once per (frame, codec, param), however many clients ask.
+        if request is None:
+            frame_data = self._frame_cache.encoded(capture, "png")
+        elif request.if_newer_than == capture.seq:
+            return frame_reply({"seq": capture.seq, "unchanged": True})
+        else:
+            frame_data = frame_reply(
+                frame_header(capture, request.codec),
+                self._frame_cache.encoded(capture, request.codec, request.param))
+        logger.debug("[Frame Transfer] Sending %d bytes for frame %d", len(frame_data), capture.seq)
+        return frame_data
 
-        elif data == "end":
-            self.end()
@@ -0,0 +1,163 @@
+"""The drone's FPV camera: an offscreen render target independent of the window.
+
+The stream used to be a readback of the whole window, with streamon
+switching the main camera to first person. FpvCamera renders the scene a
+second time instead, from its own camera mounted on the drone into an
+offscreen buffer at a fixed resolution (960x720 like the real Tello), so:
+
+- the readback cost depends on the stream resolution, not the monitor;
+- the window keeps its interactive third-person view while streaming;
+- the HUD and gate editor live in the window's 2D layer and never reach the
+  stream, so they need not be hidden.
+
+Panda3D copies the buffer's texture to RAM after every render it takes part
+in. The buffer only renders on frames the stream FPS asks for, so a 30 FPS
+stream costs 30 renders and copies a second however fast the window runs.
+
+With depth on (set_depth), the buffer's depth attachment is copied to RAM
+by that same render, alongside the colour: no second render, no separate
+readback. It is off unless someone asks for depth frames.
+"""
+from __future__ import annotations
+
+import logging
+
+import numpy as np
+from panda3d.core import GraphicsOutput, NodePath, PerspectiveLens, Texture
+
+from frame_cache import FramePool
+
+logger = logging.getLogger(__name__)
+
+# The real Tello's camera: 82.6 degrees diagonal at 4:3, which is 70.2
+# degrees horizontally.
+TELLO_HORIZONTAL_FOV_DEG = 70.2
+# The lens' near and far planes, in world units.
+FPV_NEAR, FPV_FAR = 0.1, 10000
+
+
+class FpvCamera:
+    """Offscreen FPV render target. Render thread only.
+
+    Raises RuntimeError if the graphics pipe cannot make an offscreen
+    buffer; the adapter then falls back to reading back the window.
+    """
+
+    def __init__(self, base, mount: NodePath, width: int, height: int, fps: float,
+                 clear_color=None, fov_deg: float = TELLO_HORIZONTAL_FOV_DEG,
+                 pool: FramePool | None = None):
+        self.width = width
+        self.height = height
+        self.interval = 1.0 / fps
+        # Where poll() copies frames to; None allocates a new array each time.
+        self.pool = pool
+        self.texture = Texture("fpv")
+        self.buffer: GraphicsOutput | None = base.win.makeTextureBuffer(
+            "fpv", width, height, self.texture, to_ram=True)
+        if self.buffer is None:
+            raise RuntimeError(f"cannot create a {width}x{height} offscreen buffer")
+        # Render before the window, so the RAM copy is ready by the next tick.
+        self.buffer.setSort(-100)
+        if clear_color is not None:
+            self.buffer.setClearColor(clear_color)
+
+        lens = PerspectiveLens()
+        lens.setFov(fov_deg)
+        lens.setAspectRatio(width / height)
+        lens.setNearFar(FPV_NEAR, FPV_FAR)
+        self.camera = base.makeCamera(self.buffer, lens=lens, camName="fpv_cam")
+        self.camera.reparentTo(mount)
+
+        # The buffer's depth attachment. It stays on the GPU until
+        # set_depth(True) has it copied to RAM with the colour.
+        self.depth_texture = Texture("fpv_depth")
+        self.depth_texture.setFormat(Texture.F_depth_component32)
+        self.depth_enabled = False
+        self._attach_textures()
+        # The depth buffer of the frame the last poll() returned, or None.
+        self.depth: np.ndarray | None = None
+
+        self._next_due = 0.0
+        # True while the buffer is set to render this frame; its RAM image is
+        # collected on the next poll().
+        self._rendering = False
+        self.buffer.setActive(False)
+
+    def poll(self, now: float) -> np.ndarray | None:
+        """Collect the frame rendered since the last poll and schedule the next.
+
+        Call once per tick while streaming. Returns the raw pixels (BGRA,
+        rows bottom-to-top, owned by the caller), or None if no frame was
+        rendered since the last call. With depth on, `self.depth` is then
+        that frame's depth buffer (float32 in [0, 1], rows bottom-to-top,
+        owned by the caller) or None.
+        """
+        frame = None
+        self.depth = None
+        if self._rendering:
+            frame = self._read_ram_image()
+            if frame is not None and self.depth_enabled:
+                self.depth = self._read_depth()
+        self._rendering = now >= self._next_due
+        if self._rendering:
+            # Catch up from `now`, not from the missed deadline: a stall must
+            # not be followed by a burst of back-to-back renders.
+            self._next_due = max(self._next_due + self.interval, now)
+        self.buffer.setActive(self._rendering)
+        return frame
+
+    def set_depth(self, enabled: bool) -> None:
+        """Read the depth buffer back with each frame, or stop doing so.
+
+        Takes effect from the next frame rendered; the one being rendered
+        when it changes is lost, as the buffer's RAM copies are reset.
+        """
+        if enabled != self.depth_enabled:
+            self.depth_enabled = enabled
+            self._attach_textures()
+
+    def _attach_textures(self) -> None:
+        # A buffer's attachments can only be changed by replacing them all.
+        self.buffer.clearRenderTextures()
+        self.buffer.addRenderTexture(self.texture, GraphicsOutput.RTMCopyRam,
+                                     GraphicsOutput.RTPColor)
+        depth_mode = GraphicsOutput.RTMCopyRam if self.depth_enabled else GraphicsOutput.RTMBindOrCopy
+        self.buffer.addRenderTexture(self.depth_texture, depth_mode, GraphicsOutput.RTPDepth)
+
+    def stop(self) -> None:
+        """Stop rendering the stream (streamoff)."""
+        self._rendering = False
+        self.buffer.setActive(False)
+
+    def _read_ram_image(self) -> np.ndarray | None:
+        ram = self.texture.getRamImage()
+        expected = self.width * self.height * 4
+        if ram is None or len(ram) != expected:
+            return None
+        # Panda3D reuses the RAM image for the next render, so the caller
+        # gets its own copy.
+        image = np.frombuffer(memoryview(ram), np.uint8).reshape(self.height, self.width, 4)
+        if self.pool is None:
+            return image.copy()
+        frame = self.pool.acquire(image.shape)
+        np.copyto(frame, image)
+        return frame
+
+    def _read_depth(self) -> np.ndarray | None:
+        # The driver picks the depth format: 32-bit float, or 16-bit
+        # normalised integers. Either way the caller gets float32 in [0, 1].
+        texture = self.depth_texture
+        source_type = {(Texture.T_float, 4): np.float32,
+                       (Texture.T_unsigned_short, 2): np.uint16}.get(
+            (texture.getComponentType(), texture.getComponentWidth()))
+        ram = texture.getRamImage()
+        if ram is None or source_type is None or len(ram) != self.width * self.height * texture.getComponentWidth():
+            return None
+        source = np.frombuffer(memoryview(ram), source_type).reshape(self.height, self.width)
+        shape = (self.height, self.width)
+        depth = np.empty(shape, np.float32) if self.pool is None else self.pool.acquire(shape, np.float32)
+        if source_type is np.float32:
+            np.copyto(depth, source)
+        else:
+            np.multiply(source, np.float32(1 / 65535), out=depth)
+        return depth
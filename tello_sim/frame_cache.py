@@ -0,0 +1,284 @@
+"""Captured FPV frames, their codecs, and encoded bytes shared by every requester.
+
+UrsinaAdapter publishes each streamed framebuffer as a CapturedFrame with a
+sequence number. Encoding one (PNG costs tens of milliseconds for a full
+window) happens at most once per (sequence, codec): the first
+get_latest_frame for a new frame encodes it and every later request for the
+same frame, from any client, gets the cached bytes until the next frame
+replaces it.
+
+The pixel arrays themselves come from a FramePool, so streaming at 60 FPS
+reuses a handful of buffers instead of allocating several full frames
+every tick.
+"""
+from __future__ import annotations
+
+import json
+import threading
+from typing import Callable, NamedTuple
+
+import cv2
+import numpy as np
+
+
+# Frame buffers a FramePool keeps for reuse.
+POOL_MAX_BUFFERS = 8
+
+
+class FramePool:
+    """Reusable frame-sized NumPy arrays, shared by every thread.
+
+    Ownership is explicit: acquire() hands a buffer to one owner, who gives
+    it back with release() when done, and only released buffers are handed
+    out again. A CapturedFrame built with a pool owns its buffers and
+    releases them itself: the raw readback once it has been converted,
+    the rest when the frame is garbage collected. A buffer that is never
+    released is freed by the garbage collector like any other array. At
+    most POOL_MAX_BUFFERS released buffers are kept.
+    """
+
+    def __init__(self, max_buffers: int = POOL_MAX_BUFFERS):
+        self._max_buffers = max_buffers
+        self._free: list[np.ndarray] = []
+        # Reentrant: a CapturedFrame collected on this thread while it holds
+        # the lock releases its buffers from inside acquire() or release().
+        self._lock = threading.RLock()
+        self.allocations = 0
+        self.reuses = 0
+
+    def acquire(self, shape: tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """An array of `shape` and `dtype`, owned by the caller. Contents undefined."""
+        with self._lock:
+            for index in range(len(self._free)):
+                buffer = self._free[index]
+                if buffer.shape == shape and buffer.dtype == dtype:
+                    del self._free[index]
+                    self.reuses += 1
+                    return buffer
+            if len(self._free) >= self._max_buffers:
+                # Full of buffers of another size (the window was resized):
+                # drop the oldest to make room for this size.
+                del self._free[0]
+            self.allocations += 1
+        return np.empty(shape, dtype)
+
+    def release(self, buffer: np.ndarray) -> None:
+        """Give back a buffer from acquire(). Neither the caller nor any view
+        of the buffer may touch it afterwards."""
+        with self._lock:
+            if len(self._free) < self._max_buffers:
+                self._free.append(buffer)
+
+    def stats(self) -> dict:
+        return {"free": len(self._free), "allocations": self.allocations,
+                "reuses": self.reuses}
+
+
+class CaptureRecord(NamedTuple):
+    """When and in what state a frame was rendered, taken on the tick that
+    rendered it, so a frame and its ground truth always belong together."""
+    mono_time: float  # time.monotonic() in the simulator
+    wall_time: float  # time.time()
+    state: dict       # StateSnapshot.state() as of that tick
+
+    def to_json(self) -> dict:
+        return {"mono_time": self.mono_time, "wall_time": self.wall_time, "state": self.state}
+
+
+class CapturedFrame:
+    """One streamed frame. Published as a whole, so seq and image always match.
+
+    Built either from a finished BGR image or from a raw 4-channel readback
+    with rows bottom-to-top (fpv_camera.py, frame_grabber.py), plus the
+    cv2 conversion code that turns its channels into BGR. A raw frame is
+    converted on first access to `image`, by whichever thread asks first,
+    so the render thread that captured it never pays for the conversion.
+    With a `pool`, `raw` and `raw_depth` must have come from it: the frame
+    owns them, converts into another pooled buffer, and releases all of
+    them to the pool (see FramePool). `image` is then only valid while the
+    frame is alive, so hold on to the frame, not just its image.
+    `record` is the frame's CaptureRecord, if the capturer took one.
+
+    `raw_depth`, if the capturer read it back, is the same render's depth
+    buffer: float32 window depths in [0, 1], rows bottom-to-top, from a
+    perspective lens whose near and far planes (metres) are `depth_range`.
+    It is linearised on first access to `depth`, like `image`.
+    """
+    __slots__ = ("seq", "record", "_image", "_raw", "_conversion", "_pool", "_pooled_image",
+                 "_lock", "_depth", "_raw_depth", "_depth_range")
+
+    def __init__(self, seq: int, image: np.ndarray | None = None, raw: np.ndarray | None = None,
+                 conversion: int = cv2.COLOR_RGBA2BGR, pool: FramePool | None = None,
+                 record: CaptureRecord | None = None, raw_depth: np.ndarray | None = None,
+                 depth_range: tuple[float, float] = (0.0, 0.0)):
+        self.seq = seq
+        self.record = record
+        self._image = image
+        self._raw = raw
+        self._conversion = conversion
+        self._pool = pool
+        self._pooled_image = None
+        self._lock = threading.Lock()
+        self._depth = None
+        self._raw_depth = raw_depth
+        self._depth_range = depth_range
+
+    @property
+    def has_depth(self) -> bool:
+        return self._raw_depth is not None or self._depth is not None
+
+    @property
+    def depth(self) -> np.ndarray | None:
+        """Distance along the camera axis in metres, float16, top row first;
+        None if the frame was captured without depth. Nothing rendered
+        (the sky) reads as the far plane."""
+        depth = self._depth
+        if depth is None and self._raw_depth is not None:
+            with self._lock:
+                if self._depth is None:
+                    # Perspective depth d maps back to the distance z as
+                    # z = near * far / (far - d * (far - near)).
+                    near, far = self._depth_range
+                    z = self._raw_depth[::-1] * np.float32(near - far)
+                    z += np.float32(far)
+                    np.divide(np.float32(near * far), z, out=z)
+                    self._depth = z.astype(np.float16)
+                    if self._pool is not None:
+                        self._pool.release(self._raw_depth)
+                    self._raw_depth = None
+                depth = self._depth
+        return depth
+
+    @property
+    def image(self) -> np.ndarray:
+        """The frame as a BGR uint8 array, top row first."""
+        image = self._image
+        if image is None:
+            with self._lock:
+                if self._image is None:
+                    raw = self._raw
+                    dst = None
+                    if self._pool is not None:
+                        dst = self._pool.acquire((raw.shape[0], raw.shape[1], 3))
+                    image = cv2.cvtColor(raw, self._conversion, dst=dst)
+                    self._image = cv2.flip(image, 0, dst=image)
+                    if self._pool is not None:
+                        self._pooled_image = dst
+                        self._pool.release(raw)
+                    self._raw = None
+                image = self._image
+        return image
+
+    def __del__(self):
+        pool = self._pool
+        if pool is None:
+            return
+        for buffer in (self._raw, self._pooled_image, self._raw_depth):
+            if buffer is not None:
+                pool.release(buffer)
+
+
+def _encode_png(image: np.ndarray, level: int | None) -> bytes:
+    params = [] if level is None else [cv2.IMWRITE_PNG_COMPRESSION, level]
+    success, buffer = cv2.imencode('.png', image, params)
+    return buffer.tobytes() if success else b""
+
+
+def _encode_jpeg(image: np.ndarray, quality: int | None) -> bytes:
+    params = [] if quality is None else [cv2.IMWRITE_JPEG_QUALITY, quality]
+    success, buffer = cv2.imencode('.jpg', image, params)
+    return buffer.tobytes() if success else b""
+
+
+def _encode_raw(image: np.ndarray, _param: None) -> bytes:
+    # The BGR pixels as they are; the reply header carries the shape.
+    return np.ascontiguousarray(image).tobytes()
+
+
+# codec name -> encode(image, param). The param (PNG compression level, JPEG
+# quality) is None for the codec's default. See command_registry.FRAME_CODECS.
+FRAME_ENCODERS: dict[str, Callable[[np.ndarray, int | None], bytes]] = {
+    "png": _encode_png,
+    "jpeg": _encode_jpeg,
+    "raw": _encode_raw,
+}
+
+
+def encode_frame(image: np.ndarray, codec: str, param: int | None = None) -> bytes:
+    return FRAME_ENCODERS[codec](image, param)
+
+
+def frame_reply(header: dict, payload: bytes = b"") -> bytes:
+    """An extended frame message: 2-byte header length, JSON header, payload.
+
+    Used by get_latest_frame with options and by the video push stream.
+    """
+    encoded = json.dumps(header).encode()
+    return len(encoded).to_bytes(2, byteorder='big') + encoded + payload
+
+
+def frame_header(capture: CapturedFrame, codec: str) -> dict:
+    """{"seq", "codec"}, the raw shape and dtype, and the capture record."""
+    header = {"seq": capture.seq, "codec": codec}
+    if capture.record is not None:
+        header["capture"] = capture.record.to_json()
+    if codec == "raw":
+        header["shape"] = list(capture.image.shape)
+        header["dtype"] = str(capture.image.dtype)
+    return header
+
+
+class FrameCache:
+    """Encoded bytes of the most recent frame, one entry per codec.
+
+    A codec key names the codec and its parameter ("png", "png:9",
+    "jpeg:80"), so each setting is encoded once and cached on its own.
+
+    Only the newest sequence number is kept: a request for a newer frame
+    drops every entry of the old one. Concurrent requests for the same
+    (sequence, codec) wait for the one encode instead of racing to do it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = -1
+        self._entries: dict[str, bytes] = {}
+        self._encoding: dict[str, threading.Lock] = {}
+        self.encodes = 0
+        self.hits = 0
+
+    def encoded(self, capture: CapturedFrame, codec: str, param: int | None = None) -> bytes:
+        """`capture` encoded with a FRAME_ENCODERS codec, cached per parameter."""
+        key = codec if param is None else f"{codec}:{param}"
+        return self.get(capture, key, lambda image: encode_frame(image, codec, param))
+
+    def get(self, capture: CapturedFrame, codec: str,
+            encode: Callable[[np.ndarray], bytes]) -> bytes:
+        """Return `capture` encoded with `codec`, running `encode` only on a miss."""
+        with self._lock:
+            if capture.seq > self._seq:
+                self._seq = capture.seq
+                self._entries.clear()
+                self._encoding.clear()
+            elif capture.seq < self._seq:
+                # A request that grabbed its frame just before a newer one was
+                # cached; encode it for this caller only.
+                return encode(capture.image)
+            cached = self._entries.get(codec)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            guard = self._encoding.setdefault(codec, threading.Lock())
+
+        with guard:
+            with self._lock:
+                cached = self._entries.get(codec) if capture.seq == self._seq else None
+                if cached is not None:
+                    self.hits += 1
+                    return cached
+            data = encode(capture.image)
+            with self._lock:
+                self.encodes += 1
+                if capture.seq == self._seq:
+                    self._entries[codec] = data
+            return data
@@ -0,0 +1,86 @@
+"""Whether anyone is consuming the FPV stream, so idle streams cost nothing.
+
+streamon used to mean "render and read back a frame every tick", whether
+or not any client ever asked for one. Capture is now demand-driven: the
+render thread asks FrameDemand.wanted() each tick and only renders and reads
+back frames while someone is consuming them, namely
+
+- a video stream viewer is connected (viewer_started / viewer_stopped);
+- a get_latest_frame request came in within the keep-warm window
+  (request());
+- a frame ring reader read within the keep-warm window (the ring's
+  heartbeat, passed in by the adapter).
+
+A request that finds capture idle wakes it and waits for the first fresh
+frame (wait_for_frame), so a pull never gets a frame from before the pause.
+"""
+from __future__ import annotations
+
+import threading
+from time import monotonic
+
+# How long capture keeps running after the last request, so a client
+# polling every frame or two never sees it stop in between.
+KEEP_WARM_S = 2.0
+# Longest a request waits for capture to wake up and deliver a frame.
+WAKE_TIMEOUT_S = 0.5
+
+
+class FrameDemand:
+    """Tracks frame consumers. request() and the viewer calls come from
+    server threads, wanted() and published() from the render thread."""
+
+    def __init__(self, keep_warm_s: float = KEEP_WARM_S):
+        self.keep_warm_s = keep_warm_s
+        self._cond = threading.Condition()
+        self._last_request = float("-inf")
+        self._viewers = 0
+        self._seq = 0
+        # Whether the render thread captured on its last tick.
+        self.capturing = False
+        # Ticks captured and skipped while streaming, for get_capture_stats.
+        self.capture_ticks = 0
+        self.idle_ticks = 0
+
+    def request(self) -> bool:
+        """Note a pull. Returns whether capture was already running."""
+        self._last_request = monotonic()
+        return self.capturing
+
+    def viewer_started(self) -> None:
+        with self._cond:
+            self._viewers += 1
+
+    def viewer_stopped(self) -> None:
+        with self._cond:
+            self._viewers -= 1
+
+    def wanted(self, now: float, last_ring_read: float = float("-inf")) -> bool:
+        """Whether to capture this tick. `now` is time.monotonic()."""
+        recent = max(self._last_request, last_ring_read)
+        wanted = self._viewers > 0 or now - recent < self.keep_warm_s
+        self.capturing = wanted
+        if wanted:
+            self.capture_ticks += 1
+        else:
+            self.idle_ticks += 1
+        return wanted
+
+    def published(self, seq: int) -> None:
+        """A new frame is out; wake requests waiting for it."""
+        with self._cond:
+            self._seq = seq
+            self._cond.notify_all()
+
+    def wait_for_frame(self, after_seq: int, timeout: float = WAKE_TIMEOUT_S) -> bool:
+        """Block until a frame newer than `after_seq` is published."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._seq > after_seq, timeout)
+
+    def stats(self) -> dict:
+        return {
+            "capturing": self.capturing,
+            "viewers": self._viewers,
+            "capture_ticks": self.capture_ticks,
+            "idle_ticks": self.idle_ticks,
+        }
@@ -0,0 +1,136 @@
+"""Asynchronous framebuffer readback for the FPV stream.
+
+A plain glReadPixels into client memory blocks the render thread until the
+GPU has finished the frame and the driver has copied it out. FrameGrabber
+reads through two pixel buffer objects (PBOs) instead, ping-ponging between
+them: each tick starts the copy of the current frame into one PBO, which
+returns immediately, and maps the other one, whose copy was started a frame
+ago and has long finished. The stream is therefore one frame behind the
+screen, and the render thread never waits on the GPU.
+
+What comes out is the raw readback (RGBA, rows bottom-to-top). Converting it
+to the BGR, top-down image everyone else uses is left to CapturedFrame,
+which does it on first access from whichever thread needs the pixels.
+
+If the PBO path is unavailable (no OpenGL 2.1, or any GL error setting it
+up), FrameGrabber falls back to the synchronous glReadPixels.
+"""
+from __future__ import annotations
+
+import ctypes
+import logging
+
+import numpy as np
+from OpenGL.GL import (
+    GL_PIXEL_PACK_BUFFER,
+    GL_READ_ONLY,
+    GL_RGBA,
+    GL_STREAM_READ,
+    GL_UNSIGNED_BYTE,
+    glBindBuffer,
+    glBufferData,
+    glDeleteBuffers,
+    glGenBuffers,
+    glMapBuffer,
+    glUnmapBuffer,
+)
+# The wrapped glReadPixels allocates the array it returns. The raw entry
+# point writes wherever it is pointed: into a preallocated array, or into
+# the bound PBO, where the "pointer" is a byte offset.
+from OpenGL.raw.GL.VERSION.GL_1_0 import glReadPixels as glReadPixelsRaw
+
+from frame_cache import FramePool
+
+logger = logging.getLogger(__name__)
+
+
+class FrameGrabber:
+    """Double-buffered PBO readback of the default framebuffer. Render thread only."""
+
+    def __init__(self, pool: FramePool | None = None):
+        # Where frames are copied to; None allocates a new array each time.
+        self.pool = pool
+        self._pbos = None
+        self._size: tuple[int, int] | None = None
+        self._index = 0
+        # Whether each PBO holds a started readback that has not been mapped yet.
+        self._pending = [False, False]
+        self.use_pbo = True
+
+    def grab(self, width: int, height: int) -> np.ndarray | None:
+        """Start reading this frame; return the frame read on the previous call.
+
+        The array is the raw RGBA readback, rows bottom-to-top, owned by the
+        caller. Returns None when there is nothing to hand out yet (the first
+        frame, or the first after a resize).
+        """
+        if self.use_pbo:
+            try:
+                return self._grab_async(width, height)
+            except Exception as e:
+                logger.warning("[FPV] PBO readback unavailable (%s); using synchronous reads", e)
+                self.release()
+                self.use_pbo = False
+        frame = self._new_frame(width, height)
+        glReadPixelsRaw(0, 0, width, height, GL_RGBA, GL_UNSIGNED_BYTE,
+                        frame.ctypes.data_as(ctypes.c_void_p))
+        return frame
+
+    def _new_frame(self, width: int, height: int) -> np.ndarray:
+        if self.pool is None:
+            return np.empty((height, width, 4), np.uint8)
+        return self.pool.acquire((height, width, 4))
+
+    def _grab_async(self, width: int, height: int) -> np.ndarray | None:
+        if self._size != (width, height):
+            self._allocate(width, height)
+        nbytes = width * height * 4
+        current, previous = self._index, 1 - self._index
+        self._index = previous
+
+        # Queue this frame's copy into the current PBO; returns at once.
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self._pbos[current])
+        glReadPixelsRaw(0, 0, width, height, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        self._pending[current] = True
+
+        # Collect the copy started one frame ago.
+        frame = None
+        if self._pending[previous]:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, self._pbos[previous])
+            address = glMapBuffer(GL_PIXEL_PACK_BUFFER, GL_READ_ONLY)
+            if address:
+                try:
+                    mapped = (ctypes.c_ubyte * nbytes).from_address(int(address))
+                    # One memcpy out of driver memory: the mapping dies at unmap.
+                    frame = self._new_frame(width, height)
+                    np.copyto(frame, np.frombuffer(mapped, np.uint8).reshape(height, width, 4))
+                finally:
+                    glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+            self._pending[previous] = False
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return frame
+
+    def _allocate(self, width: int, height: int) -> None:
+        self.release()
+        self._pbos = [int(pbo) for pbo in glGenBuffers(2)]
+        for pbo in self._pbos:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, width * height * 4, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self._size = (width, height)
+        self._index = 0
+        self._pending = [False, False]
+
+    def release(self) -> None:
+        """Free the PBOs (streamoff, resize). The next grab() starts over."""
+        if self._pbos is not None:
+            try:
+                # A failure mid-grab can leave a PBO bound, which would turn
+                # the synchronous fallback's reads into PBO writes.
+                glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+                glDeleteBuffers(2, self._pbos)
+            except Exception:
+                pass
+        self._pbos = None
+        self._size = None
+        self._pending = [False, False]
@@ -0,0 +1,240 @@
+"""Shared-memory ring of FPV frames for vision code on the simulator's host.
+
+Every other way of getting a frame out of the simulator (get_latest_frame,
+the video stream) encodes it, pushes it through a socket and decodes it
+again. A process on the same machine can instead map this ring and read
+the pixels where the simulator wrote them: no encode, no copy and no
+system call per frame.
+
+Layout of the shared memory block (all integers little-endian):
+
+    ring header  RING_HEADER at offset 0, padded to RING_HEADER_SIZE:
+                 magic, version, slot count, max width, max height,
+                 slot size in bytes, seq of the newest complete frame,
+                 then the readers' heartbeat
+    slot i       at RING_HEADER_SIZE + i * slot size:
+                 SLOT_HEADER, padded to SLOT_HEADER_SIZE, then the pixels
+
+Frame `seq` goes to slot seq % slots. Each slot header starts with a
+seqlock counter: the writer makes it odd before touching the slot and even
+again when the slot is complete, so a reader that sees the same even value
+before and after reading the header knows it is consistent. The header
+also carries the frame's capture times (monotonic and wall clock) and the
+drone's pose when it was rendered.
+
+The pixels are the renderer's raw readback: 4 channels, rows bottom to top,
+channel order given by the slot's layout code. Readers get them as a
+strided NumPy view in BGR or RGB, top row first, without copying. A view
+stays valid until the writer comes round to its slot again, slots - 1
+frames later; `FrameRingReader.is_current` tells whether it still is, and
+anything kept longer must be copied.
+
+Readers stamp the heartbeat (their time.monotonic(), which is system-wide)
+whenever they look for a frame. The simulator only captures frames while
+someone consumes them (frame_demand.py), and the heartbeat is how it knows
+a ring reader is there.
+
+This module only needs numpy, so clients import it as tello_sim.frame_ring.
+"""
+from __future__ import annotations
+
+import os
+import struct
+from multiprocessing import resource_tracker, shared_memory
+from time import monotonic
+from typing import NamedTuple
+
+import numpy as np
+
+# Must match on both ends; override with TELLO_SIM_FRAME_RING.
+DEFAULT_NAME = os.environ.get("TELLO_SIM_FRAME_RING", "tello_sim_fpv")
+DEFAULT_SLOTS = 4
+
+MAGIC = b"TSFR"
+VERSION = 2
+
+# magic, version, slots, max width, max height, slot size, newest seq
+RING_HEADER = struct.Struct("<4sHHIIQQ")
+RING_HEADER_SIZE = 64
+_LATEST = struct.Struct("<Q")
+_LATEST_OFFSET = RING_HEADER.size - _LATEST.size
+_HEARTBEAT = struct.Struct("<d")
+_HEARTBEAT_OFFSET = RING_HEADER.size
+
+# seqlock counter, frame seq, monotonic time, wall time,
+# x, y, z, yaw, pitch, roll, width, height, layout
+SLOT_HEADER = struct.Struct("<QQdd6dIII")
+SLOT_HEADER_SIZE = 128
+_COUNTER = struct.Struct("<Q")
+
+# How the 4 channels of a slot are ordered. Rows are always bottom to top.
+LAYOUT_BGRA = 0  # FpvCamera's offscreen buffer
+LAYOUT_RGBA = 1  # glReadPixels of the window
+
+# Channel index orders turning each layout into BGR / RGB.
+_CHANNELS = {
+    (LAYOUT_BGRA, False): slice(0, 3),
+    (LAYOUT_BGRA, True): slice(2, None, -1),
+    (LAYOUT_RGBA, False): slice(2, None, -1),
+    (LAYOUT_RGBA, True): slice(0, 3),
+}
+
+
+class Pose(NamedTuple):
+    """Drone pose, in StateSnapshot's conventions: metres and degrees."""
+    x: float
+    y: float
+    z: float
+    yaw: float
+    pitch: float
+    roll: float
+
+
+class RingFrame(NamedTuple):
+    """One frame read from the ring. `image` is a view into shared memory."""
+    seq: int
+    mono_time: float   # time.monotonic() in the simulator at capture
+    wall_time: float   # time.time() at capture
+    pose: Pose
+    image: np.ndarray
+
+
+def _slot_size(width: int, height: int) -> int:
+    # Keep every slot's pixels 64-byte aligned.
+    return SLOT_HEADER_SIZE + (width * height * 4 + 63) // 64 * 64
+
+
+class FrameRingWriter:
+    """Creates the ring and writes frames into it. Render thread only.
+
+    Any block of the same name left behind by a simulator that crashed is
+    replaced. Frames larger than width x height are not written.
+    """
+
+    def __init__(self, width: int, height: int, slots: int = DEFAULT_SLOTS,
+                 name: str = DEFAULT_NAME):
+        self.width = width
+        self.height = height
+        self.slots = slots
+        self._slot_size = _slot_size(width, height)
+        size = RING_HEADER_SIZE + slots * self._slot_size
+        try:
+            self._shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name, create=True, size=size)
+        self.name = self._shm.name
+        self._buf = self._shm.buf
+        RING_HEADER.pack_into(self._buf, 0, MAGIC, VERSION, slots, width, height,
+                              self._slot_size, 0)
+        _HEARTBEAT.pack_into(self._buf, _HEARTBEAT_OFFSET, float("-inf"))
+
+    @property
+    def last_read(self) -> float:
+        """time.monotonic() of the last reader's latest() call."""
+        return _HEARTBEAT.unpack_from(self._buf, _HEARTBEAT_OFFSET)[0]
+
+    def write(self, seq: int, pixels: np.ndarray, layout: int, mono_time: float,
+              wall_time: float, pose: Pose) -> bool:
+        """Publish frame `seq` (a raw 4-channel readback). False if it does not fit."""
+        height, width = pixels.shape[:2]
+        if width * height > self.width * self.height or pixels.shape[2:] != (4,):
+            return False
+        offset = RING_HEADER_SIZE + (seq % self.slots) * self._slot_size
+        (counter,) = _COUNTER.unpack_from(self._buf, offset)
+        _COUNTER.pack_into(self._buf, offset, counter + 1)  # odd: being written
+        target = np.ndarray((height, width, 4), np.uint8, self._buf,
+                            offset + SLOT_HEADER_SIZE)
+        np.copyto(target, pixels)
+        SLOT_HEADER.pack_into(self._buf, offset, counter + 1, seq, mono_time, wall_time,
+                              *pose, width, height, layout)
+        _COUNTER.pack_into(self._buf, offset, counter + 2)
+        _LATEST.pack_into(self._buf, _LATEST_OFFSET, seq)
+        return True
+
+    def close(self) -> None:
+        """Remove the ring. Readers keep their mapping until they close it."""
+        self._buf = None
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        # Before 3.13 attaching also registers the block with this process's
+        # resource tracker, which would unlink it from under the simulator
+        # when the reader exits.
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        return shm
+
+
+class FrameRingReader:
+    """Maps an existing ring. Raises FileNotFoundError if there is none.
+
+    latest() returns the newest complete frame; it reads two counters and a
+    header, stamps the heartbeat, and never blocks or copies pixels.
+    """
+
+    # Attempts before giving up on a slot that keeps being rewritten.
+    READ_RETRIES = 8
+
+    def __init__(self, name: str = DEFAULT_NAME):
+        self._shm = _attach(name)
+        self._buf = self._shm.buf
+        magic, version, self.slots, self.width, self.height, self._slot_size, _ = \
+            RING_HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{name} is not a version {VERSION} tello_sim frame ring")
+
+    @property
+    def latest_seq(self) -> int:
+        """Sequence number of the newest frame, 0 before the first one."""
+        return _LATEST.unpack_from(self._buf, _LATEST_OFFSET)[0]
+
+    def latest(self, newer_than: int | None = None, rgb: bool = False) -> RingFrame | None:
+        """The newest frame, BGR (or RGB) top row first; None if there is
+        none yet, or none newer than `newer_than`."""
+        _HEARTBEAT.pack_into(self._buf, _HEARTBEAT_OFFSET, monotonic())
+        for _ in range(self.READ_RETRIES):
+            seq = self.latest_seq
+            if seq == 0 or (newer_than is not None and seq <= newer_than):
+                return None
+            offset = self._offset(seq)
+            (counter, slot_seq, mono_time, wall_time, x, y, z, yaw, pitch, roll,
+             width, height, layout) = SLOT_HEADER.unpack_from(self._buf, offset)
+            if (counter & 1 or slot_seq != seq
+                    or _COUNTER.unpack_from(self._buf, offset)[0] != counter):
+                continue  # overwritten while we looked; the newer seq is next
+            pixels = np.ndarray((height, width, 4), np.uint8, self._buf,
+                                offset + SLOT_HEADER_SIZE)
+            image = pixels[::-1, :, _CHANNELS[layout, rgb]]
+            return RingFrame(seq, mono_time, wall_time, Pose(x, y, z, yaw, pitch, roll), image)
+        return None
+
+    def is_current(self, frame: RingFrame) -> bool:
+        """True while `frame.image` still holds that frame's pixels."""
+        offset = self._offset(frame.seq)
+        counter, slot_seq = struct.unpack_from("<QQ", self._buf, offset)
+        return not counter & 1 and slot_seq == frame.seq
+
+    def close(self) -> None:
+        """Unmap the ring. Views from latest() must not be used afterwards."""
+        self._buf = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # numpy views still reference the mapping; it is released when
+            # they are garbage collected.
+            pass
+
+    def _offset(self, seq: int) -> int:
+        return RING_HEADER_SIZE + (seq % self.slots) * self._slot_size
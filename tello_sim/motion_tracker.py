@@ -0,0 +1,62 @@
+"""Completion tracking for queued motion commands.
+
+Every motion command (forward, go, curve, rotate_cw, up, ...) gets an id
+when the server accepts it. The id stays pending while the command waits in
+the mailbox and in UrsinaAdapter.command_queue, and is finished when
+_motion_complete_callback fires (or failed when an emergency drops it).
+Server threads block on wait()/wait_idle() instead of clients polling
+get_is_moving.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+
+# Finished results kept for late wait() calls; older ids report "ok".
+FINISHED_HISTORY = 1024
+
+
+class MotionTracker:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._next_id = 1
+        self._pending: set[int] = set()
+        self._finished: OrderedDict[int, str] = OrderedDict()  # id -> reply
+
+    def begin(self) -> int:
+        """Allocate the id for a newly accepted motion command."""
+        with self._cond:
+            motion_id = self._next_id
+            self._next_id += 1
+            self._pending.add(motion_id)
+            return motion_id
+
+    def finish(self, motion_id: int | None, result: str = "ok") -> None:
+        """Record the outcome ("ok" or "error <reason>") and wake waiters."""
+        if motion_id is None:
+            return
+        with self._cond:
+            if motion_id not in self._pending:
+                return
+            self._pending.discard(motion_id)
+            self._finished[motion_id] = result
+            while len(self._finished) > FINISHED_HISTORY:
+                self._finished.popitem(last=False)
+            self._cond.notify_all()
+
+    def wait(self, motion_id: int, timeout: float) -> str:
+        """Block until `motion_id` finishes; return its reply."""
+        with self._cond:
+            if motion_id <= 0 or motion_id >= self._next_id:
+                return f"error unknown motion id {motion_id}"
+            if not self._cond.wait_for(lambda: motion_id not in self._pending, timeout):
+                return "error timeout"
+            # Long-finished ids fall out of the history; they completed.
+            return self._finished.get(motion_id, "ok")
+
+    def wait_idle(self, timeout: float) -> str:
+        """Block until no motion is pending at all."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: not self._pending, timeout):
+                return "error timeout"
+            return "ok"
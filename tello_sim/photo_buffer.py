@@ -0,0 +1,152 @@
+"""Photos taken with capture_frame, kept in memory and optionally saved to disk.
+
+capture_frame used to bump a counter and throw the picture away, so taking
+a photo meant pulling a whole PNG over TCP at the right moment. Now each
+capture_frame keeps the next streamed frame, with its capture record, in a
+bounded PhotoBuffer. get_captures returns every photo since a given id in
+one reply, and a PhotoWriter can save each new photo to a directory from
+its own thread, so neither costs the render loop more than a list append.
+
+A photo holds the CapturedFrame itself (frames are never modified once
+published), so keeping one costs no copy; the pixels are converted and
+encoded only when someone asks for them.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import threading
+from collections import deque
+from typing import NamedTuple
+
+import cv2
+
+from frame_cache import CapturedFrame, encode_frame, frame_header, frame_reply
+
+logger = logging.getLogger(__name__)
+
+# Photos kept in memory; older ones are forgotten (but were saved, if a
+# writer is attached).
+PHOTO_CAPACITY = 64
+# Photos waiting to be written before new ones are skipped.
+SAVE_QUEUE_PHOTOS = 64
+
+
+class Photo(NamedTuple):
+    id: int
+    capture: CapturedFrame
+
+
+class PhotoWriter:
+    """Saves photos as photo_<id>.png plus photo_<id>.json (the capture
+    record) in `directory`, from a background thread. save() never blocks:
+    if the queue is full the photo is skipped and counted in `dropped`."""
+
+    def __init__(self, directory: str, queue_photos: int = SAVE_QUEUE_PHOTOS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.saved = 0
+        self.dropped = 0
+        self._queue: queue.Queue[Photo | None] = queue.Queue(queue_photos)
+        self._thread = threading.Thread(target=self._run, name="photo-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, photo: Photo) -> None:
+        try:
+            self._queue.put_nowait(photo)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Write what is queued, then end the thread."""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            photo = self._queue.get()
+            if photo is None:
+                return
+            base = os.path.join(self.directory, f"photo_{photo.id:05d}")
+            try:
+                if not cv2.imwrite(base + ".png", photo.capture.image):
+                    raise OSError(f"cannot write {base}.png")
+                if photo.capture.record is not None:
+                    with open(base + ".json", "w") as f:
+                        json.dump({"id": photo.id, "seq": photo.capture.seq,
+                                   **photo.capture.record.to_json()}, f)
+                self.saved += 1
+            except Exception as e:
+                logger.warning("[Capture] Failed to save photo %d: %s", photo.id, e)
+
+
+class PhotoBuffer:
+    """The last `capacity` photos. Thread-safe."""
+
+    def __init__(self, capacity: int = PHOTO_CAPACITY):
+        self._photos: deque[Photo] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.writer: PhotoWriter | None = None
+
+    @property
+    def latest_id(self) -> int:
+        """Id of the newest photo, 0 before the first."""
+        return self._next_id - 1
+
+    def add(self, capture: CapturedFrame) -> Photo:
+        with self._lock:
+            photo = Photo(self._next_id, capture)
+            self._next_id += 1
+            self._photos.append(photo)
+        writer = self.writer
+        if writer is not None:
+            writer.save(photo)
+        return photo
+
+    def since(self, since_id: int = 0) -> list[Photo]:
+        """The buffered photos with an id above `since_id`, oldest first."""
+        with self._lock:
+            return [photo for photo in self._photos if photo.id > since_id]
+
+    def set_directory(self, directory: str | None) -> None:
+        """Save every new photo to `directory` from now on; None stops saving."""
+        writer, self.writer = self.writer, None
+        if writer is not None:
+            writer.stop()
+        if directory:
+            self.writer = PhotoWriter(directory)
+
+    def stats(self) -> dict:
+        writer = self.writer
+        return {
+            "latest_id": self.latest_id,
+            "buffered": len(self._photos),
+            "directory": writer.directory if writer else None,
+            "saved": writer.saved if writer else 0,
+            "save_dropped": writer.dropped if writer else 0,
+        }
+
+
+def photos_reply(photos: list[Photo], codec: str, param: int | None, stats: dict) -> bytes:
+    """The get_captures reply: one frame_reply whose header lists the photos
+    and whose payload is their encoded images, back to back, in that order.
+
+    Header: {"codec", "photos": [{"id", "size", "seq", "capture", ...}],
+    "buffer": stats}; each photo's entry is frame_header() plus its id and
+    payload size.
+    """
+    entries, payloads = [], []
+    for photo in photos:
+        payload = encode_frame(photo.capture.image, codec, param)
+        entry = frame_header(photo.capture, codec)
+        entry["id"] = photo.id
+        entry["size"] = len(payload)
+        entries.append(entry)
+        payloads.append(payload)
+    return frame_reply({"codec": codec, "photos": entries, "buffer": stats}, b"".join(payloads))
@@ -0,0 +1,103 @@
+"""The drone's state as of the last simulation tick, as one immutable object.
+
+The state getters used to read the Ursina entities live: get_state from a
+command-server thread and the telemetry stream from its own thread, while
+the render thread was moving the drone. One reply could mix fields from two
+frames (x from before a step, z from after), and every request repeated
+the same Panda3D attribute lookups.
+
+Now UrsinaAdapter.tick() ends by taking a StateSnapshot and publishing it
+as `adapter.state_snapshot`, replacing the previous one with a single
+attribute store. Readers on any thread take that reference once and read
+everything from it: every field of a reply comes from the same tick, no
+reader can see one half-updated, and the entities are only read once per
+tick however many clients poll.
+"""
+from __future__ import annotations
+
+from time import monotonic, time
+from typing import NamedTuple
+
+
+class StateSnapshot(NamedTuple):
+    """The drone's state at the end of one tick.
+
+    Position is in metres in the simulator's world frame (1 world unit =
+    0.1 m, the same scale get_height/get_speed_* already use); y is height
+    above the ground, matching get_height's convention: the drone entity
+    rests at y = 2.6 world units when landed, and the inherited 0.3 m
+    offset makes a landed drone read -0.04 m (approximately zero).
+    Yaw is degrees, normalised to [-180, 180) before rounding to one decimal
+    place (raw_yaw of 180 wraps to -180). Pitch and roll are degrees,
+    speeds km/h, accelerations the get_acceleration_* values, tof cm.
+    """
+    tick: int           # ticks since the simulator started
+    mono_time: float    # time.monotonic() when taken: the sim clock ("sim_time")
+    time: float         # time.time() when taken
+    x: float
+    y: float
+    z: float
+    yaw: float
+    pitch: int
+    roll: int
+    speed_x: int
+    speed_y: int
+    speed_z: int
+    accel_x: float
+    accel_y: float
+    accel_z: float
+    tof: int
+    battery: int
+    flight_time: int
+    flying: bool
+
+    def position(self) -> dict:
+        """Just the pose: {x, y, z, yaw}, for the get_position command."""
+        return {"x": self.x, "y": self.y, "z": self.z, "yaw": self.yaw}
+
+    def state(self) -> dict:
+        """The full state as a plain dict: get_state and the telemetry stream."""
+        return {
+            "x": self.x,
+            "y": self.y,
+            "z": self.z,
+            "yaw": self.yaw,
+            "pitch": self.pitch,
+            "roll": self.roll,
+            "speed_x": self.speed_x,
+            "speed_y": self.speed_y,
+            "speed_z": self.speed_z,
+            "tof": self.tof,
+            "battery": self.battery,
+            "flying": self.flying,
+            "time": round(self.time, 3),
+            "sim_time": round(self.mono_time, 6),
+        }
+
+
+def take_snapshot(adapter, tick: int) -> StateSnapshot:
+    """Read the adapter's live state. Render thread only."""
+    drone = adapter.drone
+    acceleration = adapter.calculated_acceleration
+    raw_yaw = drone.rotation_y
+    return StateSnapshot(
+        tick=tick,
+        mono_time=monotonic(),
+        time=time(),
+        x=round(drone.x * 0.1, 3),
+        y=round((drone.y * 0.1) - 0.3, 3),
+        z=round(drone.z * 0.1, 3),
+        yaw=round(((raw_yaw + 180) % 360) - 180, 1),
+        pitch=adapter.get_pitch(),
+        roll=adapter.get_roll(),
+        speed_x=adapter.get_speed_x(),
+        speed_y=adapter.get_speed_y(),
+        speed_z=adapter.get_speed_z(),
+        accel_x=acceleration.x * 100,
+        accel_y=acceleration.y * 100,
+        accel_z=acceleration.z * 100,
+        tof=adapter.get_distance_tof(),
+        battery=adapter.get_battery(),
+        flight_time=adapter.get_flight_time(),
+        flying=adapter.is_flying,
+    )
@@ -0,0 +1,94 @@
+"""Binary encoding of telemetry samples, the compact alternative to JSON.
+
+A JSON state datagram is about 200 bytes of text that every subscriber has
+to parse. A subscriber that sends b"subscribe bin" instead gets each sample
+as a fixed struct layout (all little-endian):
+
+    header   HEADER: version, reserved byte, field mask, sequence number
+    fields   each field whose bit is set in the mask, in FIELDS order,
+             packed back to back with its own struct code
+
+Bit i of the mask stands for the i-th entry of FIELDS. A subscriber gets
+every field unless it asked for fields=...; all of them make a 54-byte
+sample. The sequence number counts the samples of the subscriber's stream
+and wraps at 2**32.
+
+This module only needs the standard library, so clients import it as
+tello_sim.telemetry_codec.
+"""
+from __future__ import annotations
+
+import struct
+from functools import lru_cache
+
+VERSION = 1
+
+# version, reserved, field mask, sequence number
+HEADER = struct.Struct("<BBHI")
+
+# Every field a sample can carry, in wire order, with its struct code. Only
+# ever append: a field's bit is its index here.
+FIELDS: dict[str, str] = {
+    "x": "f",          # metres
+    "y": "f",
+    "z": "f",
+    "yaw": "f",        # degrees
+    "pitch": "h",
+    "roll": "h",
+    "speed_x": "h",    # km/h
+    "speed_y": "h",
+    "speed_z": "h",
+    "tof": "H",        # cm
+    "battery": "B",    # percent
+    "flying": "?",
+    "time": "d",       # time.time() of the sample
+    "sim_time": "d",   # the simulator's time.monotonic() of the sample
+}
+FIELD_NAMES = tuple(FIELDS)
+ALL_FIELDS = (1 << len(FIELDS)) - 1
+
+
+def fields_mask(names) -> int:
+    """The field mask selecting `names`. Raises ValueError for an unknown name."""
+    mask = 0
+    for name in names:
+        if name not in FIELDS:
+            raise ValueError(f"unknown telemetry field '{name}'")
+        mask |= 1 << FIELD_NAMES.index(name)
+    return mask
+
+
+def mask_fields(mask: int) -> tuple[str, ...]:
+    """The names a field mask selects, in FIELDS order."""
+    return _layout(mask)[0]
+
+
+@lru_cache(maxsize=64)
+def _layout(mask: int) -> tuple[tuple[str, ...], struct.Struct]:
+    """The field names and body struct of a field mask."""
+    names = tuple(name for bit, name in enumerate(FIELD_NAMES) if mask >> bit & 1)
+    return names, struct.Struct("<" + "".join(FIELDS[name] for name in names))
+
+
+def encode_state(state: dict, seq: int, mask: int = ALL_FIELDS) -> bytes:
+    """Pack the fields of `state` selected by `mask`. Raises KeyError if one is missing."""
+    names, body = _layout(mask)
+    return (HEADER.pack(VERSION, 0, mask, seq & 0xFFFFFFFF)
+            + body.pack(*[state[name] for name in names]))
+
+
+def decode_state(data: bytes) -> dict:
+    """Unpack a sample into a state dict plus its "seq".
+
+    Raises ValueError for another version or a datagram of the wrong size.
+    """
+    version, _, mask, seq = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"telemetry sample version {version}, expected {VERSION}")
+    names, body = _layout(mask)
+    if len(data) != HEADER.size + body.size:
+        raise ValueError(f"telemetry sample of {len(data)} bytes, expected "
+                         f"{HEADER.size + body.size}")
+    state = dict(zip(names, body.unpack_from(data, HEADER.size)))
+    state["seq"] = seq
+    return state
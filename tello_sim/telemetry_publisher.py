@@ -1,87 +1,209 @@
 from __future__ import annotations
 
+import ipaddress
 import json
 import logging
+import os
+import select
 import socket
+import statistics
 import threading
-from time import sleep, time
+from collections import deque
+from time import monotonic, sleep, time
+
+from telemetry_codec import ALL_FIELDS, encode_state, fields_mask, mask_fields
 
 logger = logging.getLogger(__name__)
 
 TELEMETRY_PORT = 9998
-PUBLISH_HZ = 10
+# Samples per second pushed to a subscriber that does not ask for a rate.
+# Override with TELLO_SIM_TELEMETRY_HZ.
+PUBLISH_HZ = float(os.environ.get("TELLO_SIM_TELEMETRY_HZ", "10"))
+# The rate the state is sampled at, and so the highest rate a subscriber can
+# get. Override with TELLO_SIM_TELEMETRY_MAX_HZ.
+MAX_PUBLISH_HZ = float(os.environ.get("TELLO_SIM_TELEMETRY_MAX_HZ", "100"))
+# Take each sample on a simulation tick instead of on the publisher's own
+# timer (TELLO_SIM_TELEMETRY_TICK=1); see TelemetryPublisher.
+TICK_DRIVEN = os.environ.get("TELLO_SIM_TELEMETRY_TICK", "").lower() in ("1", "true", "yes")
+# Datagram encodings a subscriber can ask for: b"subscribe" or b"subscribe json"
+# for JSON text, b"subscribe bin" for telemetry_codec's struct layout.
+FORMATS = ("json", "bin")
+# Longest subscribe datagram: "subscribe bin rate=... fields=<every field>".
+MAX_REQUEST_BYTES = 512
+# Recent samples kept for the rate and jitter figures in stats().
+STATS_WINDOW = 256
 # A subscriber that hasn't re-sent "subscribe" within this window is dropped,
 # so crashed clients don't accumulate forever.
 SUBSCRIBER_TTL_S = 10.0
+# How often to look for subscribers past SUBSCRIBER_TTL_S.
+EXPIRE_INTERVAL_S = 1.0
+# Also send every sample to this multicast group (e.g. 239.255.0.98) on
+# MULTICAST_PORT, for listeners on this machine that join the group rather
+# than subscribe. Set with TELLO_SIM_TELEMETRY_GROUP; off by default.
+MULTICAST_GROUP = os.environ.get("TELLO_SIM_TELEMETRY_GROUP") or None
+MULTICAST_PORT = 9997
+# Failed sends in a row after which a subscriber is dropped.
+MAX_SEND_FAILURES = 5
+# Kernel send buffer asked for, so a sample to many subscribers fits in it.
+SEND_BUFFER_BYTES = 1 << 20
 
 
-def build_position(adapter) -> dict:
-    """Snapshot just the drone's pose as a plain dict: {x, y, z, yaw}.
+class _Subscriber:
+    """One subscription: where to send, its format and fields, and `every`,
+    the decimation: it gets every `every`-th sample. `failures` counts its
+    failed sends in a row."""
+    __slots__ = ("addr", "seen", "format", "mask", "every", "failures")
 
-    Position is in metres in the simulator's world frame (1 world unit =
-    0.1 m, the same scale get_height/get_speed_* already use); y is height
-    above the ground, matching get_height's convention: the drone entity
-    rests at y = 2.6 world units when landed, and the inherited 0.3 m
-    offset makes a landed drone read -0.04 m (approximately zero).
-    Yaw is degrees, normalised to [-180, 180) before rounding to one decimal
-    place (raw_yaw of 180 wraps to -180).
+    def __init__(self, addr: tuple, seen: float, fmt: str, mask: int, every: int):
+        self.addr = addr
+        self.seen = seen
+        self.format = fmt
+        self.mask = mask
+        self.every = every
+        self.failures = 0
 
-    Split out from build_state so the get_position command can answer with
-    only the pose, instead of computing battery drain, all three speeds and
-    the attitude on every poll and then discarding them.
-    """
-    raw_yaw = adapter.drone.rotation_y
-    return {
-        "x": round(adapter.drone.x * 0.1, 3),
-        "y": round((adapter.drone.y * 0.1) - 0.3, 3),
-        "z": round(adapter.drone.z * 0.1, 3),
-        "yaw": round(((raw_yaw + 180) % 360) - 180, 1),
-    }
+    def stream(self) -> tuple[str, int, int]:
+        """What it receives; subscribers with equal streams share datagrams."""
+        return self.format, self.mask, self.every
 
 
-def build_state(adapter) -> dict:
-    """Snapshot the full drone state as a plain dict.
+def parse_subscribe(options: list[str], default_hz: float, max_hz: float) -> tuple[str, int, int]:
+    """Parse the options of a subscribe datagram into (format, field mask, every).
 
-    Pose fields (x/y/z/yaw) come from build_position(); see it for the
-    coordinate conventions. Angles are degrees.
+    Options, in any order: a format ("json" or "bin"), "rate=<hz>" and
+    "fields=<name>,<name>,...". Raises ValueError on anything else.
     """
-    return {
-        **build_position(adapter),
-        "pitch": adapter.get_pitch(),
-        "roll": adapter.get_roll(),
-        "speed_x": adapter.get_speed_x(),
-        "speed_y": adapter.get_speed_y(),
-        "speed_z": adapter.get_speed_z(),
-        "battery": adapter.get_battery(),
-        "flying": adapter.is_flying,
-        "time": round(time(), 3),
-    }
+    fmt, mask, rate_hz = "json", ALL_FIELDS, default_hz
+    for option in options:
+        key, _, value = option.partition("=")
+        if not value and key in FORMATS:
+            fmt = key
+        elif key == "rate" and value:
+            rate_hz = float(value)
+            if not rate_hz > 0:
+                raise ValueError(f"rate must be positive, got {value}")
+        elif key == "fields" and value:
+            mask = fields_mask(value.split(","))
+        else:
+            raise ValueError(f"unknown subscribe option '{option}'")
+    return fmt, mask, max(1, round(max_hz / min(rate_hz, max_hz)))
 
 
 class TelemetryPublisher:
     """UDP push stream of drone state.
 
     Clients send the datagram b"subscribe" to TELEMETRY_PORT and then receive
-    one JSON state datagram every 1/PUBLISH_HZ seconds until they send
+    one JSON state datagram every 1/rate_hz seconds until they send
     b"unsubscribe" or stop refreshing their subscription for SUBSCRIBER_TTL_S.
+    Options after "subscribe" (see parse_subscribe) choose the stream:
+
+        bin                  telemetry_codec's binary layout instead of JSON
+        rate=<hz>            another rate, up to max_rate_hz
+        fields=x,y,z,...     only these fields (telemetry_codec.FIELDS)
+
+    e.g. b"subscribe rate=5 fields=x,y,z,battery". A bad option is answered
+    with an b"error ..." datagram and the subscription left as it was.
+
+    Time is divided into slots of 1/max_rate_hz, and a subscriber gets a
+    sample every n-th slot, n being max_rate_hz over its rate, rounded: 100
+    Hz slots serve 100, 50, 33.3, 25, 20... Hz exactly. Each sample is
+    encoded once per distinct (format, fields, n) among the subscribers due
+    for it, and sent only to those.
+
+    Every sample carries "seq", its slot divided by n: consecutive while the
+    publisher keeps up, so a subscriber can tell lost samples from
+    reordered ones, and "sim_time", the simulator's monotonic clock when
+    the state was taken.
+
+    Slots follow a fixed monotonic schedule, so the time spent building
+    and sending one sample does not push the next one back: the rate does
+    not drift. A publisher that falls more than a slot behind skips the
+    missed slots rather than sending a burst of samples, and a stream due
+    in one of them gets its sample in the slot that is taken. With no one
+    to send to, the publisher thread sleeps until someone subscribes.
+
+    Sends never block: the socket is non-blocking, and a datagram that finds
+    the send buffer full is dropped for that subscriber alone. Each sample's
+    sends start at a different subscriber, so such drops are spread over
+    everyone. A subscriber whose sends keep failing is dropped after
+    MAX_SEND_FAILURES without disturbing the rest. Keepalives from existing
+    subscribers don't take the lock; the publisher works from a grouping of
+    the subscribers that is rebuilt only when they change.
+
+    Unicast costs one send per subscriber and sample. With `multicast_group`,
+    every sample at rate_hz is also sent, in the binary format with all
+    fields, to that group on MULTICAST_PORT: one send however many local
+    listeners have joined it, and no subscribe needed.
+
+    By default the publisher's own thread takes the samples. With
+    `tick_driven`, TelloDroneSim.update() calls on_tick() after every
+    simulation tick instead, and the first tick in or after a stream's slot
+    takes its sample, so every sample is the state of one whole physics
+    step. A stream slower than the tick rate keeps its rate whatever the
+    ticks do; one faster than the tick rate gets a sample per tick, its seq
+    skipping the slots that no tick fell in. The sends stay on the
+    publisher's thread either way.
     """
 
-    def __init__(self, ursina_adapter, port: int = TELEMETRY_PORT):
+    def __init__(self, ursina_adapter, port: int = TELEMETRY_PORT,
+                 rate_hz: float = PUBLISH_HZ, tick_driven: bool = TICK_DRIVEN,
+                 max_rate_hz: float = MAX_PUBLISH_HZ,
+                 multicast_group: str | None = MULTICAST_GROUP):
+        if rate_hz <= 0:
+            raise ValueError(f"telemetry rate must be positive, got {rate_hz}")
+        if multicast_group is not None and not ipaddress.ip_address(multicast_group).is_multicast:
+            raise ValueError(f"{multicast_group} is not a multicast address")
         self._ursina_adapter = ursina_adapter
         self._port = port
-        self._subscribers: dict[tuple, float] = {}  # addr -> last-seen time
+        self.rate_hz = rate_hz
+        self.max_rate_hz = max(max_rate_hz, rate_hz)
+        self.tick_driven = tick_driven
+        self._interval = 1.0 / self.max_rate_hz
+        self._subscribers: dict[tuple, _Subscriber] = {}
+        # The multicast group as a subscriber that never expires.
+        self._group = None
+        if multicast_group is not None:
+            self._group = _Subscriber((multicast_group, MULTICAST_PORT), float("inf"), "bin",
+                                      ALL_FIELDS, round(self.max_rate_hz / rate_hz))
+        # Subscribers by stream. Replaced, never changed in place, so the
+        # publisher can read it without the lock; see _regroup.
+        self._streams: dict[tuple[str, int, int], tuple[_Subscriber, ...]] = {}
+        # Set while _streams is not empty; the idle publisher waits on it.
+        self._subscribed = threading.Event()
+        self._regroup()
+        self._next_expiry = 0.0
         self._lock = threading.Lock()
         # Deliberately a plain bool rather than a threading.Event, and
         # deliberately not guarded by _lock: attribute load/store is atomic,
         # and nothing here depends on the transition being observed promptly.
-        # stop() closes the socket, and that is what actually wakes _listen
-        # out of its blocking recvfrom (see the OSError break below); the flag
-        # only stops the next loop iteration. Both threads are daemons, so a
+        # stop() closes the socket, and that is what actually ends _listen's
+        # wait for a datagram (see the OSError break below); the flag only
+        # stops the next loop iteration. Both threads are daemons, so a
         # late read cannot outlive the process. Taking _lock in the loop
         # conditions would only add contention with _publish_loop, which
         # already holds it while pruning subscribers.
         self._running = False
         self._socket = None
+        # The next slot and its start on the monotonic clock, and the last
+        # slot sampled.
+        self._next_due = 0.0
+        self._next_slot = 0
+        self._last_slot = -1
+        # Tick-driven mode: the sample on_tick() took, waiting for the
+        # publish thread to send it.
+        self._pending: list[tuple[bytes, tuple[_Subscriber, ...]]] | None = None
+        self._pending_ready = threading.Condition()
+        # monotonic() of recent samples, and counts, for stats().
+        self._sample_times: deque[float] = deque(maxlen=STATS_WINDOW)
+        self.samples = 0
+        self.skipped = 0
+        # Seconds each of the recent samples took to send, and send counts.
+        self._send_times: deque[float] = deque(maxlen=STATS_WINDOW)
+        self.sent = 0
+        self.send_drops = 0     # send buffer full
+        self.send_failures = 0
+        # No subscribers at the last sample time.
+        self._idle = True
 
     def start(self) -> None:
         # Idempotent. Without this guard a second start() reassigns
@@ -102,9 +224,17 @@ class TelemetryPublisher:
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         try:
             sock.bind(("localhost", self._port))
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_BYTES)
+            if self._group is not None:
+                # Out over loopback only, like everything else on this socket.
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                                socket.inet_aton("127.0.0.1"))
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
         except OSError:
             sock.close()
             raise
+        sock.setblocking(False)
         self._socket = sock
         self._running = True
 
@@ -112,8 +242,12 @@ class TelemetryPublisher:
         listen_thread.start()
         publish_thread = threading.Thread(target=self._publish_loop, daemon=True)
         publish_thread.start()
-        print(f"[Telemetry] Publishing state on UDP port {self._port} "
+        print(f"[Telemetry] Publishing state on UDP port {self._port} at {self.rate_hz:g} Hz, "
+              f"up to {self.max_rate_hz:g} Hz{' on ticks' if self.tick_driven else ''} "
               f"(send 'subscribe' to receive)")
+        if self._group is not None:
+            print(f"[Telemetry] Also sending to multicast group "
+                  f"{self._group.addr[0]}:{self._group.addr[1]}")
 
     def stop(self) -> None:
         self._running = False
@@ -127,41 +261,227 @@ class TelemetryPublisher:
         """Register/unregister subscribers from incoming datagrams."""
         while self._running:
             try:
-                data, addr = self._socket.recvfrom(64)
-            except OSError:
+                # The socket is non-blocking for the sends; wait for a
+                # datagram here instead, waking now and then to see _running.
+                if not select.select([self._socket], [], [], 0.5)[0]:
+                    continue
+                data, addr = self._socket.recvfrom(MAX_REQUEST_BYTES)
+            except (BlockingIOError, ConnectionResetError):
+                # Windows reports an earlier send's ICMP port-unreachable on
+                # the next receive; that is the sender's business, not ours.
+                continue
+            except (OSError, ValueError):
                 break  # socket closed during shutdown
-            message = data.decode(errors="replace").strip().lower()
-            with self._lock:
-                if message == "subscribe":
-                    if addr not in self._subscribers:
-                        logger.info("[Telemetry] Subscriber added: %s", addr)
-                    self._subscribers[addr] = time()
-                elif message == "unsubscribe":
+            message, *options = data.decode(errors="replace").lower().split() or [""]
+            if message == "subscribe":
+                try:
+                    fmt, mask, every = parse_subscribe(options, self.rate_hz, self.max_rate_hz)
+                except ValueError as e:
+                    logger.warning("[Telemetry] Bad subscribe from %s: %s", addr, e)
+                    try:
+                        self._socket.sendto(f"error {e}".encode(), addr)
+                    except OSError:
+                        pass
+                    continue
+                sub = self._subscribers.get(addr)
+                if sub is not None and sub.stream() == (fmt, mask, every):
+                    # A keepalive, nearly every datagram: no lock needed to
+                    # store one float, which only _expire reads.
+                    sub.seen = time()
+                    continue
+                with self._lock:
+                    if sub is None:
+                        logger.info("[Telemetry] Subscriber added: %s (%s, %g Hz)", addr, fmt,
+                                    self.max_rate_hz / every)
+                    self._subscribers[addr] = _Subscriber(addr, time(), fmt, mask, every)
+                    self._regroup()
+            elif message == "unsubscribe":
+                with self._lock:
                     if self._subscribers.pop(addr, None) is not None:
                         logger.info("[Telemetry] Subscriber removed: %s", addr)
+                        self._regroup()
 
-    def _publish_loop(self) -> None:
-        interval = 1.0 / PUBLISH_HZ
-        while self._running:
-            sleep(interval)
-            with self._lock:
-                now = time()
-                expired = [a for a, seen in self._subscribers.items()
-                           if now - seen > SUBSCRIBER_TTL_S]
-                for addr in expired:
-                    del self._subscribers[addr]
-                    logger.info("[Telemetry] Subscriber expired: %s", addr)
-                targets = list(self._subscribers)
-            if not targets:
-                continue
+    def _regroup(self) -> None:
+        """Rebuild _streams from the subscribers. Call with _lock held."""
+        streams: dict[tuple[str, int, int], list[_Subscriber]] = {}
+        if self._group is not None:
+            streams[self._group.stream()] = [self._group]
+        for sub in self._subscribers.values():
+            streams.setdefault(sub.stream(), []).append(sub)
+        self._streams = {key: tuple(subs) for key, subs in streams.items()}
+        if self._streams:
+            self._subscribed.set()
+        else:
+            self._subscribed.clear()
+
+    def _expire(self) -> None:
+        """Drop the subscribers that stopped refreshing their subscription."""
+        wall = time()
+        with self._lock:
+            expired = [a for a, sub in self._subscribers.items()
+                       if wall - sub.seen > SUBSCRIBER_TTL_S]
+            for addr in expired:
+                del self._subscribers[addr]
+                logger.info("[Telemetry] Subscriber expired: %s", addr)
+            if expired:
+                self._regroup()
+
+    def stats(self) -> dict:
+        """Sample rate (max_rate_hz) achieved, and jitter, over the last
+        STATS_WINDOW samples, and what sending them cost.
+
+        jitter_ms is the standard deviation of the intervals between samples;
+        max_late_ms is the longest interval's excess over the target period.
+        skipped counts slots no sample was taken in while someone was
+        subscribed: the publisher fell behind, or ticks came slower than
+        max_rate_hz.
+        send_ms and max_send_ms are the mean and longest time sending one
+        sample took. Of the datagrams not sent, send_drops found the send
+        buffer full and send_failures failed outright.
+        """
+        times = list(self._sample_times)
+        intervals = [b - a for a, b in zip(times, times[1:])]
+        send_times = list(self._send_times)
+        stats = {
+            "rate_hz": self.rate_hz,
+            "max_rate_hz": self.max_rate_hz,
+            "tick_driven": self.tick_driven,
+            "multicast_group": (f"{self._group.addr[0]}:{self._group.addr[1]}"
+                                if self._group is not None else None),
+            "subscribers": len(self._subscribers),
+            "samples": self.samples,
+            "skipped": self.skipped,
+            "sent": self.sent,
+            "send_drops": self.send_drops,
+            "send_failures": self.send_failures,
+            "achieved_hz": None,
+            "jitter_ms": None,
+            "max_late_ms": None,
+            "send_ms": None,
+            "max_send_ms": None,
+        }
+        if send_times:
+            stats["send_ms"] = round(statistics.fmean(send_times) * 1000, 3)
+            stats["max_send_ms"] = round(max(send_times) * 1000, 3)
+        if len(intervals) >= 2:
+            stats["achieved_hz"] = round(len(intervals) / (times[-1] - times[0]), 2)
+            stats["jitter_ms"] = round(statistics.pstdev(intervals) * 1000, 3)
+            stats["max_late_ms"] = round((max(intervals) - self._interval) * 1000, 3)
+        return stats
+
+    def on_tick(self) -> None:
+        """Take a sample if one is due. Render thread, tick-driven mode only."""
+        if not self.tick_driven or not self._running:
+            return
+        now = monotonic()
+        if now < self._next_due:
+            return
+        batches = self._sample(now, self._advance_deadline(now))
+        if batches:
+            with self._pending_ready:
+                self._pending = batches
+                self._pending_ready.notify()
+
+    def _advance_deadline(self, now: float) -> int:
+        """Return the slot `now` falls in (at or after _next_slot) and move
+        _next_due on to the one after it."""
+        missed = int((now - self._next_due) / self._interval)
+        if not self._idle:
+            self.skipped += missed
+        slot = self._next_slot + missed
+        self._next_slot = slot + 1
+        self._next_due += (missed + 1) * self._interval
+        return slot
+
+    def _sample(self, now: float, slot: int) -> list[tuple[bytes, tuple[_Subscriber, ...]]]:
+        """The state as (datagram, subscribers) pairs, one per stream with a
+        sample due since the last slot sampled; empty if none is."""
+        if now >= self._next_expiry:
+            self._next_expiry = now + EXPIRE_INTERVAL_S
+            self._expire()
+        streams = self._streams
+        if not streams:
+            self._idle = True
+            return []
+        if self._idle:
+            # Rate figures cover unbroken runs of samples only.
+            self._sample_times.clear()
+            self._idle = False
+        self._sample_times.append(now)
+        self.samples += 1
+        last, self._last_slot = self._last_slot, slot
+        due = [(key, subs) for key, subs in streams.items() if slot // key[2] > last // key[2]]
+        if not due:
+            return []
+        try:
+            state = self._ursina_adapter.state_snapshot.state()
+            return [(self._encode(state, slot // every, fmt, mask), subs)
+                    for (fmt, mask, every), subs in due]
+        except Exception:
+            logger.exception("[Telemetry] Failed to build state")
+            return []
+
+    @staticmethod
+    def _encode(state: dict, seq: int, fmt: str, mask: int) -> bytes:
+        if fmt == "bin":
+            return encode_state(state, seq, mask)
+        if mask != ALL_FIELDS:
+            state = {name: state[name] for name in mask_fields(mask)}
+        return json.dumps({**state, "seq": seq}).encode()
+
+    def _next_batches(self) -> list[tuple[bytes, tuple[_Subscriber, ...]]]:
+        """Wait for the next sample: the next deadline on our own timer, or
+        the next one on_tick() takes. Empty when there is none."""
+        if self.tick_driven:
+            with self._pending_ready:
+                self._pending_ready.wait_for(lambda: self._pending is not None, 0.5)
+                batches, self._pending = self._pending, None
+            return batches or []
+        if not self._streams:
+            # Nobody to send to: wait for a subscriber instead of waking
+            # every slot, now and then to see _running.
+            self._idle = True
+            self._subscribed.wait(0.5)
+            return []
+        delay = self._next_due - monotonic()
+        if delay > 0:
+            sleep(delay)
+        now = monotonic()
+        return self._sample(now, self._advance_deadline(now))
+
+    def _send(self, batches: list[tuple[bytes, tuple[_Subscriber, ...]]]) -> None:
+        """Send one sample's datagrams."""
+        start = monotonic()
+        sends = [(payload, sub) for payload, subs in batches for sub in subs]
+        first = self.samples % len(sends)
+        failed = []
+        for payload, sub in sends[first:] + sends[:first]:
             try:
-                payload = json.dumps(build_state(self._ursina_adapter)).encode()
-            except Exception:
-                logger.exception("[Telemetry] Failed to build state")
+                self._socket.sendto(payload, sub.addr)
+            except BlockingIOError:
+                self.send_drops += 1
                 continue
-            for addr in targets:
-                try:
-                    self._socket.sendto(payload, addr)
-                except OSError:
-                    with self._lock:
-                        self._subscribers.pop(addr, None)
+            except OSError as e:
+                self.send_failures += 1
+                sub.failures += 1
+                if sub.failures == MAX_SEND_FAILURES:
+                    logger.warning("[Telemetry] Sends to %s keep failing (%s)", sub.addr, e)
+                    failed.append(sub)
+                continue
+            self.sent += 1
+            if sub.failures:
+                sub.failures = 0
+        self._send_times.append(monotonic() - start)
+        if failed:
+            with self._lock:
+                for sub in failed:
+                    if self._subscribers.get(sub.addr) is sub:
+                        del self._subscribers[sub.addr]
+                self._regroup()
+
+    def _publish_loop(self) -> None:
+        self._next_due = monotonic() + self._interval
+        while self._running:
+            batches = self._next_batches()
+            if batches and self._running:
+                self._send(batches)
@@ -1,6 +1,8 @@
 from command_server import CommandServer
+from frame_cache import FrameCache
 from telemetry_publisher import TelemetryPublisher
-from ursina_adapter import UrsinaAdapter
+from ursina_adapter import FPV_FPS, UrsinaAdapter
+from video_stream import VideoStreamer
 import threading
 import atexit
 import signal
@@ -9,8 +11,12 @@ import sys
 class TelloDroneSim:
     def __init__(self):
         self._ursina_adapter = UrsinaAdapter()
-        self._server = CommandServer(self._ursina_adapter)
+        # One cache for pulled and pushed frames: each is encoded once per codec.
+        frame_cache = FrameCache()
         self._telemetry = TelemetryPublisher(self._ursina_adapter)
+        self._server = CommandServer(self._ursina_adapter, frame_cache=frame_cache,
+                                     telemetry=self._telemetry)
+        self._video = VideoStreamer(self._ursina_adapter, frame_cache, fps=FPV_FPS)
         
         # Register cleanup handlers
         atexit.register(self.cleanup)
@@ -29,6 +35,13 @@ class TelloDroneSim:
             self._server.cleanup()
         if hasattr(self, '_telemetry'):
             self._telemetry.stop()
+        if hasattr(self, '_video'):
+            self._video.stop()
+        if hasattr(self, '_ursina_adapter'):
+            if self._ursina_adapter.recorder is not None:
+                # Finish the file; an unclosed mp4 has no index and won't play.
+                self._ursina_adapter.stop_recording()
+            self._ursina_adapter.close_frame_ring()
 
     @property
     def state(self):
@@ -62,6 +75,12 @@ class TelloDroneSim:
             print(f"[Tello Sim] Telemetry failed to start: {e}")
             self.cleanup()
             raise
+        try:
+            self._video.start()
+        except OSError as e:
+            print(f"[Tello Sim] Video stream failed to start: {e}")
+            self.cleanup()
+            raise
 
         try:
             self._ursina_adapter.run()
@@ -75,6 +94,8 @@ class TelloDroneSim:
 
     def update(self) -> None:
         self._ursina_adapter.tick()
+        # Tick-driven telemetry samples the state this tick just produced.
+        self._telemetry.on_tick()
 
     def input(self, key: str) -> None:
         self._ursina_adapter.handle_input(key)
\ No newline at end of file
@@ -1,7 +1,6 @@
 import os
 import json
 import logging
-from OpenGL.GL import glReadPixels, GL_RGBA, GL_UNSIGNED_BYTE
 import numpy as np
 from typing import Literal
 import cv2
@@ -31,10 +30,21 @@ from ursina import (
     Slider,
     WindowPanel,
 )
-from time import sleep, time
+from time import monotonic, sleep, time
 import time as time_module  # ursina publishes the per-frame delta as time.dt on the module
 import traceback
+from contextlib import nullcontext
 from cv2.typing import MatLike
+from command_mailbox import CommandMailbox
+from frame_cache import CaptureRecord, CapturedFrame, FramePool
+from frame_demand import FrameDemand
+from frame_grabber import FrameGrabber
+from frame_ring import LAYOUT_BGRA, LAYOUT_RGBA, FrameRingWriter, Pose
+from fpv_camera import FPV_FAR, FPV_NEAR, FpvCamera
+from motion_tracker import MotionTracker
+from photo_buffer import PhotoBuffer
+from state_snapshot import StateSnapshot, take_snapshot
+from video_recorder import VideoRecorder
 
 logger = logging.getLogger(__name__)
 
@@ -48,12 +58,65 @@ GATE_DIAMETER_SCALE = 0.36     # cm -> world units for gate diameter (fits the d
 UNITS_PER_CM = 0.1             # cm -> world units for gate height/clearance
 GROUND_Y = 3.0                 # drone floor clamp; used as the ground reference
 
+# The downward time-of-flight sensor, like the real Tello's: centimetres to
+# whatever is below the drone, within its range. Out of range reads
+# TOF_OUT_OF_RANGE_CM, which is what the real drone reports.
+TOF_MIN_CM = 10
+TOF_MAX_CM = 800
+TOF_OUT_OF_RANGE_CM = 6553
+
 RC_YAW_RATE_DEG_S = 1.0             # deg/s per rc stick unit; full stick (100) ≈ 100 deg/s
 BATTERY_FLIGHT_DURATION_S = 3600.0  # full battery lasts this much accumulated flight time
 
+# Per-frame budget for running commands posted by the command server (see
+# command_mailbox.py). Whichever limit is hit first ends the frame's share;
+# the rest wait for the next tick.
+MAILBOX_MAX_COMMANDS_PER_FRAME = 32
+MAILBOX_MAX_MS_PER_FRAME = 4.0
+
+# The FPV stream is rendered offscreen (see fpv_camera.py) at this size and rate,
+# independent of the window. Override with TELLO_SIM_FPV_SIZE=WIDTHxHEIGHT and
+# TELLO_SIM_FPV_FPS; the defaults match the real Tello.
+FPV_DEFAULT_SIZE = (960, 720)
+
+
+def _fpv_size(value: str) -> tuple[int, int]:
+    """Parse TELLO_SIM_FPV_SIZE; a malformed value falls back to the default."""
+    try:
+        width, height = (int(v) for v in value.lower().split("x"))
+        if width <= 0 or height <= 0:
+            raise ValueError
+        return width, height
+    except ValueError:
+        logger.warning("TELLO_SIM_FPV_SIZE=%r is not WIDTHxHEIGHT; using %dx%d",
+                       value, *FPV_DEFAULT_SIZE)
+        return FPV_DEFAULT_SIZE
+
+
+FPV_WIDTH, FPV_HEIGHT = _fpv_size(os.environ.get("TELLO_SIM_FPV_SIZE", "960x720"))
+FPV_FPS = float(os.environ.get("TELLO_SIM_FPV_FPS", "30"))
+# Where the FPV camera sits relative to the drone (world units, yaw-aligned): on the nose,
+# so the drone's own model stays out of the picture.
+FPV_CAMERA_OFFSET = (0, 0.5, 3.2)
+# Streamed frames can also go to a shared-memory ring (see frame_ring.py) for
+# vision code on the same machine. Off by default: it maps about 11 MB at the
+# default FPV size and copies every streamed frame. TELLO_SIM_FRAME_RING_SLOTS=4
+# turns it on with that many slots.
+FRAME_RING_SLOTS = int(os.environ.get("TELLO_SIM_FRAME_RING_SLOTS", "0"))
+# While streaming, frames are only rendered and read back when someone consumes
+# them, and for this many seconds after the last request (frame_demand.py).
+# Override with TELLO_SIM_FRAME_KEEP_WARM.
+FRAME_KEEP_WARM_S = float(os.environ.get("TELLO_SIM_FRAME_KEEP_WARM", "2.0"))
+# get_latest_depth keeps depth readback on for FRAME_KEEP_WARM_S after each
+# request. The FPV lens' depth range, in metres.
+FPV_DEPTH_RANGE_M = (FPV_NEAR / UNITS_PER_CM / 100, FPV_FAR / UNITS_PER_CM / 100)
+# Photos taken with capture_frame are also saved to this directory, if set
+# (the save_captures command changes it at runtime).
+PHOTO_DIR = os.environ.get("TELLO_SIM_PHOTO_DIR", "")
+
 # On-screen telemetry overlay: battery bar, altitude/orientation/speed readouts, and the
-# pulsing takeoff-status dots. Off by default — it clutters the view and, because the FPV
-# path grabs the whole framebuffer, it gets burned into captured photos and video.
+# pulsing takeoff-status dots. Off by default — it clutters the view. The offscreen FPV
+# stream never shows it; only the window-readback fallback would burn it into frames.
 # Set to True to restore it.
 SHOW_HUD = False
 
@@ -116,7 +179,16 @@ class UrsinaAdapter():
         window.fps_counter.enabled = False  
         window.render_mode = 'default'  
         self.command_queue = []
+        # Completion of motion commands, for blocking "ok"/"error" replies.
+        # _current_motion_id is the id of the command_queue entry now running.
+        self.motions = MotionTracker()
+        # Commands from the server threads, run on this (the render) thread
+        # at the top of each tick.
+        self.mailbox = CommandMailbox(MAILBOX_MAX_COMMANDS_PER_FRAME,
+                                      MAILBOX_MAX_MS_PER_FRAME,
+                                      fail_motion=self.motions.finish)
         self.is_moving = False
+        self._current_motion_id = None
         # The scheduled Sequence returned by the latest
         # invoke(self._motion_complete_callback, ...). Commands are serialized
         # through command_queue/is_moving, so at most one is ever pending. Held
@@ -150,12 +222,30 @@ class UrsinaAdapter():
         self.stream_active = False
         self.is_connected = False
         self.frame_count = 0
-        self.latest_frame = None
+        # The newest streamed frame and its sequence number, replaced as one
+        # object so readers on server threads never see a mismatched pair.
+        self.latest_capture: CapturedFrame | None = None
+        self._frame_seq = 0
+        # Raw readbacks and converted images are drawn from one pool of
+        # reusable buffers instead of being allocated per frame.
+        self.frame_pool = FramePool()
+        self._frame_grabber = FrameGrabber(self.frame_pool)
+        self.frame_demand = FrameDemand(FRAME_KEEP_WARM_S)
+        # Set between record_start and record_stop; fed every captured frame.
+        self.recorder: VideoRecorder | None = None
+        # capture_frame photos; _photo_requests are taken from the next frame.
+        self.photos = PhotoBuffer()
+        self.photos.set_directory(PHOTO_DIR or None)
+        self._photo_requests = 0
+        # monotonic() of the last get_latest_depth; see request_depth().
+        self._depth_requested = float("-inf")
         self.last_altitude = self.altitude
         # Vertical speed (km/h) sampled once per tick by _sample_vertical_speed().
         # get_speed_y() only reads it, so the reading no longer depends on how
         # often the API is polled or on whether the HUD is drawn.
         self._vertical_speed_kmh = 0
+        # Downward ToF reading (cm), sampled once per tick by _sample_tof().
+        self._tof_cm = TOF_MIN_CM
         self.bezier_path = []
         self.bezier_duration = 0
         self.bezier_start_time = None
@@ -384,6 +474,29 @@ class UrsinaAdapter():
         self._default_camera_local_position = Vec3(camera.position)
         self._default_camera_target_z = self.drone_camera.target_z
         self._default_camera_fov = camera.fov
+
+        # The stream's own camera, following the drone's position and yaw.
+        # Without an offscreen buffer (fpv_camera None), streaming falls back
+        # to reading back the window with streamon switching it to first
+        # person.
+        self.fpv_mount = Entity()
+        try:
+            self.fpv_camera: FpvCamera | None = FpvCamera(
+                self.app, self.fpv_mount, FPV_WIDTH, FPV_HEIGHT, FPV_FPS, clear_color=window.color,
+                pool=self.frame_pool)
+            self.fpv_camera.camera.setPos(*FPV_CAMERA_OFFSET)
+        except Exception as e:
+            print(f"[FPV] Offscreen camera unavailable ({e}); streaming will capture the window.")
+            self.fpv_camera = None
+        self.frame_ring: FrameRingWriter | None = None
+        if FRAME_RING_SLOTS > 0:
+            try:
+                self.frame_ring = FrameRingWriter(FPV_WIDTH, FPV_HEIGHT, FRAME_RING_SLOTS)
+            except OSError as e:
+                print(f"[FPV] Shared-memory frame ring unavailable: {e}")
+        # The CaptureRecord of the tick whose render the next capture hands
+        # back; captures arrive a tick after they are rendered.
+        self._render_record: CaptureRecord | None = None
         self.is_flying = False
 
         self.velocity: Vec3 = Vec3(0, 0, 0)
@@ -411,6 +524,11 @@ class UrsinaAdapter():
             self.create_meters()
         self.create_gate_editor()
 
+        # The state as of the last tick, replaced whole by each tick; see
+        # state_snapshot.py. Server and telemetry threads read only this.
+        self._tick_count = 0
+        self.state_snapshot: StateSnapshot = take_snapshot(self, self._tick_count)
+
     # ------------------------------------------------------------------ gates ---
     def _gates_config_path(self) -> str:
         return os.path.join(os.path.dirname(__file__), 'gates.json')
@@ -541,9 +659,14 @@ class UrsinaAdapter():
 
         self._sync_editor_to_gate()
 
+    @property
+    def captures_window(self) -> bool:
+        """True while the stream is a readback of the window itself (the fallback)."""
+        return self.stream_active and self.fpv_camera is None
+
     def toggle_gate_editor(self) -> None:
         """Show/hide the gate editor panel. Bound to the GATE_EDITOR_KEY press."""
-        if self.stream_active and not self.gate_editor_panel.enabled:
+        if self.captures_window and not self.gate_editor_panel.enabled:
             # Opening it now would burn the panel into the captured frames.
             print("[Gate Editor] Not available while streaming. Run streamoff first.")
             return
@@ -557,8 +680,8 @@ class UrsinaAdapter():
             print("[Gate Editor] Closed.")
 
     def _update_editor_visibility(self) -> None:
-        """Hide the gate editor while streaming so it isn't captured in the video."""
-        if self.stream_active and self.gate_editor_panel.enabled:
+        """Hide the gate editor while the window is streamed so it isn't captured."""
+        if self.captures_window and self.gate_editor_panel.enabled:
             self.gate_editor_panel.enabled = False
 
     def _select_next_gate(self) -> None:
@@ -951,6 +1074,25 @@ class UrsinaAdapter():
     def get_speed_y(self) -> int:
         return self._vertical_speed_kmh
 
+    def _sample_tof(self) -> None:
+        """Advance the ToF reading. Called once per tick.
+
+        A ray cast straight down against the scene's colliders; the ground
+        has none, so it is the floor clamp GROUND_Y when the ray hits nothing
+        nearer. One ray a tick however often get_distance_tof is polled.
+        """
+        max_units = TOF_MAX_CM * UNITS_PER_CM
+        distance = self.drone.y - GROUND_Y
+        hit_info = raycast(self.drone.position, Vec3(0, -1, 0), distance=max_units,
+                           ignore=(self.drone,))  # type: ignore
+        if hit_info.hit:
+            distance = min(distance, hit_info.distance)
+        tof_cm = round(distance / UNITS_PER_CM)
+        self._tof_cm = TOF_OUT_OF_RANGE_CM if tof_cm > TOF_MAX_CM else max(tof_cm, TOF_MIN_CM)
+
+    def get_distance_tof(self) -> int:
+        return self._tof_cm
+
     def get_speed_z(self) -> int:
         return int(self.measured_velocity.z * 0.1 * 3.6)
 
@@ -966,7 +1108,7 @@ class UrsinaAdapter():
         """Return the current acceleration in the Z direction."""
         return self.calculated_acceleration.z * 100
     
-    def rotate_smooth(self, angle):
+    def rotate_smooth(self, angle, motion_id: int | None = None):
         def command() -> None:
             target_yaw = self.drone.rotation_y + angle
             duration = max(0.5, abs(angle) / 90)
@@ -974,11 +1116,13 @@ class UrsinaAdapter():
             print(f"Tello Simulator: Smoothly rotating {angle} degrees over {duration:.2f} seconds.")
             self._motion_complete_seq = invoke(self._motion_complete_callback, delay=duration)
 
-        self.enqueue_command(command)
+        self.enqueue_command(command, motion_id=motion_id)
 
-    def change_altitude_smooth(self, direction: str, distance: float) -> None:
+    def change_altitude_smooth(self, direction: str, distance: float,
+                               motion_id: int | None = None) -> None:
         if direction not in ("up", "down"):
             print(f"Invalid altitude direction: {direction}")
+            self.motions.finish(motion_id, f"error invalid altitude direction '{direction}'")
             return
 
         def command() -> None:
@@ -994,7 +1138,7 @@ class UrsinaAdapter():
             self.altitude = target_altitude
             self._motion_complete_seq = invoke(self._motion_complete_callback, delay=duration)
 
-        self.enqueue_command(command)
+        self.enqueue_command(command, motion_id=motion_id)
     
     def _check_battery_warnings(self) -> str:
         """Battery warnings and the automatic emergency landing at 0%.
@@ -1122,8 +1266,8 @@ class UrsinaAdapter():
         if self.show_hud:
             self.update_meters(warning)
 
-    def enqueue_command(self, command_func, *args, **kwargs):
-        self.command_queue.append((command_func, args, kwargs))
+    def enqueue_command(self, command_func, *args, motion_id: int | None = None, **kwargs):
+        self.command_queue.append((command_func, args, kwargs, motion_id))
         if not self.is_moving:
             self._execute_next_command()
     
@@ -1131,10 +1275,11 @@ class UrsinaAdapter():
         if not self.command_queue:
             return
         self.is_moving = True
-        command_func, args, kwargs = self.command_queue.pop(0)
+        command_func, args, kwargs, self._current_motion_id = self.command_queue.pop(0)
         command_func(*args, **kwargs)
         
-    def move(self, direction: Literal["forward", "backward", "left", "right"], distance: float) -> None:
+    def move(self, direction: Literal["forward", "backward", "left", "right"], distance: float,
+             motion_id: int | None = None) -> None:
         def command() -> None:
             if direction == "forward":
                 dir_vec = self.drone.forward
@@ -1169,7 +1314,7 @@ class UrsinaAdapter():
             invoke(self._reset_tilt, delay=duration * 0.7)
             self._motion_complete_seq = invoke(self._motion_complete_callback, delay=duration)
 
-        self.enqueue_command(command)
+        self.enqueue_command(command, motion_id=motion_id)
 
     def _reset_tilt(self) -> None:
         self.pitch_angle = 0
@@ -1263,7 +1408,8 @@ class UrsinaAdapter():
             sim_z
         )
         
-    def go_xyz_speed(self, x: float, y: float, z: float, speed_ms: float) -> None:
+    def go_xyz_speed(self, x: float, y: float, z: float, speed_ms: float,
+                     motion_id: int | None = None) -> None:
         """
         Moves in a linear path to the specified coordinates at the given speed.
         """
@@ -1285,7 +1431,7 @@ class UrsinaAdapter():
             self.drone.animate('rotation_y', target_yaw, duration=duration, curve=curve.in_out_cubic)
             self._motion_complete_seq = invoke(self._motion_complete_callback, delay=duration)
 
-        self.enqueue_command(command)
+        self.enqueue_command(command, motion_id=motion_id)
 
     # TODO: Is this Radians or Degrees? We should put a suffix in the argument name
     
@@ -1305,10 +1451,11 @@ class UrsinaAdapter():
         self.bezier_start_time = time()
         self.bezier_mode = True
     
-    def curve_xyz_speed(self, x1: float, y1: float, z1: float, x2: float, y2: float, z2: float, speed: float) -> None:
+    def curve_xyz_speed(self, x1: float, y1: float, z1: float, x2: float, y2: float, z2: float, speed: float,
+                        motion_id: int | None = None) -> None:
         def command() -> None:
             self.start_bezier_motion(x1, y1, z1, x2, y2, z2, speed)
-        self.enqueue_command(command)
+        self.enqueue_command(command, motion_id=motion_id)
                 
     def takeoff(self) -> None:
         if not self.is_flying:
@@ -1330,6 +1477,8 @@ class UrsinaAdapter():
         # This fired, so the sequence has run — drop the stale reference.
         self._motion_complete_seq = None
         self.is_moving = False
+        self.motions.finish(self._current_motion_id)
+        self._current_motion_id = None
         self._execute_next_command()
         
     def _deferred_land_callback(self) -> None:
@@ -1375,6 +1524,10 @@ class UrsinaAdapter():
             print("Already on ground")
         
     def emergency(self) -> None:
+        # Moves and takeoffs still waiting in the mailbox were sent before
+        # the emergency; they must not start once it has stopped the drone.
+        for motion_id in self.mailbox.cancel_flight():
+            self.motions.finish(motion_id, "error emergency")
         if self.is_flying:
             print(" Emergency! Stopping all motors and descending immediately!")
             # Cancel any in-flight animated move (animate_position runs on
@@ -1400,6 +1553,12 @@ class UrsinaAdapter():
             if self._deferred_land_seq is not None:
                 self._deferred_land_seq.kill()
                 self._deferred_land_seq = None
+            # Anyone blocked on the running or queued moves gets an error
+            # reply instead of waiting for a completion that will never come.
+            self.motions.finish(self._current_motion_id, "error emergency")
+            self._current_motion_id = None
+            for *_, motion_id in self.command_queue:
+                self.motions.finish(motion_id, "error emergency")
             self.command_queue.clear()
             self.is_moving = False
             self.bezier_mode = False
@@ -1419,26 +1578,95 @@ class UrsinaAdapter():
         else:
             print("Drone is already on the ground")
         
+    @property
+    def latest_frame(self) -> MatLike | None:
+        """A copy of the newest streamed frame (BGR), or None before the first
+        one. A copy, as the capture's buffer goes back to the frame pool
+        once the capture is replaced."""
+        capture = self.latest_capture
+        return None if capture is None else capture.image.copy()
+
     def get_latest_frame(self) -> MatLike:
         """Return the latest frame directly"""
-        if self.latest_frame is None:
+        capture = self.latest_capture
+        if capture is None:
             raise Exception("No latest frame available.")
-        return cv2.cvtColor(self.latest_frame, cv2.COLOR_BGR2RGB)
+        return cv2.cvtColor(capture.image, cv2.COLOR_BGR2RGB)
 
           
+    def _capture_record(self) -> CaptureRecord:
+        """Capture times and the full drone state, for the frame rendered this tick.
+
+        The state is the last tick's snapshot: this tick's physics has not
+        run yet when the frame is set up.
+        """
+        return CaptureRecord(monotonic(), time(), self.state_snapshot.state())
+
+    def start_recording(self, path: str, fps: float | None = None) -> None:
+        """Record the FPV stream to `path` until stop_recording().
+
+        Raises ValueError if already recording, the stream is off or the
+        directory does not exist. Recording keeps frame capture running,
+        like a connected viewer.
+        """
+        if self.recorder is not None:
+            raise ValueError(f"already recording to {self.recorder.path}")
+        if not self.stream_active:
+            raise ValueError("stream is off; run streamon first")
+        self.recorder = VideoRecorder(path, fps or FPV_FPS)
+        self.frame_demand.viewer_started()
+        print(f"[Record] Recording the FPV stream to {path}")
+
+    def stop_recording(self, lock=None) -> dict:
+        """Finish the recording; returns its stats. Raises ValueError if none.
+
+        `lock`, if given, is held while the recorder is detached, but not
+        while its encoder finishes the file, which can take seconds.
+        """
+        with lock or nullcontext():
+            recorder, self.recorder = self.recorder, None
+            if recorder is None:
+                raise ValueError("not recording")
+            self.frame_demand.viewer_stopped()
+        stats = recorder.stop()
+        print(f"[Record] Saved {stats['written']} frames to {stats['path']} "
+              f"({stats['dropped']} dropped)")
+        return stats
+
+    def request_depth(self) -> bool:
+        """Read depth back with the FPV frames for the next FRAME_KEEP_WARM_S.
+
+        Returns False if there is no offscreen FPV camera to read it from.
+        Like a frame request, this also wakes idle capture.
+        """
+        if self.fpv_camera is None:
+            return False
+        self._depth_requested = monotonic()
+        self.frame_demand.request()
+        return True
+
+    def close_frame_ring(self) -> None:
+        """Remove the shared-memory frame ring (simulator shutdown)."""
+        ring, self.frame_ring = self.frame_ring, None
+        if ring is not None:
+            ring.close()
+
     def capture_frame(self):
-        """Capture the latest FPV frame. Optionally save to disk if save_frames_to_disk is True."""
+        """Take a photo: keep the next streamed frame in self.photos.
+
+        The frame rendered after this call is the photo, with its capture
+        record; get_captures returns it, and it is saved to disk if the
+        photo buffer has a directory.
+        """
         if not self.stream_active:
             logger.debug("[Capture] Stream not active. Cannot capture frame.")
             return
 
-        if self.latest_frame is None:
-            logger.debug("[Capture] No latest frame available.")
-            return
-
-        # Always increment frame count for tracking
+        # Wakes demand-driven capture if it is idle.
+        self.frame_demand.request()
+        self._photo_requests += 1
         self.frame_count += 1
-        logger.debug("[Capture] Frame %d captured (memory only)", self.frame_count)
+        logger.debug("[Capture] Photo %d requested", self.frame_count)
         
     def set_speed(self, x: int):
         """Set drone speed by adjusting acceleration force.
@@ -1469,11 +1697,18 @@ class UrsinaAdapter():
         self.last_tick_time = time()
         try:
             self._tick_impl()
+            self._tick_count += 1
+            self.state_snapshot = take_snapshot(self, self._tick_count)
         except Exception:
             print("[Sim] Exception in update tick:")
             traceback.print_exc()
 
     def _tick_impl(self) -> None:
+        # Run commands posted by the server threads first, so this frame's
+        # physics and animation see them. Before the is_connected check:
+        # streamon/land and friends must still apply while disconnected.
+        self.mailbox.drain()
+
         # Spin the propeller blur discs while flying; hide them when stationary
         # (the model's own molded blades show instead). Runs before the
         # is_connected check so the discs still hide after end()/disconnect.
@@ -1495,37 +1730,68 @@ class UrsinaAdapter():
         # still descending on the landing animation after is_flying clears, and
         # a grounded drone has to read 0 rather than hold the last airborne value.
         self._sample_vertical_speed()
+        self._sample_tof()
 
         if self.show_hud:
             self.update_takeoff_indicator()
 
-        # Keep the gate editor hidden while streaming (the FPV grabs the whole frame).
+        # Keep the gate editor hidden while the window itself is streamed.
         self._update_editor_visibility()
 
-        if self.stream_active:
-            width, height = int(window.size[0]), int(window.size[1])
+        ring_read = self.frame_ring.last_read if self.frame_ring is not None else float("-inf")
+        if self.stream_active and self.frame_demand.wanted(monotonic(), ring_read):
             try:
-                pixel_data = glReadPixels(0, 0, width, height, GL_RGBA, GL_UNSIGNED_BYTE)
-                if pixel_data:
-                    # glReadPixels returns rows bottom-to-top (OpenGL's origin is
-                    # bottom-left), so the framebuffer has to be flipped vertically.
-                    # Wrap the raw bytes as an array (a zero-copy view) rather than
-                    # routing through PIL: Image.frombytes + transpose + np.array
-                    # allocated three extra full-framebuffer copies on every
-                    # streamed frame. cvtColor and cv2.flip each return one fresh
-                    # array, so this path makes two allocations instead of four and
-                    # drops the (undeclared, transitive) Pillow dependency.
-                    arr = np.frombuffer(pixel_data, np.uint8).reshape(height, width, 4)  # type: ignore
-                    frame = cv2.cvtColor(arr, cv2.COLOR_RGBA2BGR)
-                    frame = cv2.flip(frame, 0)
-
-                    # cv2.flip returns a freshly allocated array that nothing else
-                    # mutates (readers re-encode/convert into new arrays), so store
-                    # it directly. An extra .copy() here would duplicate the whole
-                    # framebuffer on every streamed frame.
-                    self.latest_frame = frame
+                # Either way the raw, bottom-up pixels are converted (cvtColor
+                # + flip) only when a consumer first reads
+                # CapturedFrame.image, on that consumer's thread.
+                record, self._render_record = self._render_record, self._capture_record()
+                raw_depth = None
+                if self.fpv_camera is not None:
+                    self.fpv_mount.position = self.drone.position
+                    self.fpv_mount.rotation = (0, self.drone.rotation_y, 0)
+                    self.fpv_camera.set_depth(
+                        monotonic() - self._depth_requested < FRAME_KEEP_WARM_S)
+                    raw = self.fpv_camera.poll(time())
+                    raw_depth = self.fpv_camera.depth
+                    conversion, layout = cv2.COLOR_BGRA2BGR, LAYOUT_BGRA
+                else:
+                    # Asynchronous PBO readback of the window: returns the
+                    # previous frame without waiting for the GPU.
+                    raw = self._frame_grabber.grab(int(window.size[0]), int(window.size[1]))
+                    conversion, layout = cv2.COLOR_RGBA2BGR, LAYOUT_RGBA
+                if raw is not None:
+                    self._frame_seq += 1
+                    capture = CapturedFrame(self._frame_seq, raw=raw, conversion=conversion,
+                                            pool=self.frame_pool, record=record,
+                                            raw_depth=raw_depth,
+                                            depth_range=FPV_DEPTH_RANGE_M)
+                    if self.frame_ring is not None and record is not None:
+                        # Before publishing: a consumer converting the frame
+                        # hands `raw` back to the pool.
+                        state = record.state
+                        pose = Pose(state["x"], state["y"], state["z"], state["yaw"],
+                                    state["pitch"], state["roll"])
+                        self.frame_ring.write(self._frame_seq, raw, layout, record.mono_time,
+                                              record.wall_time, pose)
+                    self.latest_capture = capture
+                    self.frame_demand.published(self._frame_seq)
+                    recorder = self.recorder
+                    if recorder is not None:
+                        recorder.offer(self.latest_capture)
+                    while self._photo_requests:
+                        self._photo_requests -= 1
+                        self.photos.add(self.latest_capture)
             except Exception as e:
                 print(f"[FPV] OpenGL read error: {e}")
+        elif self.fpv_camera is not None:
+            # Stream off, or nobody watching: render nothing.
+            self._render_record = None
+            self.fpv_camera.stop()
+        else:
+            self._render_record = None
+            # Stream off or idle: free the PBOs, so the next capture starts
+            # clean instead of handing out a frame from before the pause.
+            self._frame_grabber.release()
         
         if not self.is_flying:
             self.camera_holder.position = self.drone.position + self.grounded_camera_offset
@@ -1557,9 +1823,6 @@ class UrsinaAdapter():
             if t >= 1.0:
                 self.bezier_mode = False
                 self._motion_complete_callback()
-        
-        if self.stream_active:
-            self.capture_frame()
 
         if not self.is_moving:
             self.pitch_angle = 0  # Reset tilt when no move is in progress
@@ -0,0 +1,135 @@
+"""Server-side recording of the FPV stream to a video file.
+
+Recording used to happen in the client (examples/6_record_video.py): pull
+PNG frames over TCP, write each one to disk as a JPEG, then read them all
+back to build the video. The simulator now records itself: record_start
+hands every captured frame to a VideoRecorder, whose own thread converts it
+and feeds it to a cv2.VideoWriter, and record_stop closes the file.
+
+The render thread only puts the CapturedFrame (a reference, no pixels
+copied) on a bounded queue. If the encoder falls behind and the queue is
+full, the frame is dropped and counted; the render loop never waits for the
+encoder. Frames are placed in the video by their capture time, repeating
+a frame over any gap after it (a drop, a render hiccup) and skipping frames
+that arrive faster than the video's FPS, so the video plays back in real
+time.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+
+import cv2
+
+from frame_cache import CapturedFrame
+
+logger = logging.getLogger(__name__)
+
+# Frames waiting for the encoder before new ones are dropped: about a
+# second of 30 FPS video.
+RECORD_QUEUE_FRAMES = 30
+
+# cv2.VideoWriter fourcc by file extension; anything else gets mp4v.
+FOURCC_BY_EXTENSION = {
+    ".avi": "MJPG",
+    ".mkv": "XVID",
+    ".mp4": "mp4v",
+}
+
+
+class VideoRecorder:
+    """Writes offered frames to `path` at `fps` from a background thread."""
+
+    def __init__(self, path: str, fps: float, queue_frames: int = RECORD_QUEUE_FRAMES):
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            raise ValueError(f"no such directory: {directory}")
+        self.path = path
+        self.fps = fps
+        self.frames_offered = 0
+        self.frames_dropped = 0
+        self.frames_written = 0
+        self.error: str | None = None
+        self._queue: queue.Queue[CapturedFrame | None] = queue.Queue(queue_frames)
+        self._writer: cv2.VideoWriter | None = None
+        self._size: tuple[int, int] | None = None
+        self._start_time: float | None = None
+        self._thread = threading.Thread(target=self._run, name="video-recorder", daemon=True)
+        self._thread.start()
+
+    def offer(self, capture: CapturedFrame) -> None:
+        """Queue a frame for encoding, or drop it if the encoder is behind.
+
+        Called from the render thread; never blocks.
+        """
+        self.frames_offered += 1
+        try:
+            self._queue.put_nowait(capture)
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def stop(self, timeout: float = 10.0) -> dict:
+        """Encode what is queued, close the file and return the stats."""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        return self.stats()
+
+    def stats(self) -> dict:
+        stats = {
+            "path": self.path,
+            "fps": self.fps,
+            "offered": self.frames_offered,
+            "dropped": self.frames_dropped,
+            "written": self.frames_written,
+        }
+        if self.error:
+            stats["error"] = self.error
+        return stats
+
+    def _run(self) -> None:
+        try:
+            while True:
+                capture = self._queue.get()
+                if capture is None:
+                    break
+                if self.error is None:
+                    self._write(capture)
+        except Exception as e:
+            logger.exception("[Record] Encoder failed")
+            self.error = str(e)
+        finally:
+            if self._writer is not None:
+                self._writer.release()
+
+    def _write(self, capture: CapturedFrame) -> None:
+        # Place the frame by its capture time: it fills the video up to its
+        # own slot, covering frames dropped or never rendered before it.
+        copies = 1
+        if capture.record is not None:
+            if self._start_time is None:
+                self._start_time = capture.record.mono_time
+            due = int((capture.record.mono_time - self._start_time) * self.fps) + 1
+            copies = due - self.frames_written
+            if copies <= 0:
+                return  # captured faster than the video's FPS
+        image = capture.image
+        if self._writer is None:
+            height, width = image.shape[:2]
+            extension = os.path.splitext(self.path)[1].lower()
+            fourcc = cv2.VideoWriter_fourcc(*FOURCC_BY_EXTENSION.get(extension, "mp4v"))  # type: ignore
+            self._writer = cv2.VideoWriter(self.path, fourcc, self.fps, (width, height))
+            if not self._writer.isOpened():
+                self.error = f"cannot open {self.path} for writing"
+                return
+            self._size = (width, height)
+        if (image.shape[1], image.shape[0]) != self._size:
+            # The window-readback fallback changes size with the window.
+            image = cv2.resize(image, self._size)
+        for _ in range(copies):
+            self._writer.write(image)
+        self.frames_written += copies
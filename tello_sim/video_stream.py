@@ -0,0 +1,160 @@
+"""TCP push stream of FPV frames.
+
+Pulling frames with get_latest_frame costs a connection, a request and a
+reply per frame. A client that wants the video instead connects once to
+VIDEO_PORT (11111, the real Tello's video port) and sends one line naming
+the codec, in get_latest_frame's syntax:
+
+    jpeg 80\\n          (or "raw\\n", "png 1\\n"; an empty line means png)
+
+From then on the simulator pushes every new frame, paced at no more than
+STREAM_FPS, while the stream is on (streamon). Each message is a 4-byte
+big-endian length followed by a frame_cache.frame_reply: 2-byte header
+length, JSON header ({"seq", "codec", ...}), encoded frame. A client that
+falls behind skips to the newest frame instead of queueing old ones.
+Frames are encoded through the FrameCache shared with the command server,
+so any number of viewers and pollers cost one encode per frame and codec.
+"""
+from __future__ import annotations
+
+import logging
+import socket
+import threading
+from time import monotonic, sleep
+
+from command_registry import CommandError, FrameRequest, parse_frame_request
+from frame_cache import FrameCache, frame_header, frame_reply
+
+logger = logging.getLogger(__name__)
+
+VIDEO_PORT = 11111
+STREAM_FPS = 30
+# Viewers served at once; each one holds a thread for as long as it watches.
+MAX_VIEWERS = 8
+
+
+class VideoStreamer:
+    """Serves the FPV push stream on VIDEO_PORT; one sender thread per viewer."""
+
+    def __init__(self, ursina_adapter, frame_cache: FrameCache, port: int = VIDEO_PORT,
+                 fps: float = STREAM_FPS):
+        self._ursina_adapter = ursina_adapter
+        self._frame_cache = frame_cache
+        self._port = port
+        self._interval = 1.0 / fps
+        self._viewer_slots = threading.BoundedSemaphore(MAX_VIEWERS)
+        # Same plain-bool stop flag as TelemetryPublisher: stop() closes the
+        # sockets, which is what actually wakes the threads.
+        self._running = False
+        self._socket = None
+        self._viewers: set[socket.socket] = set()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        if self._running:
+            logger.warning("[Video] Already streaming on port %s; ignoring duplicate start()",
+                           self._port)
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind(("localhost", self._port))
+            sock.listen(MAX_VIEWERS)
+        except OSError:
+            sock.close()
+            raise
+        self._socket = sock
+        self._running = True
+        threading.Thread(target=self._accept_loop, name="video-accept", daemon=True).start()
+        print(f"[Video] Streaming FPV frames on TCP port {self._port} while the stream is on")
+
+    def stop(self) -> None:
+        self._running = False
+        if self._socket:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+        with self._lock:
+            viewers = list(self._viewers)
+        for conn in viewers:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _accept_loop(self) -> None:
+        while self._running:
+            self._viewer_slots.acquire()
+            try:
+                conn, addr = self._socket.accept()
+            except OSError:
+                self._viewer_slots.release()
+                break  # socket closed during shutdown
+            threading.Thread(target=self._serve_viewer, args=(conn, addr),
+                             name=f"video-{addr[1]}", daemon=True).start()
+
+    def _serve_viewer(self, conn: socket.socket, addr) -> None:
+        with self._lock:
+            self._viewers.add(conn)
+        try:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            request = self._read_request(conn)
+            if request is None:
+                return
+            logger.info("[Video] Viewer %s connected (%s)", addr, request.codec)
+            # A connected viewer keeps capture running (frame_demand.py).
+            demand = self._ursina_adapter.frame_demand
+            demand.viewer_started()
+            try:
+                self._push_frames(conn, request)
+            finally:
+                demand.viewer_stopped()
+        except OSError as e:  # viewer went away
+            logger.debug("[Video] Viewer %s disconnected: %s", addr, e)
+        finally:
+            with self._lock:
+                self._viewers.discard(conn)
+            try:
+                conn.close()
+            except OSError:
+                pass
+            self._viewer_slots.release()
+
+    @staticmethod
+    def _read_request(conn: socket.socket) -> FrameRequest | None:
+        """Read the codec line. A bad one is answered with an error header."""
+        conn.settimeout(10.0)
+        line = b""
+        while not line.endswith(b"\n"):
+            chunk = conn.recv(64)
+            if not chunk or len(line) > 256:
+                return None
+            line += chunk
+        conn.settimeout(None)
+        try:
+            (request,) = parse_frame_request(line.decode().split())
+        except CommandError as e:
+            message = frame_reply({"error": str(e)})
+            conn.sendall(len(message).to_bytes(4, byteorder='big') + message)
+            return None
+        # An empty line means the default codec; if_newer_than means nothing
+        # to a stream that only ever sends new frames.
+        return (request or FrameRequest())._replace(if_newer_than=None)
+
+    def _push_frames(self, conn: socket.socket, request: FrameRequest) -> None:
+        last_seq = None
+        next_due = monotonic()
+        while self._running:
+            delay = next_due - monotonic()
+            if delay > 0:
+                sleep(delay)
+            next_due = max(next_due + self._interval, monotonic())
+            capture = self._ursina_adapter.latest_capture
+            if (capture is None or capture.seq == last_seq
+                    or not self._ursina_adapter.stream_active):
+                continue
+            message = frame_reply(frame_header(capture, request.codec),
+                                  self._frame_cache.encoded(capture, request.codec, request.param))
+            conn.sendall(len(message).to_bytes(4, byteorder='big') + message)
+            last_seq = capture.seq
@@ -4,24 +4,165 @@ Every method here mirrors the real DJI Tello / djitellopy surface, so a
 script written against this client also runs against real hardware.
 
 Capabilities a real drone does not have — ground-truth position, the
-telemetry stream, motion-completion polling — deliberately live on
+telemetry stream, waiting on another script's moves — deliberately live on
 SimulatorClient in simulator_client.py instead.
 """
+import threading
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass
 
 import cv2
 import numpy as np
 
-from sim_connection import SimConnection
+from sim_connection import VIDEO_PORT, SimConnection, VideoStreamConnection, parse_frame_reply
+from tello_sim.frame_ring import FrameRingReader, RingFrame
 
 
 @dataclass
 class BackgroundFrameRead():
     frame: cv2.typing.MatLike
 
+
+def decode_frame(header: dict, payload) -> np.ndarray | None:
+    """Turn an extended get_latest_frame reply into an RGB image.
+
+    raw payloads are wrapped in place with np.frombuffer (no decoding); png
+    and jpeg go through cv2.imdecode. Returns None if the payload is bad.
+    """
+    if header.get("codec") == "raw":
+        try:
+            image = np.frombuffer(payload, np.dtype(header["dtype"])).reshape(header["shape"])
+        except (KeyError, TypeError, ValueError):
+            return None
+    else:
+        image = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+    # The simulator's frames are BGR; convert to RGB so they match the real
+    # Tello's djitellopy interface, which returns RGB. Consumers using
+    # OpenCV (cv2.imshow / imwrite / cvtColor to HSV) convert RGB->BGR
+    # themselves, exactly as they must for a real drone.
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+class BackgroundStreamRead(BackgroundFrameRead):
+    """A BackgroundFrameRead kept current by the simulator's push stream.
+
+    Like djitellopy's, a daemon thread receives frames as the simulator
+    sends them and `.frame` is always the newest one, so reading it costs
+    nothing. stop() ends the thread; `.stopped` tells whether it has been
+    stopped. If the stream drops (simulator restarted), the thread
+    reconnects until stopped. `.capture` is the frame's capture record
+    (times and drone state when it was rendered).
+    """
+
+    RECONNECT_DELAY_S = 0.5
+
+    def __init__(self, host='localhost', port=VIDEO_PORT, codec='png'):
+        super().__init__(frame=np.zeros([360, 640, 3], dtype=np.uint8))
+        self.seq = None
+        self.capture = None
+        self.stopped = False
+        self._stream = VideoStreamConnection(host, port, codec)
+        self._thread = threading.Thread(target=self._update, name="tello-video", daemon=True)
+
+    def start(self) -> "BackgroundStreamRead":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopped = True
+        self._stream.close()
+
+    def _update(self) -> None:
+        while not self.stopped:
+            try:
+                self._stream.open()
+                while not self.stopped:
+                    header, payload = self._stream.read_frame()
+                    image = decode_frame(header, payload)
+                    if image is not None:
+                        self.frame = image
+                        self.seq = header["seq"]
+                        self.capture = header.get("capture")
+            except ValueError as e:  # codec rejected: retrying cannot help
+                print(f"[Error] {e}")
+                self.stopped = True
+            except OSError:
+                if not self.stopped:
+                    time.sleep(self.RECONNECT_DELAY_S)
+            finally:
+                self._stream.close()
+
+
+class RingFrameRead(BackgroundFrameRead):
+    """A BackgroundFrameRead that reads `.frame` from the shared-memory ring.
+
+    Only for a client on the simulator's machine. Each `.frame` is the newest
+    frame as an RGB view into the simulator's memory: nothing is copied,
+    decoded or sent over a socket, and no thread is needed. The view is
+    overwritten a few frames later (see tello_sim/frame_ring.py), so copy
+    anything you keep. `.capture` has the frame's capture times and the
+    drone's pose.
+    """
+
+    def __init__(self, reader: FrameRingReader):
+        self._reader = reader
+        self._blank = np.zeros([360, 640, 3], dtype=np.uint8)
+        self.capture: RingFrame | None = None
+        self.stopped = False
+
+    @property
+    def frame(self) -> np.ndarray:
+        if not self.stopped:
+            latest = self._reader.latest(rgb=True)
+            if latest is not None:
+                self.capture = latest
+        return self._blank if self.capture is None else self.capture.image
+
+    def stop(self) -> None:
+        self.stopped = True
+        self.capture = None
+        self._reader.close()
+
+
 class TelloSimClient:
-    def __init__(self, host='localhost', port=9999):
-        self._conn = SimConnection(host, port)
+    def __init__(self, host='localhost', port=9999, persistent=False, wait_for_motion=False,
+                 frame_codec='png', video_stream=False, video_port=VIDEO_PORT, frame_ring=False):
+        # persistent=True keeps one session open for every command instead
+        # of a connection per call (see SimConnection).
+        # wait_for_motion=True makes move/rotate/go/curve return only once the
+        # move has finished, like djitellopy waiting for the drone's "ok".
+        self.wait_for_motion = wait_for_motion
+        # Commands collected inside `with tello.batch():`, else None.
+        self._batch = None
+        # The last decoded frame and its simulator sequence number, so
+        # get_frame_read() only transfers and decodes frames it has not seen,
+        # and the session it came over: a restarted simulator counts its
+        # frames from 0 again.
+        self._frame_seq = None
+        self._frame_session = 0
+        self._frame = None
+        # How get_frame_read() asks for frames: "png [level]", "jpeg [quality]"
+        # or "raw". PNG is lossless; JPEG is much cheaper to encode and
+        # decode; raw skips both at the price of the largest transfer.
+        self.frame_codec = frame_codec
+        # video_stream=True receives frames from the simulator's push stream
+        # in a background thread instead of pulling one per get_frame_read().
+        self.video_stream = video_stream
+        self.video_port = video_port
+        # frame_ring=True (or a ring name) maps the simulator's shared-memory
+        # frame ring instead: same machine only, but no transfer at all.
+        self.frame_ring = frame_ring
+        self._frame_reader = None
+        self._conn = SimConnection(host, port, persistent=persistent)
+        # wait_for_motion long-polls each move's outcome. In a session, a
+        # wait holds the session for as long as the move takes, so it gets a
+        # session of its own: emergency() and send_rc_control() must reach
+        # the simulator while a move is in progress, not after it.
+        self._waits = (SimConnection(host, port, persistent=True)
+                       if persistent and wait_for_motion else self._conn)
 
     @property
     def host(self):
@@ -32,24 +173,51 @@ class TelloSimClient:
         return self._conn.port
 
     def get_frame_read(self) -> BackgroundFrameRead:
-        """Get the latest frame directly from the simulator over TCP."""
+        """Get the latest frame directly from the simulator over TCP.
+
+        If the simulator has not rendered a new frame since the last call,
+        it answers "unchanged" without sending pixels, and the previous
+        frame is returned again.
+
+        With video_stream=True this instead returns one BackgroundStreamRead,
+        started on the first call, whose `.frame` the stream keeps current.
+        With frame_ring it returns one RingFrameRead, whose `.frame` is a view
+        of the newest frame in shared memory.
+        """
+        if self.frame_ring:
+            if self._frame_reader is None or self._frame_reader.stopped:
+                # FileNotFoundError if the simulator is not running or was
+                # started without TELLO_SIM_FRAME_RING_SLOTS.
+                reader = (FrameRingReader(self.frame_ring) if isinstance(self.frame_ring, str)
+                          else FrameRingReader())
+                self._frame_reader = RingFrameRead(reader)
+            return self._frame_reader
+        if self.video_stream:
+            if self._frame_reader is None or self._frame_reader.stopped:
+                self._frame_reader = BackgroundStreamRead(
+                    self.host, self.video_port, self.frame_codec).start()
+            return self._frame_reader
         blank = BackgroundFrameRead(frame=np.zeros([360, 640, 3], dtype=np.uint8))
-        frame_data = self._conn.request_framed('get_latest_frame')
+        command = f'get_latest_frame {self.frame_codec}'
+        if self._frame_session != self._conn.sessions_opened:
+            self._frame_seq = None
+        if self._frame_seq is not None:
+            command += f' if_newer_than {self._frame_seq}'
+        frame_data = self._conn.request_framed(command)
         if frame_data is None:
             return blank
+        header, payload = parse_frame_reply(frame_data)
+        if header.get("unchanged"):
+            return BackgroundFrameRead(frame=self._frame)
 
-        # Decode the frame from PNG bytes
-        nparr = np.frombuffer(frame_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        image = decode_frame(header, payload)
         if image is None:
             print("[Error] Failed to decode frame data")
             return blank
-
-        # imdecode yields BGR; convert to RGB so the simulator's frames match
-        # the real Tello's djitellopy interface, which returns RGB. Consumers
-        # using OpenCV (cv2.imshow / imwrite / cvtColor to HSV) convert
-        # RGB->BGR themselves, exactly as they must for a real drone.
-        return BackgroundFrameRead(frame=cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        self._frame = image
+        self._frame_seq = header["seq"]
+        self._frame_session = self._conn.sessions_opened
+        return BackgroundFrameRead(frame=self._frame)
 
     def get_battery(self):
         return self._conn.request('get_battery')
@@ -114,73 +282,145 @@ class TelloSimClient:
             raise ConnectionError(
                 f"Could not reach the Tello simulator at {self.host}:{self.port}. "
                 "Start it with: python tello_sim/run_sim.py")
+        # Possibly a new simulator: forget the last frame's seq.
+        self._frame_seq = None
         self._conn.send('connect')
 
     def takeoff(self):
-        self._conn.send('takeoff')
+        self._send('takeoff')
 
     def land(self):
-        self._conn.send('land')
+        self._send('land')
 
     def rotate_clockwise(self, degrees):
-        self._conn.send(f'rotate_cw {degrees}')
+        self._motion(f'rotate_cw {degrees}')
 
     def rotate_counter_clockwise(self, degrees):
-        self._conn.send(f'rotate_ccw {degrees}')
+        self._motion(f'rotate_ccw {degrees}')
 
     def streamon(self):
-        self._conn.send('streamon')
+        self._send('streamon')
 
     def streamoff(self):
-        self._conn.send('streamoff')
+        self._send('streamoff')
+        self._stop_frame_reader()
 
     def emergency(self):
         self._conn.send('emergency')
 
     def move_forward(self, distance):
-        self._conn.send(f'forward {distance}')
+        self._motion(f'forward {distance}')
 
     def move_back(self, distance):
-        self._conn.send(f'backward {distance}')
+        self._motion(f'backward {distance}')
 
     def move_left(self, distance):
-        self._conn.send(f'left {distance}')
+        self._motion(f'left {distance}')
 
     def move_right(self, distance):
-        self._conn.send(f'right {distance}')
+        self._motion(f'right {distance}')
 
     def move_up(self, distance):
-        self._conn.send(f'up {distance}')
+        self._motion(f'up {distance}')
 
     def move_down(self, distance):
-        self._conn.send(f'down {distance}')
+        self._motion(f'down {distance}')
 
     def flip_left(self):
-        self._conn.send('flip_left')
+        self._send('flip_left')
 
     def flip_right(self):
-        self._conn.send('flip_right')
+        self._send('flip_right')
 
     def flip_forward(self):
-        self._conn.send('flip_forward')
+        self._send('flip_forward')
 
     def flip_back(self):
-        self._conn.send('flip_back')
+        self._send('flip_back')
 
     def go_xyz_speed(self, x, y, z, speed):
-        self._conn.send(f"go {x} {y} {z} {speed}")
+        self._motion(f"go {x} {y} {z} {speed}")
 
     def curve_xyz_speed(self, x1, y1, z1, x2, y2, z2, speed):
-        self._conn.send(f"curve {x1} {y1} {z1} {x2} {y2} {z2} {speed}")
+        self._motion(f"curve {x1} {y1} {z1} {x2} {y2} {z2} {speed}")
 
     def set_speed(self, speed):
-        self._conn.send(f"set_speed {speed}")
+        self._send(f"set_speed {speed}")
 
     def send_rc_control(self, left_right_velocity, forward_backward_velocity, up_down_velocity, yaw_velocity):
         self._conn.send(f"send_rc_control {left_right_velocity} {forward_backward_velocity} {up_down_velocity} {yaw_velocity}")
 
     def end(self):
         self._conn.send('end')
+        self._conn.close()
+        self._stop_frame_reader()
 
     def initiate_throw_takeoff(self):
         self._conn.send('throw_takeoff')
+
+    @contextmanager
+    def batch(self):
+        """Send every flight command issued inside the block as one message.
+
+            with tello.batch() as results:
+                tello.takeoff()
+                for x, y, z in waypoints:
+                    tello.go_xyz_speed(x, y, z, 50)
+                tello.land()
+
+        The commands go out in a single round trip when the block exits, and
+        the simulator queues them all at once. `results` is then filled with
+        one reply per command (a motion id for each move; with
+        wait_for_motion the block then waits for the last move to finish).
+        Nothing is sent if the block raises. Getters,
+        emergency() and send_rc_control() are never batched: they take effect
+        immediately as usual.
+        """
+        results = []
+        self._batch = []
+        try:
+            yield results
+            commands = self._batch
+        finally:
+            self._batch = None
+        results.extend(self._conn.request_batch(commands))
+        for command, reply in zip(commands, results):
+            if reply.startswith("error"):
+                print(f"[Error] {command}: {reply}")
+        if self.wait_for_motion:
+            # Moves run in order, so the last one finishing means all did.
+            motion_ids = [reply for reply in results if reply.isdigit()]
+            if motion_ids:
+                reply = self._wait_motion(motion_ids[-1])
+                if reply.startswith("error"):
+                    print(f"[Error] batch: {reply}")
+
+    def _stop_frame_reader(self):
+        if self._frame_reader is not None:
+            self._frame_reader.stop()
+            self._frame_reader = None
+
+    def _send(self, command):
+        if self._batch is not None:
+            self._batch.append(command)
+        else:
+            self._conn.send(command)
+
+    def _motion(self, command):
+        """Send a motion command; with wait_for_motion, block until it is done.
+
+        The command is answered with its motion id at once, and then
+        `wait_motion <id>` long-polls for the outcome on the wait connection.
+        """
+        if self._batch is not None or not self.wait_for_motion:
+            self._send(command)
+            return
+        reply = self._conn.request(command)
+        if reply.isdigit():
+            reply = self._wait_motion(reply)
+        if reply.startswith("error"):
+            print(f"[Error] {command}: {reply}")
+
+    def _wait_motion(self, motion_id):
+        # Raises TimeoutError after sim_connection.MOTION_TIMEOUT_S.
+        return self._waits.wait_motion(motion_id)
@@ -0,0 +1,9 @@
+"""The simulator's modules import each other by bare name (run_sim.py runs
+from tello_sim/, which puts that directory on sys.path), and the clients
+live at the repo root; the tests see both the same way."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tello_sim"))
+sys.path.insert(0, ROOT)
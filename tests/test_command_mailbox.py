@@ -0,0 +1,144 @@
+import threading
+from collections import deque
+
+from command_mailbox import CommandMailbox
+from motion_tracker import MotionTracker
+
+
+def make_mailbox(max_commands=100):
+    return CommandMailbox(max_commands_per_frame=max_commands, max_ms_per_frame=1000.0)
+
+
+def test_drain_runs_in_post_order():
+    mailbox = make_mailbox()
+    ran = []
+    for label in ("a", "b", "c"):
+        mailbox.post(label, ran.append, label)
+    assert mailbox.drain() == 3
+    assert ran == ["a", "b", "c"]
+    assert mailbox.depth == 0
+
+
+def test_urgent_runs_first():
+    mailbox = make_mailbox()
+    ran = []
+    mailbox.post("a", ran.append, "a")
+    mailbox.post("b", ran.append, "b")
+    mailbox.post("stop", ran.append, "stop", urgent=True)
+    mailbox.drain()
+    assert ran == ["stop", "a", "b"]
+
+
+def test_each_urgent_entry_goes_to_the_front():
+    mailbox = make_mailbox()
+    ran = []
+    mailbox.post("a", ran.append, "a")
+    mailbox.post("emergency", ran.append, "emergency 1", urgent=True)
+    mailbox.post("b", ran.append, "b")
+    mailbox.post("emergency", ran.append, "emergency 2", urgent=True)
+    mailbox.drain()
+    assert ran == ["emergency 2", "emergency 1", "a", "b"]
+
+
+def test_drain_stops_at_command_limit():
+    mailbox = make_mailbox(max_commands=2)
+    ran = []
+    for label in ("a", "b", "c"):
+        mailbox.post(label, ran.append, label)
+    assert mailbox.drain() == 2
+    assert ran == ["a", "b"]
+    assert mailbox.drain() == 1
+    assert ran == ["a", "b", "c"]
+
+
+def test_raising_command_does_not_stop_the_drain():
+    mailbox = make_mailbox()
+    ran = []
+
+    def fail():
+        raise RuntimeError("boom")
+
+    mailbox.post("bad", fail)
+    mailbox.post("good", ran.append, "good")
+    assert mailbox.drain() == 2
+    assert ran == ["good"]
+
+
+def test_raising_command_fails_its_motions():
+    motions = MotionTracker()
+    mailbox = CommandMailbox(max_commands_per_frame=100, max_ms_per_frame=1000.0,
+                             fail_motion=motions.finish)
+    motion_id = motions.begin()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    mailbox.post("forward", fail, flight=True, motion_ids=(motion_id,))
+    mailbox.drain()
+    assert motions.wait(motion_id, 0).startswith("error")
+
+
+def test_no_move_runs_after_an_emergency():
+    """What UrsinaAdapter.emergency() does with the mailbox, end to end."""
+    mailbox = make_mailbox(max_commands=1)
+    motions = MotionTracker()
+    ran = []
+
+    def emergency():
+        for motion_id in mailbox.cancel_flight():
+            motions.finish(motion_id, "error emergency")
+        ran.append("emergency")
+
+    moves = [motions.begin() for _ in range(3)]
+    mailbox.post("takeoff", ran.append, "takeoff", flight=True)
+    for motion_id in moves[:2]:
+        mailbox.post("forward", ran.append, f"forward {motion_id}",
+                     flight=True, motion_ids=(motion_id,))
+    mailbox.post("streamon", ran.append, "streamon")
+    mailbox.post("batch", ran.append, "batch", flight=True, motion_ids=(moves[2],))
+    mailbox.post("emergency", emergency, urgent=True)
+
+    while mailbox.drain():
+        pass
+
+    assert ran == ["emergency", "streamon"]
+    assert [motions.wait(motion_id, 0) for motion_id in moves] == ["error emergency"] * 3
+
+
+def test_cancel_flight_keeps_commands_posted_after_it():
+    mailbox = make_mailbox()
+    ran = []
+    mailbox.post("forward", ran.append, "old", flight=True)
+    assert mailbox.cancel_flight() == []
+    mailbox.post("forward", ran.append, "new", flight=True)
+    mailbox.drain()
+    assert ran == ["new"]
+
+
+def test_urgent_post_during_cancel_flight_does_not_save_a_move():
+    mailbox = make_mailbox()
+    ran = []
+
+    class RacingDeque(deque):
+        """Lets an urgent post race the first pop of cancel_flight()."""
+        racer = None
+
+        def popleft(self):
+            racer, self.racer = self.racer, None
+            if racer is not None:
+                racer.start()
+                racer.join(0.1)  # blocked on the lock while cancel_flight runs
+            return super().popleft()
+
+    mailbox._queue = RacingDeque()
+    mailbox.post("streamon", ran.append, "streamon")
+    mailbox.post("forward", ran.append, "forward 1", flight=True)
+    mailbox.post("forward", ran.append, "forward 2", flight=True)
+    racer = threading.Thread(target=mailbox.post,
+                             args=("emergency", ran.append, "emergency"),
+                             kwargs={"urgent": True})
+    mailbox._queue.racer = racer
+    mailbox.cancel_flight()
+    racer.join()
+    mailbox.drain()
+    assert ran == ["emergency", "streamon"]
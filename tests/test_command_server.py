@@ -0,0 +1,101 @@
+import json
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from command_registry import CommandError, FrameRequest, parse_command
+from command_server import CommandServer
+from frame_cache import CapturedFrame
+
+
+class StandInDrone:
+    """Nothing a rejected batch may touch."""
+
+
+def serve_one(payload: bytes) -> bytes:
+    """Send `payload` on a one-shot connection; return everything it replied."""
+    server = CommandServer(StandInDrone())
+    ours, theirs = socket.socketpair()
+    def serve():
+        with theirs:
+            server._handle_connection(theirs)
+
+    worker = threading.Thread(target=serve)
+    worker.start()
+    ours.sendall(payload)
+    ours.shutdown(socket.SHUT_WR)
+    reply = b""
+    while chunk := ours.recv(4096):
+        reply += chunk
+    worker.join(5)
+    ours.close()
+    return reply
+
+
+@pytest.mark.parametrize("line", ["", "   ", "\t"])
+def test_blank_line_is_a_command_error(line):
+    with pytest.raises(CommandError, match="empty command"):
+        parse_command(line)
+
+
+def test_batch_with_blank_line_is_rejected():
+    reply = json.loads(serve_one(b"batch 2\nforward 10\n  \n"))
+    assert reply == ["error batch rejected", "error empty command"]
+
+
+class StreamingDrone:
+    """A streaming adapter whose latest frame is number 3."""
+
+    stream_active = True
+    latest_capture = CapturedFrame(3, image=np.zeros((2, 2, 3), np.uint8))
+
+    def __init__(self):
+        self.last_tick_time = time.time()
+
+        class Demand:
+            @staticmethod
+            def request():
+                return True
+
+        self.frame_demand = Demand()
+
+
+def frame_header_for(if_newer_than):
+    server = CommandServer(StreamingDrone())
+    reply = server._cmd_get_latest_frame(FrameRequest("raw", None, if_newer_than))
+    size = int.from_bytes(reply[:2], "big")
+    return json.loads(reply[2:2 + size])
+
+
+def test_frame_is_unchanged_only_for_its_own_seq():
+    assert frame_header_for(3) == {"seq": 3, "unchanged": True}
+    assert "unchanged" not in frame_header_for(2)
+
+
+def test_seq_from_before_a_restart_gets_the_frame():
+    header = frame_header_for(500)
+    assert header["seq"] == 3 and "unchanged" not in header
+
+
+@pytest.mark.parametrize("line, args", [
+    ("record_start /tmp/my flights/a.mp4", ("/tmp/my flights/a.mp4", None)),
+    ("record_start fps=15 /tmp/my  flight.mp4", ("/tmp/my  flight.mp4", 15.0)),
+    ("save_captures /tmp/my photos", ("/tmp/my photos",)),
+])
+def test_paths_take_the_rest_of_the_line(line, args):
+    assert parse_command(line)[1] == args
+
+
+@pytest.mark.parametrize("line", ["record_start", "record_start fps=15",
+                                  "record_start fps=500 /tmp/a.mp4", "save_captures"])
+def test_bad_path_commands(line):
+    with pytest.raises(CommandError):
+        parse_command(line)
+
+
+def test_record_stop_runs_outside_the_state_lock():
+    # Finishing the file joins the encoder; rc control must not wait for it.
+    assert not parse_command("record_stop")[0].locked
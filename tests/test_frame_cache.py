@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+
+from frame_cache import CapturedFrame, FramePool
+
+SHAPE = (4, 6, 4)
+
+
+def raw_frame(pool):
+    raw = pool.acquire(SHAPE)
+    raw[:] = np.arange(4, dtype=np.uint8).reshape(4, 1, 1)
+    return raw
+
+
+def test_acquired_buffer_is_not_handed_out_twice():
+    pool = FramePool()
+    first = pool.acquire(SHAPE)
+    second = pool.acquire(SHAPE)
+    assert first is not second
+    assert pool.stats() == {"free": 0, "allocations": 2, "reuses": 0}
+
+
+def test_released_buffer_is_reused():
+    pool = FramePool()
+    buffer = pool.acquire(SHAPE)
+    pool.release(buffer)
+    assert pool.acquire(SHAPE) is buffer
+    assert pool.acquire(SHAPE, np.float32) is not buffer
+    assert pool.stats()["reuses"] == 1
+
+
+def test_pool_keeps_at_most_max_buffers():
+    pool = FramePool(max_buffers=2)
+    buffers = [pool.acquire(SHAPE) for _ in range(3)]
+    for buffer in buffers:
+        pool.release(buffer)
+    assert pool.stats()["free"] == 2
+    # A new size makes room for itself when the pool is full.
+    pool.acquire((2, 2, 3))
+    assert pool.stats()["free"] == 1
+
+
+def test_capture_releases_raw_once_converted():
+    pool = FramePool()
+    raw = raw_frame(pool)
+    capture = CapturedFrame(1, raw=raw, conversion=cv2.COLOR_BGRA2BGR, pool=pool)
+    image = capture.image
+    assert image.shape == (4, 6, 3)
+    assert image[0, 0, 0] == 3  # flipped: rows come bottom-up
+    assert pool.acquire(SHAPE) is raw
+    # The converted image stays the frame's while the frame is alive.
+    assert pool.acquire(image.shape) is not image
+
+
+def test_capture_releases_its_buffers_when_collected():
+    pool = FramePool()
+    raw = raw_frame(pool)
+    depth = pool.acquire(SHAPE[:2], np.float32)
+    capture = CapturedFrame(1, raw=raw, conversion=cv2.COLOR_BGRA2BGR, pool=pool,
+                            raw_depth=depth, depth_range=(0.1, 10.0))
+    image = capture.image
+    del capture
+    assert pool.stats()["free"] == 3
+    assert pool.acquire(image.shape) is image
+    assert pool.acquire(SHAPE[:2], np.float32) is depth
+
+
+def test_capture_does_not_release_an_image_it_was_given():
+    pool = FramePool()
+    image = np.zeros((4, 6, 3), np.uint8)
+    capture = CapturedFrame(1, image=image, pool=pool)
+    assert capture.image is image
+    del capture
+    assert pool.stats()["free"] == 0
@@ -0,0 +1,52 @@
+import threading
+
+from motion_tracker import FINISHED_HISTORY, MotionTracker
+
+
+def test_finish_wakes_waiter_with_result():
+    tracker = MotionTracker()
+    motion_id = tracker.begin()
+    timer = threading.Timer(0.05, tracker.finish, (motion_id, "error emergency"))
+    timer.start()
+    assert tracker.wait(motion_id, timeout=5) == "error emergency"
+    timer.join()
+
+
+def test_wait_after_finish_returns_at_once():
+    tracker = MotionTracker()
+    motion_id = tracker.begin()
+    tracker.finish(motion_id)
+    assert tracker.wait(motion_id, timeout=0) == "ok"
+
+
+def test_wait_times_out_while_pending():
+    tracker = MotionTracker()
+    motion_id = tracker.begin()
+    assert tracker.wait(motion_id, timeout=0.01) == "error timeout"
+    assert tracker.wait_idle(timeout=0.01) == "error timeout"
+    tracker.finish(motion_id)
+    assert tracker.wait_idle(timeout=0) == "ok"
+
+
+def test_only_the_first_finish_counts():
+    tracker = MotionTracker()
+    motion_id = tracker.begin()
+    tracker.finish(motion_id, "error forward failed: no scene")
+    tracker.finish(motion_id)
+    tracker.finish(None)
+    assert tracker.wait(motion_id, timeout=0) == "error forward failed: no scene"
+
+
+def test_unknown_ids_are_errors():
+    tracker = MotionTracker()
+    assert tracker.wait(0, timeout=0) == "error unknown motion id 0"
+    assert tracker.wait(1, timeout=0) == "error unknown motion id 1"
+
+
+def test_ids_past_the_history_report_ok():
+    tracker = MotionTracker()
+    first = tracker.begin()
+    tracker.finish(first, "error emergency")
+    for _ in range(FINISHED_HISTORY):
+        tracker.finish(tracker.begin())
+    assert tracker.wait(first, timeout=0) == "ok"
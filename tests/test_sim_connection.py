@@ -0,0 +1,58 @@
+import socket
+import threading
+
+import pytest
+
+from sim_connection import SESSION_HELLO, SESSION_IDLE_TIMEOUT_S, SimConnection
+
+
+class ScriptedServer:
+    """Accepts sessions; each answers `replies[i]` commands, then closes."""
+
+    def __init__(self, *replies_per_session):
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.commands = []
+        self._thread = threading.Thread(target=self._run, args=(replies_per_session,),
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self, replies_per_session):
+        for replies in replies_per_session:
+            conn, _ = self.listener.accept()
+            with conn, conn.makefile("rb") as lines:
+                assert lines.readline() == SESSION_HELLO
+                for _ in range(replies):
+                    self.commands.append(lines.readline().decode().strip())
+                    conn.sendall(len(b"ok").to_bytes(4, "big") + b"ok")
+                # Read one more command, then close without answering it.
+                self.commands.append(lines.readline().decode().strip())
+
+    def close(self):
+        self.listener.close()
+
+
+def test_command_is_not_resent_when_the_session_drops_after_reading_it():
+    server = ScriptedServer(0, 1)
+    conn = SimConnection("127.0.0.1", server.port, persistent=True)
+    with pytest.raises(ConnectionError, match="may have run"):
+        conn.request("forward 10")
+    # The next call reconnects.
+    assert conn.request("get_battery") == "ok"
+    assert server.commands[:2] == ["forward 10", "get_battery"]
+    conn.close()
+    server.close()
+
+
+def test_command_is_resent_after_the_idle_timeout():
+    server = ScriptedServer(1, 1)
+    conn = SimConnection("127.0.0.1", server.port, persistent=True)
+    assert conn.request("get_battery") == "ok"
+    # The first session now closes without replying. After an idle spell
+    # past the server's timeout, that means it closed before the command
+    # arrived, so the client sends it again on a new session.
+    conn._session_active -= SESSION_IDLE_TIMEOUT_S
+    assert conn.request("forward 10") == "ok"
+    assert server.commands[:3] == ["get_battery", "forward 10", "forward 10"]
+    conn.close()
+    server.close()
@@ -0,0 +1,46 @@
+import pytest
+
+from telemetry_codec import (ALL_FIELDS, FIELD_NAMES, HEADER, VERSION, decode_state,
+                             encode_state, fields_mask, mask_fields)
+
+STATE = {"x": 1.5, "y": -0.25, "z": 3.0, "yaw": 90.0, "pitch": -3, "roll": 2,
+         "speed_x": 10, "speed_y": 0, "speed_z": -5, "tof": 6553, "battery": 87,
+         "flying": True, "time": 1700000000.125, "sim_time": 1234.5}
+
+
+def test_round_trip_all_fields():
+    data = encode_state(STATE, 42)
+    assert len(data) == 54
+    assert decode_state(data) == {**STATE, "seq": 42}
+
+
+def test_round_trip_selected_fields():
+    mask = fields_mask(["x", "battery", "sim_time"])
+    assert decode_state(encode_state(STATE, 7, mask)) == {
+        "x": 1.5, "battery": 87, "sim_time": 1234.5, "seq": 7}
+
+
+def test_seq_wraps():
+    assert decode_state(encode_state(STATE, 2**32 + 3))["seq"] == 3
+
+
+def test_mask_and_fields_agree():
+    assert mask_fields(ALL_FIELDS) == FIELD_NAMES
+    assert mask_fields(fields_mask(["tof", "x"])) == ("x", "tof")
+    with pytest.raises(ValueError):
+        fields_mask(["x", "altitude"])
+
+
+def test_encode_needs_every_selected_field():
+    with pytest.raises(KeyError):
+        encode_state({"x": 1.0}, 1, fields_mask(["x", "y"]))
+
+
+def test_decode_rejects_other_version_and_size():
+    data = encode_state(STATE, 1)
+    with pytest.raises(ValueError):
+        decode_state(HEADER.pack(VERSION + 1, 0, ALL_FIELDS, 1) + data[HEADER.size:])
+    with pytest.raises(ValueError):
+        decode_state(data[:-1])
+    with pytest.raises(ValueError):
+        decode_state(data + b"\0")
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+import telemetry_publisher
+from telemetry_codec import ALL_FIELDS, fields_mask
+from telemetry_publisher import TelemetryPublisher, _Subscriber, parse_subscribe
+
+
+class StandInDrone:
+    class state_snapshot:
+        @staticmethod
+        def state():
+            return {"x": 1.0}
+
+
+def tick_driven_publisher(monkeypatch, clock, rate_hz):
+    monkeypatch.setattr(telemetry_publisher, "monotonic", lambda: clock[0])
+    publisher = TelemetryPublisher(StandInDrone(), tick_driven=True, max_rate_hz=100,
+                                   multicast_group=None)
+    publisher._running = True  # on_tick() only; no sockets
+    publisher._next_due = clock[0] + publisher._interval
+    fmt, mask, every = parse_subscribe(["json", f"rate={rate_hz}"], 10, 100)
+    publisher._subscribers[("localhost", 1)] = _Subscriber(("localhost", 1), float("inf"),
+                                                            fmt, mask, every)
+    publisher._regroup()
+    return publisher
+
+
+@pytest.mark.parametrize("tick_hz", [60, 30, 144])
+def test_tick_driven_stream_keeps_its_rate(monkeypatch, tick_hz):
+    clock = [1000.0]
+    publisher = tick_driven_publisher(monkeypatch, clock, rate_hz=10)
+    seqs = []
+    for _ in range(10 * tick_hz):
+        clock[0] += 1 / tick_hz
+        publisher.on_tick()
+        if publisher._pending:
+            seqs.append(json.loads(publisher._pending[0][0])["seq"])
+            publisher._pending = None
+    assert len(seqs) in (99, 100, 101)
+    assert seqs == list(range(seqs[0], seqs[0] + len(seqs)))
+
+
+def test_stream_faster_than_ticks_gets_every_tick(monkeypatch):
+    clock = [1000.0]
+    publisher = tick_driven_publisher(monkeypatch, clock, rate_hz=100)
+    sent = 0
+    for _ in range(60):
+        clock[0] += 1 / 60
+        publisher.on_tick()
+        if publisher._pending:
+            sent += 1
+            publisher._pending = None
+    assert sent == 60
+    assert publisher.skipped > 0
+
+
+def test_parse_subscribe():
+    assert parse_subscribe([], 10, 100) == ("json", ALL_FIELDS, 10)
+    assert parse_subscribe(["bin", "rate=20", "fields=x,y"], 10, 100) == (
+        "bin", fields_mask(["x", "y"]), 5)
+    # Capped at the sample rate.
+    assert parse_subscribe(["rate=1000"], 10, 100)[2] == 1
+    for bad in (["rate=0"], ["rate=fast"], ["fields=nope"], ["xml"]):
+        with pytest.raises(ValueError):
+            parse_subscribe(bad, 10, 100)
@@ -0,0 +1,67 @@
+import time
+
+from simulator_client import RESTART_SEQ_GAP, TelemetryStats
+
+
+def feed(stats, seqs, **fields):
+    for seq in seqs:
+        stats.add({"seq": seq, **fields})
+
+
+def counts(stats):
+    result = stats.as_dict()
+    return {key: result[key] for key in ("received", "lost", "reordered", "duplicates",
+                                         "max_gap")}
+
+
+def test_gaps_count_as_lost():
+    stats = TelemetryStats(local=True)
+    feed(stats, [1, 2, 5, 6, 10])
+    assert counts(stats) == {"received": 5, "lost": 5, "reordered": 0, "duplicates": 0,
+                             "max_gap": 3}
+
+
+def test_late_sample_is_reordered_not_lost():
+    stats = TelemetryStats(local=True)
+    feed(stats, [1, 3, 2, 4])
+    assert counts(stats) == {"received": 4, "lost": 0, "reordered": 1, "duplicates": 0,
+                             "max_gap": 1}
+
+
+def test_duplicates():
+    stats = TelemetryStats(local=True)
+    feed(stats, [1, 2, 2, 1])
+    assert counts(stats)["duplicates"] == 2
+    assert counts(stats)["lost"] == 0
+
+
+def test_large_drop_in_seq_is_a_restart():
+    stats = TelemetryStats(local=True)
+    feed(stats, [RESTART_SEQ_GAP * 3, RESTART_SEQ_GAP * 3 + 1, 0, 1, 2])
+    assert counts(stats) == {"received": 5, "lost": 0, "reordered": 0, "duplicates": 0,
+                             "max_gap": 0}
+
+
+def test_samples_without_seq_are_ignored():
+    stats = TelemetryStats(local=True)
+    stats.add({"x": 1.0})
+    assert counts(stats)["received"] == 0
+
+
+def test_latency_from_the_available_clock():
+    local = TelemetryStats(local=True)
+    local.add({"seq": 1, "sim_time": time.monotonic() - 0.5, "time": time.time()})
+    assert local.as_dict()["latency_ms"]["max"] >= 500
+
+    remote = TelemetryStats(local=False)
+    remote.add({"seq": 1, "sim_time": time.monotonic() - 0.5, "time": time.time()})
+    assert remote.as_dict()["latency_ms"]["max"] < 500
+
+
+def test_no_latency_without_timestamps():
+    stats = TelemetryStats(local=True)
+    feed(stats, [1, 2], x=1.0)
+    assert stats.as_dict()["latency_ms"] is None
+    # Local, but subscribed with only the wall clock.
+    stats.add({"seq": 3, "time": time.time() - 0.2})
+    assert stats.as_dict()["latency_ms"]["max"] >= 200